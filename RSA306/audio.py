@@ -0,0 +1,178 @@
+""" Потоковая запись звука с автоматической регулировкой усиления.
+
+Демодулированный сигнал записывается в файл WAV (или FLAC при наличии
+пакета soundfile) по мере обработки, отрезок за отрезком, поэтому объем
+памяти не зависит от длительности записи, а звук доступен до окончания
+обработки.
+"""
+
+import os
+import wave
+
+import numpy as np
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+_FULL_SCALE = 2**15 - 1
+
+
+class BlockAGC(object):
+    """ Поблочная автоматическая регулировка усиления (АРУ).
+
+    Для каждого отрезка вычисляется пиковое значение и усиление, при котором
+    пик равен target. Уменьшение усиления (атака) применяется сразу ко всему
+    отрезку, поэтому пик выхода не превышает target. Рост (восстановление)
+    ограничен коэффициентом release на отрезок, и внутри отрезка усиление
+    растет линейно от прежнего значения к новому, чтобы не было скачков
+    громкости на границах.
+
+    """
+
+    __slots__ = 'target', 'release', 'max_gain', 'gain', 'ramp'
+
+    def __init__(self, target=0.5, release=1.05, max_gain=100.0, initial_gain=None):
+        """ Конструктор АРУ.
+
+        Аргументы:
+        ----------
+        target: float
+            требуемое пиковое значение выходного сигнала (1.0 -- полная шкала)
+        release: float
+            наибольший рост усиления за один отрезок, раз
+        max_gain: float
+            наибольшее усиление (ограничивает усиление шума в паузах)
+        initial_gain: float | None
+            начальное усиление; None -- по первому отрезку
+
+        """
+        self.target = target
+        self.release = release
+        self.max_gain = max_gain
+        self.gain = initial_gain
+        self.ramp = np.zeros(0)
+
+    def __call__(self, x):
+        """ Возвращает x, умноженный на текущее усиление (новый массив) """
+        peak = float(np.max(np.abs(x))) if len(x) else 0.0
+        wanted = self.max_gain if peak == 0 else min(self.target / peak, self.max_gain)
+        previous = wanted if self.gain is None else self.gain
+        self.gain = wanted if wanted < previous else min(wanted, previous * self.release)
+        if self.gain <= previous:
+            return x * x.dtype.type(self.gain)
+        if len(self.ramp) != len(x):
+            self.ramp = np.arange(1, len(x) + 1) / max(len(x), 1)
+        return x * (previous + (self.gain - previous) * self.ramp).astype(x.dtype)
+
+    def get_state(self):
+        """ Состояние между отрезками: текущее усиление (пустой массив -- еще не задано) """
+        return {'gain': np.array([] if self.gain is None else [self.gain])}
+
+    def set_state(self, state):
+        """ Восстанавливает состояние, полученное get_state """
+        self.gain = float(state['gain'][0]) if len(state['gain']) else None
+
+
+class AudioSink(object):
+    """ Потоковая запись монофонического звука в WAV или FLAC (16 бит).
+
+    Пример:
+    -------
+    with AudioSink('out.wav', 32000, agc=BlockAGC()) as sink:
+        for block in blocks:
+            sink.write(resampler2(demod(bconv(block))))
+
+    Атрибуты:
+    ---------
+    frames_written: int
+        число записанных отсчетов
+    clipped: int
+        число отсчетов, ограниченных по полной шкале
+
+    """
+
+    def __init__(self, path, Fs, gain=1.0, agc=None, format=None):
+        """ Конструктор.
+
+        Аргументы:
+        ----------
+        path: str
+            путь к выходному файлу
+        Fs: float
+            частота дискретизации звука, Гц
+        gain: float
+            постоянное усиление: значение 1.0 соответствует полной шкале. Выход
+            FM_Demodulate нормирован на девиацию f_dev, поэтому при gain=1.0
+            номинальная девиация соответствует полной шкале (см. fm_gain)
+        agc: BlockAGC | None
+            поблочная АРУ; если задана, применяется после постоянного усиления
+        format: str | None
+            'wav' или 'flac'; None -- по расширению path
+
+        """
+        self.path = path
+        self.Fs = int(Fs)
+        self.gain = gain
+        self.agc = agc
+        self.format = (format or os.path.splitext(path)[1][1:] or 'wav').lower()
+        self.frames_written = 0
+        self.clipped = 0
+
+        if self.format == 'wav':
+            self._file = wave.open(path, 'wb')
+            self._file.setnchannels(1)
+            self._file.setsampwidth(2)
+            self._file.setframerate(self.Fs)
+        elif self.format == 'flac':
+            if soundfile is None:
+                raise ImportError('Для записи FLAC необходим пакет soundfile')
+            self._file = soundfile.SoundFile(path, 'w', samplerate=self.Fs, channels=1, format='FLAC',
+                                             subtype='PCM_16')
+        else:
+            raise ValueError('Неподдерживаемый формат %s: допустимы wav, flac' % self.format)
+
+    def write(self, x):
+        """ Записывает отрезок сигнала (значения в долях полной шкалы) """
+        x = np.asarray(x, dtype=np.float32) * np.float32(self.gain)
+        if self.agc is not None:
+            x = self.agc(x)
+        self.clipped += int(np.count_nonzero(np.abs(x) > 1))
+        pcm = np.round(np.clip(x, -1, 1) * _FULL_SCALE).astype('<i2')
+        if self.format == 'wav':
+            self._file.writeframes(pcm.tobytes())
+        else:
+            self._file.write(pcm)
+            self._file.flush()
+        self.frames_written += len(pcm)
+
+    def close(self):
+        """ Завершает запись (обновляет заголовок файла) """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def fm_gain(f_dev, full_scale_dev):
+    """ Постоянное усиление AudioSink для выхода FM_Demodulate.
+
+    Аргументы:
+    ----------
+    f_dev: float
+        девиация, на которую нормирован FM_Demodulate, Гц
+    full_scale_dev: float
+        девиация, соответствующая полной шкале звука, Гц
+
+    Возвращает:
+    -----------
+    gain: float
+
+    """
+    return f_dev / full_scale_dev
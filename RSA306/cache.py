@@ -0,0 +1,383 @@
+""" Дисковый кэш прореженной комплексной огибающей
+
+Повторный анализ одной записи с теми же частотой гетеродина и полосой не
+требует заново выполнять перенос спектра и фильтрацию на 56 МГц: результат
+сохраняется на диск с ключом, включающим идентичность файла и все параметры
+обработки, и при следующем запросе отображается в память.
+"""
+
+import hashlib
+import json
+import os
+from fractions import Fraction
+
+import numpy as np
+
+from RSA306.conversion import PPResample, PassbandToBaseband_IH
+from RSA306.detection import iter_active_blocks
+from RSA306.filtercache import default_cache
+
+
+def file_identity(reader):
+    """ Идентичность файла записи: путь, размер, время изменения, хэш заголовка
+
+    Аргументы:
+    ----------
+    reader: RSA306.reader.BaseReader
+        ридер записи
+
+    Возвращает:
+    -----------
+    identity: dict
+        словарь, пригодный для сериализации в JSON
+
+    """
+    path = os.path.abspath(getattr(reader, 'data_path', reader._path_to_file))
+    stat = os.stat(path)
+    return {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'header': hashlib.sha1(reader.header_data).hexdigest()}
+
+
+def _digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+class IQCache(object):
+    """ Кэш результатов обработки на диске с вытеснением давно не использованных записей.
+
+    Каждая запись хранится как пара файлов: <ключ>.iq с отсчетами и
+    <ключ>.json с описанием (тип данных, число отсчетов, параметры). Время
+    последнего обращения хранится во времени изменения json-файла.
+
+    """
+
+    def __init__(self, directory, max_bytes=8 * 2**30):
+        """ Конструктор кэша.
+
+        Аргументы:
+        ----------
+        directory: str
+            каталог кэша (создается при необходимости)
+        max_bytes: int
+            наибольший суммарный размер данных кэша, байт
+
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.iq', base + '.json'
+
+    def entries(self):
+        """ Описания всех записей кэша: список пар (ключ, описание) """
+        result = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-5]
+            data_path, meta_path = self._paths(key)
+            if not os.path.exists(data_path):
+                continue
+            try:
+                with open(meta_path) as meta_file:
+                    result.append((key, json.load(meta_file)))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    @property
+    def total_bytes(self):
+        """ Суммарный размер данных кэша, байт """
+        return sum(os.path.getsize(self._paths(key)[0]) for key, _ in self.entries())
+
+    def lookup(self, key):
+        """ Возвращает (отсчеты в виде np.memmap, описание) или None, если записи нет """
+        data_path, meta_path = self._paths(key)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        os.utime(meta_path)
+        if meta['count'] == 0:
+            return np.empty(0, dtype=meta['dtype']), meta
+        return np.memmap(data_path, dtype=meta['dtype'], mode='r', shape=(meta['count'],)), meta
+
+    def store(self, key, chunks, meta):
+        """ Записывает результат в кэш по мере его вычисления.
+
+        Аргументы:
+        ----------
+        key: str
+            ключ записи
+        chunks: iterable
+            отрезки результата (np.array одного типа)
+        meta: dict
+            описание результата, дополняется полями dtype и count
+
+        Возвращает:
+        -----------
+        (np.memmap, dict)
+            сохраненный результат и его описание
+
+        """
+        data_path, meta_path = self._paths(key)
+        tmp_path = data_path + '.%d.tmp' % os.getpid()
+        count, dtype = 0, None
+        try:
+            with open(tmp_path, 'wb') as data_file:
+                for chunk in chunks:
+                    dtype = chunk.dtype
+                    count += chunk.size
+                    data_file.write(chunk.tobytes())
+            os.replace(tmp_path, data_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        meta = dict(meta, dtype=np.dtype(dtype or np.complex64).str, count=count)
+        with open(meta_path + '.tmp', 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(meta_path + '.tmp', meta_path)
+
+        self.evict(keep=key)
+        return self.lookup(key)
+
+    def evict(self, keep=None):
+        """ Удаляет давно не использованные записи, пока размер кэша превышает max_bytes """
+        entries = []
+        for key, _ in self.entries():
+            data_path, meta_path = self._paths(key)
+            entries.append((os.path.getmtime(meta_path), os.path.getsize(data_path), key))
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            for path in self._paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+
+
+def _resample_chunks(source, stage, chunk_size, r):
+    """ Прогоняет отрезки источника через этап, возвращая копии результата.
+
+    Неполный последний отрезок дополняется нулями, а результат усекается до
+    ceil(len * r) отсчетов: фильтр причинный, поэтому эти отсчеты совпадают
+    с результатом непрерывной обработки. После неполного отрезка обработка
+    завершается.
+
+    """
+    for x in source:
+        n = len(x)
+        if n == 0:
+            break
+        if n < chunk_size:
+            x = np.concatenate((x, np.zeros(chunk_size - n, dtype=x.dtype)))
+            yield stage(x)[:-(-n * r.numerator // r.denominator)].copy()
+            break
+        yield stage(x).copy()
+
+
+def _array_chunks(x, chunk_size):
+    for start in range(0, len(x), chunk_size):
+        yield np.asarray(x[start:start + chunk_size])
+
+
+def _chunk_size(r, target=2**20):
+    """ Размер входного отрезка, кратный знаменателю коэффициента передискретизации """
+    return max(1, target // r.denominator) * r.denominator
+
+
+def decimated_iq(reader, fh, Fs_out, fp, fs, atten=60, cache=None, dtype=np.complex64, intervals=None):
+    """ Комплексная огибающая записи после переноса спектра и прореживания.
+
+    Аргументы:
+    ----------
+    reader: RSA306.reader.BaseReader
+        ридер записи
+    fh: float
+        частота гетеродина, Гц (как в PassbandToBaseband_IH)
+    Fs_out: float
+        частота дискретизации результата, Гц
+    fp: float
+        граница полосы пропускания ФНЧ, Гц
+    fs: float
+        граница полосы задерживания ФНЧ, Гц
+    atten: float
+        допустимое отклонение АЧХ фильтра, дБ (аргумент r функции fir_coefs)
+    cache: IQCache | None
+        кэш результатов; None -- вычислять без кэширования
+    dtype: numpy.dtype
+        тип данных результата
+    intervals: np.array | None
+        интервалы записи (N, 2), которые нужно обработать (например,
+        результат RSA306.detection.scan_activity); None -- вся запись.
+        Каждый интервал обрабатывается отдельно (состояние фильтров не
+        переносится между интервалами), результаты следуют в iq друг за
+        другом, их положение описывает meta['segments']
+
+    Возвращает:
+    -----------
+    iq: np.array | np.memmap
+        отсчеты комплексной огибающей
+    meta: dict
+        описание результата (параметры обработки, источник); segments --
+        список [первый отсчет интервала в записи, смещение в iq, число
+        отсчетов] для каждого интервала (см. iter_segments)
+
+    Примечание:
+    -----------
+    Результат интервала содержит ceil(N * Fs_out / Fs) отсчетов для N
+    входных отсчетов: неполный последний отрезок записи тоже обрабатывается. При
+    наличии в кэше результата с тем же ключом он возвращается без
+    вычислений. Если в кэше есть более подробный результат той же записи с
+    той же частотой гетеродина (большая частота дискретизации, не меньшая
+    полоса пропускания и не худшее подавление), запрошенный результат
+    получается его дополнительным прореживанием, без обращения к исходным
+    отсчетам. Такой результат сохраняется под отдельным ключом, включающим
+    ключ источника (meta['source']), и не подменяет прямое вычисление.
+
+    """
+    Fs1 = float(reader.data_format.sample_rate)
+    r = Fraction(Fs_out) / Fraction(Fs1)
+    b = default_cache().fir_coefs(fp, fs, atten, Fs=Fs1)
+    identity = file_identity(reader)
+    params = {'fh': float(fh), 'Fs_out': float(Fs_out), 'fp': float(fp), 'fs': float(fs), 'atten': float(atten),
+              'ratio': [r.numerator, r.denominator], 'dtype': np.dtype(dtype).str,
+              'taps': hashlib.sha1(np.ascontiguousarray(b).tobytes()).hexdigest(),
+              'intervals': None}
+    if intervals is not None:
+        intervals = np.asarray(intervals, dtype=np.int64).reshape(-1, 2)
+        params['intervals'] = hashlib.sha1(intervals.tobytes()).hexdigest()
+    file_key = _digest(identity)
+    key = _digest([file_key, params])
+
+    if cache is not None:
+        found = cache.lookup(key)
+        if found is not None:
+            return found
+
+        coarser = _find_source(cache, file_key, params)
+        if coarser is not None:
+            # Результат прореживания другого результата отличается от прямого
+            # вычисления, поэтому хранится под собственным ключом источника
+            derived_key = _digest([file_key, params, coarser[0]])
+            found = cache.lookup(derived_key)
+            if found is not None:
+                return found
+            return _derive(cache, derived_key, coarser, params, file_key, dtype)
+
+    chunk_size = _chunk_size(r)
+    bank = default_cache().polyphase_bank(b, r, dtype)
+
+    def processor(start):
+        """ Новый обработчик, фаза гетеродина которого отсчитывается от начала записи """
+        decimator = PPResample(r, b, chunk_size, int(chunk_size * r), dtype=dtype, bpartial=bank)
+        bconv = PassbandToBaseband_IH(chunk_size, Fs1, fh, dtype, decimator=decimator)
+        bconv.nco.acc = bconv.nco.ftw * int(start) % 2**bconv.nco.bits
+        return bconv
+
+    if intervals is None:
+        segments = [[0, 0, _out_count(reader.n_samples, r)]]
+        chunks = _resample_chunks(reader.readblock(chunk_size, True), processor(0), chunk_size, r)
+    else:
+        intervals = np.clip(intervals, 0, reader.n_samples)
+        segments = _segments(intervals[:, 0], intervals[:, 1] - intervals[:, 0], r)
+        chunks = _interval_chunks(reader, intervals, processor, chunk_size, r)
+
+    meta = dict(params, file=file_key, source=None, segments=segments)
+    if cache is None:
+        chunk_lst = list(chunks)
+        iq = np.concatenate(chunk_lst) if chunk_lst else np.empty(0, dtype=dtype)
+        return iq, meta
+    return cache.store(key, chunks, meta)
+
+
+def iter_segments(iq, meta):
+    """ Результаты отдельных интервалов decimated_iq.
+
+    Аргументы:
+    ----------
+    iq: np.array
+        отсчеты, возвращенные decimated_iq
+    meta: dict
+        описание, возвращенное decimated_iq
+
+    Возвращает:
+    -----------
+    (start, iq_segment): tuple(int, np.array)
+        номер первого отсчета интервала в записи и отсчеты огибающей интервала
+
+    Примечание:
+    -----------
+    Функция-генератор. Отсчет k результата интервала соответствует моменту
+    start / Fs + k / Fs_out от начала записи.
+
+    """
+    for start, offset, count in meta['segments']:
+        yield start, iq[offset:offset + count]
+
+
+def _out_count(n, r):
+    """ Число выходных отсчетов для n входных при коэффициенте r """
+    return -(-int(n) * r.numerator // r.denominator)
+
+
+def _segments(starts, lengths, r):
+    """ Описание интервалов результата: [первый отсчет в записи, смещение в iq, число отсчетов] """
+    segments, offset = [], 0
+    for start, length in zip(starts, lengths):
+        count = _out_count(length, r)
+        segments.append([int(start), offset, count])
+        offset += count
+    return segments
+
+
+def _interval_chunks(reader, intervals, processor, chunk_size, r):
+    """ Результаты интервалов подряд; каждый интервал обрабатывается новым обработчиком """
+    for start, stop in intervals:
+        blocks = iter_active_blocks(reader, [[start, stop]], chunk_size)
+        yield from _resample_chunks(blocks, processor(start), chunk_size, r)
+
+
+def _find_source(cache, file_key, params):
+    """ Ищет в кэше наиболее прореженный результат, из которого можно получить запрошенный """
+    best = None
+    for key, meta in cache.entries():
+        if (meta.get('file') == file_key and meta['fh'] == params['fh'] and meta['dtype'] == params['dtype']
+                and meta.get('intervals') == params['intervals'] and 'segments' in meta
+                and params['Fs_out'] < meta['Fs_out'] and params['fp'] <= meta['fp']
+                and params['fs'] < meta['Fs_out'] / 2 and params['atten'] <= meta['atten']):
+            if best is None or meta['Fs_out'] < best[1]['Fs_out']:
+                best = key, meta
+    return best
+
+
+def _derive(cache, key, source, params, file_key, dtype):
+    """ Получает результат дополнительным прореживанием результата из кэша """
+    source_key, source_meta = source
+    source_iq, _ = cache.lookup(source_key)
+    Fs_src = source_meta['Fs_out']
+    r = Fraction(params['Fs_out']) / Fraction(Fs_src)
+    b = default_cache().fir_coefs(params['fp'], params['fs'], params['atten'], Fs=Fs_src)
+    # Размер отрезка не больше источника (с точностью до кратности знаменателю r),
+    # короткий источник обрабатывается одним дополненным нулями отрезком
+    longest = max([count for _, _, count in source_meta['segments']] + [1])
+    chunk_size = _chunk_size(r, target=min(2**16, longest))
+    bank = default_cache().polyphase_bank(b, r, dtype)
+    segments = _segments([start for start, _, _ in source_meta['segments']],
+                         [count for _, _, count in source_meta['segments']], r)
+
+    def chunks():
+        for _, offset, count in source_meta['segments']:
+            resampler = PPResample(r, b, chunk_size, int(chunk_size * r), dtype=dtype, bpartial=bank)
+            yield from _resample_chunks(_array_chunks(source_iq[offset:offset + count], chunk_size), resampler,
+                                        chunk_size, r)
+
+    meta = dict(params, file=file_key, source=source_key, segments=segments,
+                taps=hashlib.sha1(np.ascontiguousarray(b).tobytes()).hexdigest())
+    return cache.store(key, chunks(), meta)
@@ -0,0 +1,194 @@
+"""
+Набор последовательных файлов одной записи как единый непрерывный поток отсчетов
+"""
+
+from collections import namedtuple
+from glob import glob
+from RSA306.reader import get_reader, Reader
+from RSA306.integrity import FrameIntegrityChecker
+from RSA306.timing import TimeModel
+from RSA306.types import FooterRecords
+import numpy as np
+
+BoundaryGap = namedtuple("BoundaryGap", "file_index missing_frames timestamp_jump")
+BoundaryGap.__doc__ = """ Нарушение непрерывности на стыке файлов file_index - 1 и file_index.
+
+missing_frames: число фреймов, потерянных между файлами (по frame_id)
+timestamp_jump: отклонение timestamp первого фрейма от ожидаемого, тики
+"""
+
+# Поля заголовков, которые должны совпадать у всех файлов набора
+_COMPATIBLE_FIELDS = (("data_format", "data_type"), ("data_format", "sample_rate"),
+					  ("data_format", "if_center_frequency"), ("data_format", "bandwidth"),
+					  ("data_format", "time_sample_rate"), ("instrument_state", "center_frequency"),
+					  ("instrument_state", "reference_level"), ("version_info", "device_sn"))
+
+
+class CaptureSet:
+	""" Чтение набора последовательных файлов r3f или r3a как одного потока
+
+	Аргументы:
+	---------
+	paths: string | list[string]
+		список путей к файлам или шаблон glob (например 'data/DATA1-*.r3f'); файлы упорядочиваются по имени,
+		если передан шаблон, и берутся в заданном порядке, если передан список
+	strict: bool
+		True - вызвать ValueError при разрыве frame_id или timestamp на стыке файлов
+		False - только сохранить разрывы в boundary_gaps
+
+	Атрибуты:
+	---------
+	readers: list[BaseReader]
+		ридеры файлов набора
+	version_info, instrument_state, data_format, channel_correction:
+		данные заголовка первого файла (у остальных проверена совместимость)
+	boundary_gaps: list[BoundaryGap]
+		разрывы на стыках файлов (только для r3f, у r3a нет футеров)
+	offsets: np.ndarray
+		номер первого отсчета каждого файла в общем потоке, последний элемент равен общему числу отсчетов
+	supports_memmap: bool
+		всегда False: файлы набора не отображаются в память одним массивом
+
+	Примечание:
+	-----------
+	Данные файлов не копируются в общий файл: readblock читает файлы по очереди и склеивает блоки на стыках, поэтому
+	состояние фильтров и демодуляторов не сбрасывается на границах файлов.
+	"""
+
+	supports_memmap = False
+
+	def __init__(self, paths, strict=False):
+		if isinstance(paths, str):
+			paths = sorted(glob(paths))
+		if not paths:
+			raise ValueError("Набор файлов пуст")
+
+		self.readers = [get_reader(path) for path in paths]
+		if len({type(reader) for reader in self.readers}) != 1:
+			raise ValueError("Набор должен состоять из файлов одного формата: только r3f или только r3a")
+
+		first = self.readers[0]
+		for reader in self.readers[1:]:
+			for section, field in _COMPATIBLE_FIELDS:
+				expected = getattr(getattr(first, section), field)
+				actual = getattr(getattr(reader, section), field)
+				if expected != actual:
+					raise ValueError(f"Несовместимые заголовки: {section}.{field} = {actual} в файле "
+									 f"{reader._path_to_file}, ожидается {expected}")
+
+		self.version_info = first.version_info
+		self.instrument_state = first.instrument_state
+		self.data_format = first.data_format
+		self.channel_correction = first.channel_correction
+
+		self.offsets = np.concatenate(([0], np.cumsum([reader.n_samples for reader in self.readers])))
+
+		self.boundary_gaps = self._check_boundaries() if isinstance(first, Reader) else []
+		if strict and self.boundary_gaps:
+			raise ValueError(f"Разрывы на стыках файлов: {self.boundary_gaps}")
+
+	def __len__(self):
+		return int(self.offsets[-1])
+
+	def _check_boundaries(self) -> list:
+		""" Проверяет стыки файлов по последнему и первому футеру соседних файлов """
+		gaps = []
+		last_footer = None
+		for file_index, reader in enumerate(self.readers):
+			footers = reader.footers()
+			if len(footers) == 0:
+				continue
+			if last_footer is not None:
+				checker = FrameIntegrityChecker(status_mask=0)
+				checker(np.concatenate((last_footer, footers[:1])))
+				for gap in checker.gaps:
+					gaps.append(BoundaryGap(file_index=file_index, missing_frames=gap.missing_frames,
+											timestamp_jump=gap.timestamp_jump))
+			last_footer = footers[-1:]
+		return gaps
+
+	def footers(self) -> np.ndarray:
+		""" Футеры всех фреймов набора подряд (только r3f) """
+		return np.concatenate([reader.footers() for reader in self.readers]).view(FooterRecords)
+
+	def time_model(self) -> TimeModel:
+		""" Модель времени общего потока; стыки файлов становятся опорными точками модели """
+		if isinstance(self.readers[0], Reader):
+			return TimeModel.from_footers(self.data_format, self.footers())
+		return self.readers[0].time_model()
+
+	def readblock(self, samples_per_block, short_allowed=True):
+		""" Считывает отсчёты всех файлов набора по блокам заданного размера.
+
+		Аргументы:
+		----------
+		samples_per_block: int
+			размер блока в отсчётах
+		short_allowed: bool
+			False - если последний блок набора неполный, он отбрасывается
+			True - если последний блок набора неполный, он возвращается как массив
+				   с числом отсчётов менее samples_per_block
+
+		Возвращает:
+		-----------
+		adc_samples: np.array
+			отсчеты текущего блока; блок, попавший на стык файлов, собирается из двух файлов
+
+		Примечание:
+		-----------
+		Функция-генератор.
+
+		"""
+		excessed_adc_samples = np.empty(0, dtype=np.int16)
+		for reader in self.readers:
+			for block in reader.readblock(samples_per_block, True):
+				if len(excessed_adc_samples):
+					need = samples_per_block - len(excessed_adc_samples)
+					excessed_adc_samples = np.concatenate((excessed_adc_samples, block[:need]))
+					block = block[need:]
+					if len(excessed_adc_samples) < samples_per_block:
+						continue
+					yield excessed_adc_samples
+					excessed_adc_samples = np.empty(0, dtype=np.int16)
+
+				if len(block) == samples_per_block:
+					yield block
+				elif len(block):
+					excessed_adc_samples = block.copy()
+
+		if short_allowed and len(excessed_adc_samples):
+			yield excessed_adc_samples
+
+	def read_range(self, start, stop) -> np.ndarray:
+		""" Считывает отсчеты [start, stop) общего потока, обращаясь только к затронутым файлам
+
+		Аргументы:
+		----------
+		start: int
+			номер первого отсчета
+		stop: int
+			номер отсчета, следующего за последним
+
+		Возвращает:
+		-----------
+		adc_samples: np.ndarray
+			отсчеты int16 длины stop - start (меньше, если диапазон выходит за конец набора)
+		"""
+		start, stop = max(int(start), 0), min(int(stop), len(self))
+		pieces = []
+		first_file = max(int(np.searchsorted(self.offsets, start, side='right')) - 1, 0)
+		for file_index in range(first_file, len(self.readers)):
+			file_start = int(self.offsets[file_index])
+			if file_start >= stop:
+				break
+			local_start = max(start - file_start, 0)
+			local_stop = min(stop, int(self.offsets[file_index + 1])) - file_start
+			pieces.append(self.readers[file_index].read_range(local_start, local_stop))
+
+		if not pieces:
+			return np.empty(0, dtype=np.int16)
+		return pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+
+	def read(self) -> np.ndarray:
+		""" Считывает все отсчеты набора """
+		return self.read_range(0, len(self))
@@ -0,0 +1,146 @@
+""" Контрольные точки длительной потоковой обработки записи.
+
+Состояние этапов обработки (гетеродин PassbandToBaseband_IH, буферы
+PPResample, фаза FM_Demodulate и т.п., см. методы get_state/set_state) и
+позиция чтения записи периодически сохраняются в файл контрольной точки
+вместе с длиной уже записанного результата. После сбоя обработка
+продолжается с последней контрольной точки, а результат совпадает побитно
+с результатом обработки без перерыва.
+"""
+
+import json
+import os
+from time import monotonic
+
+import numpy as np
+
+from RSA306.cache import file_identity
+from RSA306.conversion import get_stage_states, set_stage_states
+
+_META_KEY = '__meta__'
+_VERSION = 1
+
+
+def save_checkpoint(path, stages, meta):
+    """ Атомарно записывает контрольную точку.
+
+    Аргументы:
+    ----------
+    path: str
+        путь к файлу контрольной точки (.npz)
+    stages: list
+        этапы обработки с методами get_state/set_state
+    meta: dict
+        описание, сериализуемое в JSON (позиция, длина результата и т.п.)
+
+    """
+    arrays = get_stage_states(stages)
+    arrays[_META_KEY] = np.array(json.dumps(meta))
+    tmp_path = path + '.%d.tmp' % os.getpid()
+    with open(tmp_path, 'wb') as tmp_file:
+        np.savez(tmp_file, **arrays)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """ Считывает контрольную точку: (состояния этапов, описание) """
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files if key != _META_KEY}
+        meta = json.loads(str(data[_META_KEY]))
+    return state, meta
+
+
+def run_checkpointed(reader, stages, block_size, output_path, checkpoint_path=None, checkpoint_every=60.0,
+                     max_blocks=None):
+    """ Обрабатывает запись цепочкой этапов с периодическими контрольными точками.
+
+    Аргументы:
+    ----------
+    reader: RSA306.reader.BaseReader
+        ридер записи; readblock должен поддерживать аргумент start
+    stages: list
+        этапы обработки (вызываемые объекты с методами get_state/set_state),
+        выход каждого этапа подается на вход следующего
+    block_size: int
+        размер входного отрезка, отсчетов (chunk_size первого этапа)
+    output_path: str
+        файл результата: выход последнего этапа подряд, в двоичном виде
+    checkpoint_path: str | None
+        файл контрольной точки; None -- output_path + '.ckpt.npz'
+    checkpoint_every: float
+        период сохранения контрольных точек, с (0 -- после каждого отрезка)
+    max_blocks: int | None
+        наибольшее число отрезков за этот запуск; None -- до конца записи
+
+    Возвращает:
+    -----------
+    result: dict
+        position -- позиция чтения, отсчетов; blocks -- число отрезков за этот
+        запуск; resumed_from -- позиция, с которой продолжена обработка (None
+        -- обработка начата сначала); checkpoints -- число сохраненных точек;
+        done -- запись обработана до конца
+
+    Примечание:
+    -----------
+    Если файл контрольной точки существует, этапы должны быть созданы с теми
+    же параметрами, что и при первом запуске: состояния восстанавливаются из
+    контрольной точки, результат усекается до сохраненной длины, и чтение
+    продолжается с сохраненной позиции. Неполный последний отрезок записи
+    отбрасывается. После окончания записи контрольная точка сохраняется с
+    признаком done, и повторный запуск ничего не делает.
+
+    """
+    checkpoint_path = checkpoint_path or output_path + '.ckpt.npz'
+    identity = file_identity(reader)
+    stage_types = [type(stage).__name__ for stage in stages]
+    meta = {'version': _VERSION, 'file': identity, 'block_size': int(block_size), 'stages': stage_types,
+            'position': 0, 'output_bytes': 0, 'done': False}
+    resumed_from = None
+
+    if os.path.exists(checkpoint_path):
+        state, saved = load_checkpoint(checkpoint_path)
+        for field in ('version', 'file', 'block_size', 'stages'):
+            if saved.get(field) != meta[field]:
+                raise ValueError('Контрольная точка %s не соответствует задаче: различается %s'
+                                 % (checkpoint_path, field))
+        set_stage_states(stages, state)
+        meta = saved
+        resumed_from = meta['position']
+        output = open(output_path, 'r+b')
+        output.truncate(meta['output_bytes'])
+        output.seek(meta['output_bytes'])
+    else:
+        output = open(output_path, 'wb')
+
+    blocks = checkpoints = 0
+    last_checkpoint = monotonic()
+
+    def checkpoint():
+        output.flush()
+        os.fsync(output.fileno())
+        meta['output_bytes'] = output.tell()
+        save_checkpoint(checkpoint_path, stages, meta)
+
+    with output:
+        if not meta['done']:
+            for x in reader.readblock(block_size, False, start=meta['position']):
+                if max_blocks is not None and blocks >= max_blocks:
+                    break
+                for stage in stages:
+                    x = stage(x)
+                output.write(np.ascontiguousarray(x).tobytes())
+                meta['position'] += block_size
+                blocks += 1
+                if monotonic() - last_checkpoint >= checkpoint_every:
+                    checkpoint()
+                    checkpoints += 1
+                    last_checkpoint = monotonic()
+            else:
+                meta['done'] = True
+            checkpoint()
+            checkpoints += 1
+
+    return {'position': meta['position'], 'blocks': blocks, 'resumed_from': resumed_from,
+            'checkpoints': checkpoints, 'done': meta['done']}
@@ -0,0 +1,398 @@
+"""
+Сжатый без потерь контейнер записи RSA-306 (.r3z) с произвольным доступом по отрезкам
+
+Отсчеты записи делятся на отрезки фиксированной длины, каждый отрезок сжимается независимо, поэтому отрезки
+сжимаются параллельно, а при чтении распаковываются только затронутые запросом. Заголовок (16 КиБ) сохраняется
+без изменений, футеры r3f - отдельным сжатым блоком.
+
+Структура файла:
+	MAGIC | заголовок HEADER_DATA_LENGTH байт | сжатые отрезки | сжатые футеры | индекс отрезков | описание JSON |
+	смещение описания <Q | длина описания <Q | MAGIC
+
+Преобразование отрезка перед сжатием:
+	1) сдвиг вправо на общее число младших нулевых разрядов (АЦП RSA-306 не использует младшие разряды int16);
+	2) разностное кодирование, если оно уменьшает сумму модулей;
+	3) zigzag-кодирование в uint16 и разделение младших и старших байтов (байты одного разряда идут подряд);
+	4) сжатие кодеком zstd, lz4 или zlib.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from math import ceil
+from os.path import splitext
+import os
+import json
+import struct
+import zlib
+from RSA306.rc import HEADER_DATA_LENGTH, SAMPLES_PER_BLOCK
+from RSA306.reader import BaseReader, get_reader, Reader
+from RSA306.events import find_triggers
+from RSA306.integrity import check_footers
+from RSA306.timing import TimeModel
+from RSA306.types import FOOTER_DTYPE, FooterRecords
+import numpy as np
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+try:
+	import lz4.frame
+except ImportError:
+	lz4 = None
+
+MAGIC = b"RSA306Z1"
+_TRAILER = struct.Struct("<QQ")
+
+# Запись индекса: смещение и длина сжатого отрезка, число отсчетов, сдвиг, признак разностного кодирования
+CHUNK_INDEX_DTYPE = np.dtype([("offset", "<u8"), ("size", "<u4"), ("samples", "<u4"), ("shift", "u1"),
+							  ("delta", "u1")])
+
+
+def _codecs() -> dict:
+	""" Доступные кодеки: имя -> (сжатие(data, level), распаковка(data)) """
+	codecs = {"zlib": (lambda data, level: zlib.compress(data, 1 if level is None else level), zlib.decompress)}
+	if zstandard is not None:
+		codecs["zstd"] = (lambda data, level: zstandard.ZstdCompressor(level=level or 3).compress(data),
+						  lambda data: zstandard.ZstdDecompressor().decompress(data))
+	if lz4 is not None:
+		codecs["lz4"] = (lambda data, level: lz4.frame.compress(data, compression_level=level or 0),
+						 lz4.frame.decompress)
+	return codecs
+
+
+def default_codec() -> str:
+	""" Кодек по умолчанию: zstd, если установлен, иначе lz4, иначе zlib """
+	codecs = _codecs()
+	return next(name for name in ("zstd", "lz4", "zlib") if name in codecs)
+
+
+def encode_chunk(samples, codec, level=None):
+	""" Сжимает отрезок отсчетов int16
+
+	Возвращает:
+	-----------
+	(data, shift, delta): (bytes, int, bool)
+		сжатые данные и параметры преобразования для decode_chunk
+	"""
+	samples = np.asarray(samples, dtype=np.int16)
+	used_bits = int(np.bitwise_or.reduce(samples.view(np.uint16))) if len(samples) else 0
+	shift = (used_bits & -used_bits).bit_length() - 1 if used_bits else 0
+	values = samples >> shift
+
+	diff = np.diff(values, prepend=np.int16(0))
+	delta = bool(np.abs(diff, dtype=np.int32).sum() < np.abs(values, dtype=np.int32).sum())
+	if delta:
+		values = diff
+
+	zigzag = ((values << 1) ^ (values >> 15)).view(np.uint16)
+	shuffled = np.ascontiguousarray(zigzag.view(np.uint8).reshape(-1, 2).T)
+	return _codecs()[codec][0](shuffled.tobytes(), level), shift, delta
+
+
+def decode_chunk(data, n_samples, shift, delta, codec) -> np.ndarray:
+	""" Восстанавливает отрезок отсчетов int16, сжатый encode_chunk """
+	raw = np.frombuffer(_codecs()[codec][1](data), dtype=np.uint8)
+	zigzag = np.ascontiguousarray(raw.reshape(2, n_samples).T).view(np.uint16).reshape(-1)
+	values = ((zigzag >> 1) ^ (-(zigzag & 1).astype(np.int16)).view(np.uint16)).view(np.int16)
+	if delta:
+		values = np.cumsum(values, dtype=np.int16)
+	return values << shift
+
+
+def compress_capture(src_path, dst_path=None, chunk_samples=2**20, codec=None, level=None, workers=None) -> str:
+	""" Сжимает запись r3f или r3a в контейнер r3z
+
+	Аргументы:
+	----------
+	src_path: string
+		путь к записи (r3f, r3a или r3h)
+	dst_path: string | None
+		путь к контейнеру; по умолчанию рядом с записью с расширением r3z
+	chunk_samples: int
+		число отсчетов в отрезке (единица произвольного доступа)
+	codec: string | None
+		'zstd', 'lz4' или 'zlib'; None - default_codec()
+	level: int | None
+		уровень сжатия кодека
+	workers: int | None
+		число потоков сжатия (кодеки освобождают GIL)
+
+	Возвращает:
+	-----------
+	dst_path: string
+		путь к созданному контейнеру
+
+	Примечание:
+	-----------
+	Запись читается отрезками, в работе одновременно находится не более 2 * workers отрезков, поэтому объем
+	памяти не зависит от размера записи.
+	"""
+	codec = codec or default_codec()
+	if codec not in _codecs():
+		raise ValueError(f"Кодек {codec} недоступен, доступны: {', '.join(_codecs())}")
+
+	reader = get_reader(src_path)
+	dst_path = dst_path or splitext(src_path)[0] + ".r3z"
+	n_samples = reader.n_samples
+	n_chunks = -(-n_samples // chunk_samples)
+	index = np.zeros(n_chunks, dtype=CHUNK_INDEX_DTYPE)
+
+	workers = workers or os.cpu_count()
+	with open(dst_path, "wb") as dst, ThreadPoolExecutor(max_workers=workers) as executor:
+		dst.write(MAGIC)
+		dst.write(reader.header_data.ljust(HEADER_DATA_LENGTH, b"\0"))
+
+		def submit(chunk_index):
+			start = chunk_index * chunk_samples
+			samples = reader.read_range(start, min(start + chunk_samples, n_samples))
+			return executor.submit(encode_chunk, samples, codec, level), len(samples)
+
+		pending = deque()
+		depth = 2 * workers
+		next_chunk = 0
+		for chunk_index in range(n_chunks):
+			while next_chunk < n_chunks and len(pending) < depth:
+				pending.append(submit(next_chunk))
+				next_chunk += 1
+			future, count = pending.popleft()
+			data, shift, delta = future.result()
+			index[chunk_index] = (dst.tell(), len(data), count, shift, delta)
+			dst.write(data)
+
+		footers_meta = None
+		if isinstance(reader, Reader):
+			footers = np.ascontiguousarray(reader.footers()).view(FOOTER_DTYPE)
+			data = _codecs()[codec][0](footers.tobytes(), level)
+			footers_meta = {"offset": dst.tell(), "size": len(data), "count": len(footers)}
+			dst.write(data)
+
+		index_offset = dst.tell()
+		dst.write(index.tobytes())
+		meta = {"kind": "r3f" if isinstance(reader, Reader) else "r3a", "codec": codec,
+				"chunk_samples": chunk_samples, "n_samples": n_samples, "index_offset": index_offset,
+				"n_chunks": n_chunks, "footers": footers_meta}
+		meta_bytes = json.dumps(meta).encode()
+		meta_offset = dst.tell()
+		dst.write(meta_bytes)
+		dst.write(_TRAILER.pack(meta_offset, len(meta_bytes)) + MAGIC)
+
+	return dst_path
+
+
+class CompressedReader(BaseReader):
+	""" Чтение сжатого контейнера r3z с тем же интерфейсом, что у Reader и RawReader
+
+	Аргументы:
+	---------
+	path: string
+		путь к файлу r3z
+	cache_chunks: int
+		число распакованных отрезков, хранимых в памяти
+
+	Атрибуты:
+	---------
+	meta: dict
+		описание контейнера (кодек, длина отрезка, число отсчетов, исходный формат)
+	index: np.ndarray
+		индекс отрезков CHUNK_INDEX_DTYPE
+
+	Примечание:
+	-----------
+	Для контейнеров записей r3f доступны readblock с read_metadata и checker, footers, check_integrity, triggers и
+	time_model по футерам, как у Reader. Для контейнеров r3a readblock с read_metadata или checker, check_integrity
+	и triggers вызывают ValueError, footers возвращает пустой массив. Сжатые отсчеты нельзя отобразить в память:
+	метода memmap нет, supports_memmap равен False, поэтому функции, использующие memmap при его поддержке, читают
+	контейнер через readblock и read_range.
+	"""
+
+	def __init__(self, path, cache_chunks=4):
+		self._cache = OrderedDict()
+		self._cache_chunks = cache_chunks
+		super().__init__(path)
+
+	def _read_header_data(self) -> None:
+		with open(self._path_to_file, "rb") as src:
+			if src.read(len(MAGIC)) != MAGIC:
+				raise ValueError(f"Файл {self._path_to_file} не является контейнером r3z")
+			self.header_data = src.read(HEADER_DATA_LENGTH)
+			src.seek(-(_TRAILER.size + len(MAGIC)), 2)
+			meta_offset, meta_size = _TRAILER.unpack(src.read(_TRAILER.size))
+			if src.read(len(MAGIC)) != MAGIC:
+				raise ValueError(f"Контейнер {self._path_to_file} поврежден или не дописан")
+			src.seek(meta_offset)
+			self.meta = json.loads(src.read(meta_size).decode())
+			src.seek(self.meta["index_offset"])
+			self.index = np.frombuffer(src.read(self.meta["n_chunks"] * CHUNK_INDEX_DTYPE.itemsize),
+									   dtype=CHUNK_INDEX_DTYPE)
+		if self.meta["codec"] not in _codecs():
+			raise ValueError(f"Для чтения {self._path_to_file} необходим кодек {self.meta['codec']}")
+
+	def _count_samples(self) -> int:
+		return self.meta["n_samples"]
+
+	def _chunk(self, chunk_index) -> np.ndarray:
+		""" Распакованный отрезок (с кэшем последних cache_chunks отрезков) """
+		if chunk_index in self._cache:
+			self._cache.move_to_end(chunk_index)
+			return self._cache[chunk_index]
+		entry = self.index[chunk_index]
+		with open(self._path_to_file, "rb") as src:
+			src.seek(int(entry["offset"]))
+			data = src.read(int(entry["size"]))
+		samples = decode_chunk(data, int(entry["samples"]), int(entry["shift"]), bool(entry["delta"]),
+							   self.meta["codec"])
+		samples.flags.writeable = False
+		self._cache[chunk_index] = samples
+		while len(self._cache) > self._cache_chunks:
+			self._cache.popitem(last=False)
+		return samples
+
+	def read_range(self, start, stop) -> np.ndarray:
+		""" Считывает отсчеты [start, stop), распаковывая только затронутые отрезки
+
+		Аргументы:
+		----------
+		start: int
+			номер первого отсчета
+		stop: int
+			номер отсчета, следующего за последним
+
+		Возвращает:
+		-----------
+		adc_samples: np.ndarray
+			отсчеты int16 (меньше stop - start, если диапазон выходит за конец записи)
+		"""
+		chunk_samples = self.meta["chunk_samples"]
+		start, stop = max(int(start), 0), min(int(stop), self.n_samples)
+		if stop <= start:
+			return np.empty(0, dtype=np.int16)
+		pieces = []
+		for chunk_index in range(start // chunk_samples, -(-stop // chunk_samples)):
+			chunk_start = chunk_index * chunk_samples
+			chunk = self._chunk(chunk_index)
+			pieces.append(chunk[max(start - chunk_start, 0):stop - chunk_start])
+		return np.concatenate(pieces) if len(pieces) > 1 else pieces[0].copy()
+
+	def read(self) -> np.ndarray:
+		""" Считывает все отсчеты записи """
+		return self.read_range(0, self.n_samples)
+
+	def _require_footers(self, feature):
+		if self.meta["footers"] is None:
+			raise ValueError(f"{feature} доступно только для контейнеров записей r3f")
+
+	def readblock(self, samples_per_block, short_allowed=True, read_metadata=False, checker=None, start=0):
+		""" Считывает отсчёты по блокам заданного размера (как Reader.readblock и RawReader.readblock)
+
+		Аргументы:
+		----------
+		samples_per_block: int
+			размер блока в отсчётах
+		short_allowed: bool
+			False - если последний блок неполный, он отбрасывается
+			True - если последний блок неполный, он возвращается как массив
+				   с числом отсчётов менее samples_per_block
+		read_metadata: bool
+			True - возвращать кортежи пар (отсчеты фрейма, запись футера), как Reader.readblock (только r3f)
+		checker: RSA306.integrity.FrameIntegrityChecker | None
+			проверка целостности по футерам по ходу чтения, как в Reader.readblock (только r3f)
+		start: int
+			номер отсчета, с которого начинается чтение (при read_metadata=True -- кратный SAMPLES_PER_BLOCK)
+
+		Возвращает:
+		-----------
+		np.array | tuple(tuple(np.array, np.record))
+			отсчёты текущего блока или фреймы с футерами
+
+		Примечание:
+		-----------
+		Функция-генератор.
+
+		"""
+		if read_metadata or checker is not None:
+			self._require_footers("Чтение футеров (read_metadata, checker)")
+			yield from self._readblock_frames(samples_per_block, short_allowed, read_metadata, checker, start)
+			return
+		for block_start in range(int(start), self.n_samples, samples_per_block):
+			block = self.read_range(block_start, block_start + samples_per_block)
+			if len(block) < samples_per_block and not short_allowed:
+				break
+			yield block
+
+	def _readblock_frames(self, samples_per_block, short_allowed, read_metadata, checker, start):
+		""" readblock по группам фреймов с футерами (повторяет порядок обработки Reader.readblock) """
+		if read_metadata and (samples_per_block % SAMPLES_PER_BLOCK) != 0:
+			raise ValueError("Чтобы получать отсчеты сместе с метаданными необходимо указать размер блока с "
+							 "отсчетами равный 8178. Можно воспользоваться константой RSA306.rc.SAMPLES_PER_BLOCK")
+		if read_metadata and start % SAMPLES_PER_BLOCK:
+			raise ValueError("При read_metadata=True начальный отсчет start должен быть кратен SAMPLES_PER_BLOCK")
+
+		footers = self.footers()
+		n_frames = min(self.n_frames, len(footers))
+		num_blocks = ceil(samples_per_block / SAMPLES_PER_BLOCK)
+		frames_done, skip = divmod(int(start), SAMPLES_PER_BLOCK)
+		excessed_adc_samples = np.empty(0, dtype=np.int16)
+
+		for first in range(frames_done, n_frames, num_blocks):
+			blocks_count = min(num_blocks, n_frames - first)
+			samples = self.read_range(first * SAMPLES_PER_BLOCK, (first + blocks_count) * SAMPLES_PER_BLOCK)
+			frame_footers = footers[first:first + blocks_count]
+			gaps = checker(frame_footers, first) if checker is not None else []
+
+			if read_metadata:
+				if blocks_count == num_blocks or short_allowed:
+					yield tuple(zip(samples.reshape(blocks_count, SAMPLES_PER_BLOCK), frame_footers))
+				continue
+
+			if gaps and checker.fill:
+				samples = checker.zero_fill(samples, gaps, first)
+			if skip:
+				samples, skip = samples[skip:], 0
+			data = np.concatenate((excessed_adc_samples, samples))
+			n_full = len(data) // samples_per_block * samples_per_block
+			for block_start in range(0, n_full, samples_per_block):
+				yield data[block_start:block_start + samples_per_block]
+			excessed_adc_samples = data[n_full:]
+
+		if not read_metadata and short_allowed and len(excessed_adc_samples):
+			yield excessed_adc_samples
+
+	def footers(self) -> np.ndarray:
+		""" Футеры всех фреймов исходной записи r3f (пустой массив для r3a)
+
+		Возвращает:
+		-----------
+		footers: RSA306.types.FooterRecords
+			массив записей RSA306.types.FOOTER_DTYPE
+		"""
+		footers_meta = self.meta["footers"]
+		if footers_meta is None:
+			return np.empty(0, dtype=FOOTER_DTYPE).view(FooterRecords)
+		with open(self._path_to_file, "rb") as src:
+			src.seek(footers_meta["offset"])
+			data = src.read(footers_meta["size"])
+		return np.frombuffer(_codecs()[self.meta["codec"]][1](data), dtype=FOOTER_DTYPE).view(FooterRecords)
+
+	def check_integrity(self, **kwargs) -> list:
+		""" Проверяет непрерывность фреймов по футерам (только для записей r3f) """
+		self._require_footers("Проверка целостности")
+		return check_footers(self.footers(), **kwargs)
+
+	def triggers(self, sources=(1, 2)):
+		""" События запуска по футерам, как Reader.triggers (только для записей r3f) """
+		self._require_footers("Поиск событий запуска")
+		ticks_per_sample = float(self.data_format.time_sample_rate) / float(self.data_format.sample_rate)
+		return find_triggers(self.footers(), sources=sources, ticks_per_sample=ticks_per_sample)
+
+	def time_model(self) -> TimeModel:
+		""" Модель времени записи; для r3f строится по футерам, как в Reader """
+		if self.meta["footers"] is None:
+			return TimeModel(self.data_format)
+		return TimeModel.from_footers(self.data_format, self.footers())
+
+	@property
+	def n_frames(self) -> int:
+		""" Число фреймов исходной записи r3f """
+		return self.n_samples // SAMPLES_PER_BLOCK
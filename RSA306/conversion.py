@@ -2,6 +2,9 @@ from scipy import signal
 from scipy.signal import kaiserord, firwin, firwin2
 import numpy as np
 from numpy import pi, exp, angle, unwrap, diff
+from fractions import Fraction
+
+from RSA306.kernels import get_kernel
 
 
 class FM_Demodulate(object):
@@ -26,6 +29,114 @@ class FM_Demodulate(object):
         self.y *= self.Katt * self.Fs / (2 * pi * self.f_dev)
         return self.y
 
+    def get_state(self):
+        """ Состояние между отрезками: фаза последнего отсчета """
+        return {'last_phase': self.buf[:1].copy()}
+
+    def set_state(self, state):
+        """ Восстанавливает состояние, полученное get_state """
+        self.buf[0] = state['last_phase'][0]
+
+
+class NCO(object):
+    """ Цифровой гетеродин (ЧУГ) с целочисленным аккумулятором фазы.
+
+    Фаза хранится в целочисленном аккумуляторе разрядностью bits и за каждый
+    отсчет увеличивается на код частоты ftw = round(f / Fs * 2**bits) по
+    модулю 2**bits. Поэтому фаза не накапливает ошибку округления на сколь
+    угодно длинном потоке, а результат не зависит от размера отрезков.
+
+    Значение exp(1j*phi) берется из двух таблиц: по старшим table_bits
+    разрядам фазы (грубая) и по следующим table_bits разрядам (точная), и
+    вычисляется одним комплексным умножением без тригонометрических функций.
+    Остальные разряды отбрасываются: ошибка фазы не превышает
+    2*pi / 2**(2*table_bits).
+
+    """
+
+    __slots__ = ('Fs', 'f', 'chunk_size', 'bits', 'table_bits', 'ftw', 'acc',
+                 'steps', 'phase_buf', 'index_buf', 'coarse', 'fine', 'y')
+
+    def __init__(self, Fs, f, chunk_size, phi0=0.0, bits=64, table_bits=12,
+                 dtype='complex64'):
+        """ Конструктор гетеродина.
+
+        Аргументы:
+        ----------
+        Fs: float
+            частота дискретизации, Гц
+        f: float
+            частота гетеродина, Гц (отрицательная -- вращение по часовой)
+        chunk_size: int
+            размер отрезка, формируемого за один вызов
+        phi0: float
+            начальная фаза, рад
+        bits: int
+            разрядность аккумулятора фазы (не более 64)
+        table_bits: int
+            разрядность индекса каждой из двух таблиц (2*table_bits <= bits)
+        dtype: str | numpy.dtype
+            комплексный тип выходных отсчетов
+
+        """
+        if not 2 * table_bits <= bits <= 64:
+            raise ValueError('Должно выполняться 2*table_bits <= bits <= 64')
+        self.Fs, self.f = Fs, f
+        self.chunk_size = chunk_size
+        self.bits, self.table_bits = bits, table_bits
+        modulus = 2**bits
+        self.ftw = int(round(Fraction(f) / Fraction(Fs) * modulus)) % modulus
+        phi0 = Fraction(phi0) / Fraction(2 * pi)
+        self.acc = int(round(phi0 * modulus)) % modulus
+        self.steps = np.arange(chunk_size, dtype=np.uint64)
+        self.steps *= np.uint64(self.ftw)
+        self.steps &= np.uint64(modulus - 1)
+        self.phase_buf = np.zeros(chunk_size, dtype=np.uint64)
+        self.index_buf = np.zeros(chunk_size, dtype=np.uint64)
+
+        k = np.arange(2**table_bits)
+        self.coarse = exp(2j * pi * k / 2**table_bits).astype(dtype)
+        self.fine = exp(2j * pi * k / 2**(2 * table_bits)).astype(dtype)
+        self.y = np.zeros(chunk_size, dtype=dtype)
+
+    @property
+    def f_actual(self):
+        """ Фактическая частота гетеродина с учетом дискретности кода, Гц """
+        ftw = self.ftw
+        if ftw >= 2**(self.bits - 1):
+            ftw -= 2**self.bits
+        return ftw * self.Fs / 2**self.bits
+
+    @property
+    def phase(self):
+        """ Фаза следующего отсчета, рад """
+        return 2 * pi * self.acc / 2**self.bits
+
+    def __call__(self):
+        """ Следующий отрезок колебания exp(1j*phi) длиной chunk_size """
+        phase, index = self.phase_buf, self.index_buf
+        np.add(self.steps, np.uint64(self.acc), out=phase)
+        if self.bits < 64:
+            np.bitwise_and(phase, np.uint64(2**self.bits - 1), out=phase)
+        self.acc = (self.acc + self.ftw * self.chunk_size) % 2**self.bits
+
+        coarse_shift = np.uint64(self.bits - self.table_bits)
+        fine_shift = np.uint64(self.bits - 2 * self.table_bits)
+        np.right_shift(phase, coarse_shift, out=index)
+        np.take(self.coarse, index, out=self.y)
+        np.right_shift(phase, fine_shift, out=index)
+        np.bitwise_and(index, np.uint64(2**self.table_bits - 1), out=index)
+        self.y *= self.fine[index]
+        return self.y
+
+    def get_state(self):
+        """ Состояние между отрезками: значение аккумулятора фазы """
+        return {'acc': np.array(self.acc, dtype=np.uint64)}
+
+    def set_state(self, state):
+        """ Восстанавливает состояние, полученное get_state """
+        self.acc = int(state['acc'])
+
 
 class PassbandToBaseband_IH(object):
     """ ВКО -- выделитель комплексной огибающей (с внутренним гетеродином).
@@ -103,7 +214,6 @@ class PassbandToBaseband_IH(object):
         self.fh = fh
         self.phi0 = phi0
         self.omega_h = 2 * pi * self.fh
-        self.phase_shift = 0
 
         if np.dtype(dtype).kind == 'c':
             compdtype = dtype
@@ -114,19 +224,34 @@ class PassbandToBaseband_IH(object):
         else:
             compdtype = 'complex256'
 
-        nT = np.arange(chunk_size, dtype=compdtype) / Fs
-        self.x_h = exp(1j * self.omega_h * nT + phi0)
+        self.nco = NCO(Fs, fh, chunk_size, phi0=phi0, dtype=compdtype)
         self.x_mix = np.zeros(chunk_size, dtype=compdtype)
         self.y = self.postproc.y
 
+    @property
+    def phase_shift(self):
+        """ Фаза гетеродина в начале следующего отрезка, рад """
+        return self.nco.phase
+
     def __call__(self, x_in):
         """ Обработка отрезка сигнала """
-        self.x_mix[:] = x_in * self.x_h * exp(1j*self.phase_shift)
-        self.phase_shift += self.omega_h * self.chunk_size / self.Fs
-        self.phase_shift %= 2 * pi
+        np.multiply(x_in, self.nco(), out=self.x_mix)
         self.postproc(self.x_mix)
         return self.y
 
+    def get_state(self):
+        """ Состояние между отрезками: гетеродин и фильтр
+
+        Имена массивов имеют вид 'nco.acc', 'postproc.buffers'.
+        """
+        return get_stage_states([self.nco, self.postproc],
+                                names=['nco', 'postproc'])
+
+    def set_state(self, state):
+        """ Восстанавливает состояние, полученное get_state """
+        set_stage_states([self.nco, self.postproc], state,
+                         names=['nco', 'postproc'])
+
 
 class PPResample(object):
     """ Преобразователь частоты дискретизации на основе полифазного фильтра.
@@ -147,7 +272,8 @@ class PPResample(object):
     __slots__ = ('r', 'p', 'q', 'chunk_size_in', 'chunk_size_out', 'b',
                  'bpartial', 'L', 'Lpartial', 'buffers', 'y', 'm_in')
 
-    def __init__(self, r, b, chunk_size_in, chunk_size_out, dtype=float):
+    def __init__(self, r, b, chunk_size_in, chunk_size_out, dtype=float,
+                 bpartial=None):
         """ Инициализация преобразователя частоты дискретизации
 
         Аргументы:
@@ -163,6 +289,10 @@ class PPResample(object):
             размер отрезка выходного сигнала
         dtype: str | numpy.dtype, необязательный
             тип данных, обрабатываемых преобразователем
+        bpartial: numpy.array | None, необязательный
+            готовый банк полифазных фильтров для b (например, из
+            RSA306.filtercache); используется без копирования, только для
+            чтения
 
         """
         _checkchunk_size_out(chunk_size_in, chunk_size_out, r)
@@ -176,36 +306,68 @@ class PPResample(object):
         # Длина фильтра для каждой фазы:
         self.Lpartial = int(np.ceil(self.L / q))
         self.buffers = np.zeros((Nphases, self.Lpartial), dtype=dtype)
-        self.bpartial = np.zeros((Nphases, self.Lpartial), dtype=dtype)
-        for k in range(self.L):
-            i = k % q
-            j = k // q
-            self.bpartial[i, j] = b[k]
+        # bpartial[i, j] = b[j*q + i]
+        if bpartial is None:
+            bpartial = get_kernel('polyphase_bank')(b, Nphases, dtype)
+        elif (bpartial.shape != (Nphases, self.Lpartial)
+              or bpartial.dtype != self.buffers.dtype):
+            raise ValueError('Банк фильтров bpartial не соответствует '
+                             'b, r и dtype')
+        self.bpartial = bpartial
         self.y = np.zeros(chunk_size_out, dtype=dtype)
         self.m_in = 0  # номер ветви, подключенной ко входу
 
     def __call__(self, x):
-        p, q = self.p, self.q
-        bufs, y = self.buffers, self.y
-        bpart, m_in = self.bpartial, self.m_in
-        i = 0  # счетчик входных отсчетов
-        j = 0  # счетчик выходных отсчетов
-        for j in range(self.chunk_size_out):
-            while i <= j * q // p:
-                bufs[m_in, 0] = x[i]
-                i += 1
-                m_in = (m_in - p % q) % q  # поворот ключа против часовой
-            y[j] = np.sum(bufs * bpart)
-            j += 1
-            bufs[:, 1:] = bufs[:, :-1]
-            bufs[:, 0] = 0
-        for k in range(i, self.chunk_size_in):
-            # Добавление оставшихся входных отсчетов в буферы
-            bufs[m_in, 0] = x[k]
-            m_in = (m_in - p % q) % q  # поворот ключа против часовой
-        y *= p
-        self.m_in = m_in
-        return y
+        # Цикл по отсчетам выполняет ядро RSA306.kernels (numpy или numba)
+        kernel = get_kernel('ppresample')
+        self.m_in = kernel(x[:self.chunk_size_in], self.buffers, self.bpartial,
+                           self.m_in, self.p, self.q, self.y)
+        self.y *= self.p
+        return self.y
+
+    def get_state(self):
+        """ Состояние между отрезками: буферы ветвей и номер входной ветви """
+        return {'buffers': self.buffers.copy(), 'm_in': np.array(self.m_in)}
+
+    def set_state(self, state):
+        """ Восстанавливает состояние, полученное get_state """
+        if state['buffers'].shape != self.buffers.shape:
+            raise ValueError('Размер буферов %s не соответствует фильтру %s'
+                             % (state['buffers'].shape, self.buffers.shape))
+        self.buffers[:] = state['buffers']
+        self.m_in = int(state['m_in'])
+
+
+def get_stage_states(stages, names=None):
+    """ Состояния цепочки этапов одним плоским словарем.
+
+    Аргументы:
+    ----------
+    stages: list
+        этапы обработки с методом get_state
+    names: list[str] | None
+        префиксы имен этапов; None -- номера этапов
+
+    Возвращает:
+    -----------
+    state: dict
+        массивы numpy с именами вида '<префикс>.<имя>', пригодные для np.savez
+
+    """
+    names = names or [str(i) for i in range(len(stages))]
+    return {'%s.%s' % (name, key): value
+            for name, stage in zip(names, stages)
+            for key, value in stage.get_state().items()}
+
+
+def set_stage_states(stages, state, names=None):
+    """ Восстанавливает состояния цепочки этапов (словарь get_stage_states) """
+    names = names or [str(i) for i in range(len(stages))]
+    for name, stage in zip(names, stages):
+        prefix = name + '.'
+        stage.set_state({key[len(prefix):]: value
+                         for key, value in state.items()
+                         if key.startswith(prefix)})
 
 
 def _checkchunk_size_out(chunk_size_in, chunk_size_out, r):
@@ -340,17 +502,13 @@ def ddc(adc: np.array, if_center_frequency: float, time_sample_rate: float):
 
     """
     size = len(adc)
-    sample_period = 1.0 / time_sample_rate
-    x_axis = np.linspace(0, size * sample_period, size)
-    lo_i = np.sin(if_center_frequency * (2 * np.pi) * x_axis)
-    lo_q = np.cos(if_center_frequency * (2 * np.pi) * x_axis)
-    del x_axis
+    lo = NCO(time_sample_rate, if_center_frequency, size,
+             dtype=np.complex128)()
 
-    i = adc * lo_i
-    q = adc * lo_q
+    i = adc * lo.imag
+    q = adc * lo.real
 
-    del lo_i
-    del lo_q
+    del lo
     nyquist = time_sample_rate / 2
 
     cutoff = 40e6 / nyquist
@@ -361,3 +519,200 @@ def ddc(adc: np.array, if_center_frequency: float, time_sample_rate: float):
     iq = 2 * iq
 
     return iq
+
+
+class FixedPointFrontEnd(object):
+    """ Целочисленный входной каскад: перенос спектра и CIC-прореживание.
+
+    Отсчеты АЦП int16 переносятся на нулевую частоту и прореживаются
+    CIC-фильтром (каскад интеграторов и гребенчатых фильтров) в целочисленной
+    арифметике; в complex64 преобразуется только сигнал на пониженной частоте
+    дискретизации. Последующую фильтрацию и прореживание выполняют обычные
+    этапы (PassbandToBaseband_IH с остаточной частотой гетеродина,
+    PPResample).
+
+    Если частота гетеродина равна Fs/4 (у RSA306 if_center_frequency = 28 МГц
+    при Fs = 112 МГц), гетеродин вырождается в последовательность 1, j, -1, -j
+    и перенос сводится к перестановке и смене знака отсчетов. Для прочих
+    частот с периодом гетеродина не более max_lo_period отсчетов используется
+    таблица гетеродина в формате Q15.
+
+    Примечания:
+    -----------
+    1. Гетеродин, как и в PassbandToBaseband_IH, равен exp(1j*2*pi*fh*t).
+    2. Переполнение интеграторов допустимо: арифметика по модулю 2**32 или
+       2**64 дает точный результат, пока выход помещается в разрядную сетку.
+    3. АЧХ CIC-фильтра имеет завал в полосе пропускания, его оценку дает
+       accuracy_report.
+
+    """
+
+    __slots__ = ('chunk_size', 'Fs', 'fh', 'R', 'N', 'chunk_size_out',
+                 'acc_dtype', 'lo_period', 'lo_re', 'lo_im', 'lo_shift', 'n',
+                 'integrators', 'combs', 'gain', 'y')
+
+    def __init__(self, chunk_size, Fs, fh, R, N=3, max_lo_period=4096):
+        """ Конструктор входного каскада.
+
+        Аргументы:
+        ----------
+        chunk_size: int
+            размер отрезка входного сигнала (кратен R)
+        Fs: float
+            частота дискретизации входного сигнала, Гц
+        fh: float
+            частота гетеродина, Гц
+        R: int
+            коэффициент прореживания CIC-фильтра
+        N: int
+            порядок (число звеньев) CIC-фильтра
+        max_lo_period: int
+            наибольший допустимый период таблицы гетеродина, отсчетов
+
+        """
+        if chunk_size % R:
+            raise ValueError('chunk_size (%d) не делится на R (%d)'
+                             % (chunk_size, R))
+        self.chunk_size, self.Fs, self.fh = chunk_size, Fs, fh
+        self.R, self.N = R, N
+        self.chunk_size_out = chunk_size // R
+
+        ratio = Fraction(fh) / Fraction(Fs)
+        if ratio.denominator > max_lo_period:
+            raise ValueError('Период гетеродина fh/Fs = %s превышает %d '
+                             'отсчетов' % (ratio, max_lo_period))
+        self.lo_period = ratio.denominator
+        k = np.arange(self.lo_period)
+        phase = 2 * pi * ratio.numerator * k / self.lo_period
+        if self.lo_period in (1, 2, 4):
+            # Тривиальный гетеродин: значения 0, 1, -1, точное представление
+            self.lo_re = np.rint(np.cos(phase)).astype(np.int32)
+            self.lo_im = np.rint(np.sin(phase)).astype(np.int32)
+            self.lo_shift = 0
+        else:
+            self.lo_re = np.rint(np.cos(phase) * (2**15 - 1)).astype(np.int32)
+            self.lo_im = np.rint(np.sin(phase) * (2**15 - 1)).astype(np.int32)
+            self.lo_shift = 15
+
+        # Разрядность: 16 бит АЦП + знак после смены знака + таблица + рост CIC
+        bits = 17 + self.lo_shift + int(np.ceil(N * np.log2(R)))
+        self.acc_dtype = np.int32 if bits <= 32 else np.int64
+        self.gain = float(R)**N * 2.0**self.lo_shift
+
+        self.n = 0
+        self.integrators = np.zeros((2, N), dtype=self.acc_dtype)
+        self.combs = np.zeros((2, N), dtype=self.acc_dtype)
+        self.y = np.zeros(self.chunk_size_out, dtype=np.complex64)
+
+    def __call__(self, x_in):
+        """ Обработка отрезка сигнала """
+        n0, period = self.n, self.lo_period
+        self.n = (n0 + self.chunk_size) % period
+
+        x = np.asarray(x_in).astype(self.acc_dtype)
+        v = np.empty((2, self.chunk_size), dtype=self.acc_dtype)
+        if self.lo_shift == 0:
+            # Гетеродин из 0 и +-1: каждая фаза -- прореженный срез входа,
+            # который копируется, меняет знак или обнуляется без умножений
+            for k in range(period):
+                j = (k - n0) % period
+                for row, lo in ((0, self.lo_re[k]), (1, self.lo_im[k])):
+                    if lo > 0:
+                        v[row, j::period] = x[j::period]
+                    elif lo < 0:
+                        v[row, j::period] = -x[j::period]
+                    else:
+                        v[row, j::period] = 0
+        else:
+            idx = (n0 + np.arange(self.chunk_size)) % period
+            np.multiply(x, self.lo_re[idx], out=v[0])
+            np.multiply(x, self.lo_im[idx], out=v[1])
+
+        with np.errstate(over='ignore'):
+            for s in range(self.N):
+                np.cumsum(v, axis=1, dtype=self.acc_dtype, out=v)
+                v += self.integrators[:, s:s+1]
+                self.integrators[:, s] = v[:, -1]
+            v = v[:, self.R-1::self.R]
+            for s in range(self.N):
+                last = v[:, -1].copy()
+                v = np.diff(v, axis=1, prepend=self.combs[:, s:s+1])
+                self.combs[:, s] = last
+
+        self.y.real = v[0]
+        self.y.imag = v[1]
+        self.y *= np.float32(1 / self.gain)
+        return self.y
+
+    def get_state(self):
+        """ Состояние между отрезками: фаза гетеродина и звенья CIC-фильтра """
+        return {'n': np.array(self.n), 'integrators': self.integrators.copy(),
+                'combs': self.combs.copy()}
+
+    def set_state(self, state):
+        """ Восстанавливает состояние, полученное get_state """
+        self.n = int(state['n'])
+        self.integrators[:] = state['integrators']
+        self.combs[:] = state['combs']
+
+    def response(self, f):
+        """ АЧХ CIC-фильтра (относительно нулевой частоты) на частотах f """
+        f = np.abs(np.asarray(f, dtype=float)) / self.Fs
+        with np.errstate(invalid='ignore', divide='ignore'):
+            h = np.sin(pi * f * self.R) / (self.R * np.sin(pi * f))
+        return np.abs(np.where(f == 0, 1.0, h))**self.N
+
+    def accuracy_report(self, x, bandwidth):
+        """ Сравнение с эталонной обработкой в float64.
+
+        Эталон: перенос спектра умножением на exp(1j*2*pi*fh*t) в float64 и
+        каскад N фильтров скользящего среднего длины R с прореживанием в R раз
+        (scipy.signal.lfilter), что математически совпадает с CIC-фильтром.
+
+        Аргументы:
+        ----------
+        x: np.array
+            тестовые отсчеты int16 (длина кратна chunk_size)
+        bandwidth: float
+            полоса полезного сигнала после переноса (двусторонняя), Гц
+
+        Возвращает:
+        -----------
+        report: dict
+            max_abs_error, rms_error -- ошибка относительно эталона;
+            snr_db -- отношение мощности эталона к мощности ошибки, дБ;
+            passband_droop_db -- завал АЧХ CIC на краю полосы, дБ;
+            alias_rejection_db -- наихудшее подавление составляющих,
+            наложившихся на полосу при прореживании, дБ
+
+        """
+        front = FixedPointFrontEnd(self.chunk_size, self.Fs, self.fh, self.R,
+                                   self.N)
+        size = self.chunk_size
+        n_chunks = len(x) // size
+        fixed = np.concatenate([front(x[k*size:(k+1)*size]).copy()
+                                for k in range(n_chunks)])
+
+        n = np.arange(n_chunks * self.chunk_size)
+        ratio = float(Fraction(self.fh) / Fraction(self.Fs) % 1)
+        mixed = x[:len(n)].astype(np.float64) * exp(1j * 2 * pi * ratio * n)
+        h = np.ones(1)
+        for _ in range(self.N):
+            h = np.convolve(h, np.ones(self.R))
+        reference = signal.lfilter(h / self.R**self.N, 1.0, mixed)
+        reference = reference[self.R-1::self.R]
+
+        error = fixed - reference
+        edge = bandwidth / 2
+        Fs_out = self.Fs / self.R
+        aliases = [k * Fs_out + s * edge
+                   for k in range(1, self.R // 2 + 1) for s in (-1, 1)]
+        error_power = np.mean(np.abs(error)**2)
+        edge_gain = self.response(edge)
+        alias_gain = np.max(self.response(aliases))
+        return {'max_abs_error': float(np.max(np.abs(error))),
+                'rms_error': float(np.sqrt(error_power)),
+                'snr_db': float(10 * np.log10(np.mean(np.abs(reference)**2)
+                                              / error_power)),
+                'passband_droop_db': float(-20 * np.log10(edge_gain)),
+                'alias_rejection_db': float(-20 * np.log10(alias_gain))}
@@ -0,0 +1,463 @@
+""" Обнаружение участков записи с сигналом.
+
+Большая часть записей -- шум с редкими пачками сигнала. Предварительный
+проход вычисляет мощность блоков прямо по отсчетам int16 без БПФ и переноса
+спектра и выделяет интервалы активности с гистерезисом, чтобы дорогая
+обработка выполнялась только на них.
+
+Для импульсных сигналов PulseDetector выделяет отдельные импульсы с
+точностью до отсчета и измеряет их параметры (длительность, период
+повторения, мощность, смещение несущей).
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from RSA306.rc import SAMPLES_PER_BLOCK
+
+_LOAD_OHM = 50
+
+PulseTable = namedtuple('PulseTable', 'start stop width pri peak_power mean_power carrier_offset hinted')
+PulseTable.__doc__ = """ Параметры импульсов в столбцовом виде, упорядочены по start.
+
+start, stop: np.array[int64] - номера первого отсчета импульса и отсчета, следующего за последним
+width: np.array[float64] - длительность импульса, с
+pri: np.array[float64] - период повторения: интервал от начала предыдущего импульса, с (nan для первого)
+peak_power: np.array[float64] - наибольшая мгновенная мощность, дБм
+mean_power: np.array[float64] - средняя мощность, дБм
+carrier_offset: np.array[float64] - смещение несущей относительно нулевой частоты, Гц (nan для вещественных отсчетов)
+hinted: np.array[bool] - импульс начался в окне подсказки (события запуска)
+"""
+
+
+def block_power(samples, block_size, adc_scale=1.0):
+    """ Средняя мощность блоков сигнала, дБм.
+
+    Аргументы:
+    ----------
+    samples: np.array
+        отсчеты АЦП (int16), длина кратна block_size (хвост отбрасывается)
+    block_size: int
+        размер блока, отсчетов
+    adc_scale: float
+        масштаб АЦП из channel_correction (отсчет -> В)
+
+    Возвращает:
+    -----------
+    power_dBm: np.array
+        мощность каждого блока на нагрузке 50 Ом, дБм
+
+    """
+    n_blocks = len(samples) // block_size
+    x = np.asarray(samples[:n_blocks * block_size], dtype=np.float32).reshape(n_blocks, block_size)
+    mean_square = np.einsum('ij,ij->i', x, x) / block_size
+    return 10 * np.log10(np.maximum(mean_square, 1e-12) * adc_scale**2 / _LOAD_OHM) + 30
+
+
+def _hysteresis(power, on_level, off_level, state):
+    """ Состояние активности каждого блока при пороге включения on_level и выключения off_level """
+    s = np.full(len(power), -1, dtype=np.int8)
+    s[power < off_level] = 0
+    s[power >= on_level] = 1
+    last = np.where(s >= 0, np.arange(len(power)), -1)
+    np.maximum.accumulate(last, out=last)
+    return np.where(last >= 0, s[np.maximum(last, 0)], state).astype(bool)
+
+
+def _block_powers(reader, block_size, blocks_per_read):
+    """ Мощность блоков записи по порядку, порциями """
+    adc_scale = float(reader.channel_correction.adc_scale)
+    frames = reader.memmap() if reader.supports_memmap and block_size == SAMPLES_PER_BLOCK else None
+    # Пофреймово отображаются только записи r3f; отсчеты r3a (одномерный массив) читаются через readblock
+    if frames is not None and frames.dtype.names and 'samples' in frames.dtype.names:
+        frames = frames['samples']
+        for start in range(0, len(frames), blocks_per_read):
+            yield block_power(np.asarray(frames[start:start + blocks_per_read]).reshape(-1), block_size, adc_scale)
+    else:
+        for samples in reader.readblock(block_size * blocks_per_read, True):
+            yield block_power(samples, block_size, adc_scale)
+
+
+def _to_dbm(mean_square, adc_scale):
+    """ Средний квадрат отсчетов -> мощность на нагрузке 50 Ом, дБм (как в block_power) """
+    return 10 * np.log10(np.maximum(mean_square, 1e-30) * adc_scale**2 / _LOAD_OHM) + 30
+
+
+def _from_dbm(level, adc_scale):
+    """ Мощность, дБм -> средний квадрат отсчетов """
+    return 10**((level - 30) / 10) * _LOAD_OHM / adc_scale**2
+
+
+def _empty_pulses():
+    empty = np.empty(0)
+    return PulseTable(start=np.empty(0, dtype=np.int64), stop=np.empty(0, dtype=np.int64), width=empty, pri=empty,
+                      peak_power=empty, mean_power=empty, carrier_offset=empty, hinted=np.empty(0, dtype=bool))
+
+
+def concat_pulses(tables):
+    """ Объединяет таблицы импульсов PulseTable в одну """
+    tables = list(tables)
+    if not tables:
+        return _empty_pulses()
+    return PulseTable(*(np.concatenate(columns) for columns in zip(*tables)))
+
+
+class PulseDetector(object):
+    """ Потоковый обнаружитель импульсов с гистерезисом.
+
+    Мгновенная мощность (|x|**2 для комплексной огибающей, x**2 для
+    отсчетов АЦП) сглаживается скользящим средним по smooth отсчетам и
+    сравнивается с порогами: импульс начинается, когда мощность достигает
+    on_level, и заканчивается, когда она падает ниже off_level. Сглаженная
+    мощность определяет только наличие импульса: его границы -- первый и
+    последний отсчет с мгновенной мощностью не ниже off_level в окнах
+    сглаживания, на которых изменилось состояние, а пиковая и средняя
+    мощность и смещение несущей измеряются по отсчетам между этими
+    границами. Поэтому длительность не зависит от smooth и порогов (для
+    прямоугольных импульсов она точна до отсчета). Все вычисления
+    векторные, по отрезку целиком. Состояние (хвост сглаживающего
+    окна, последний отсчет, незавершенный импульс, начало предыдущего
+    импульса) переносится между отрезками, поэтому результат не зависит от
+    размера отрезков (измеренные мощности и смещение несущей -- с точностью
+    до округления).
+
+    Пример:
+    -------
+    detector = PulseDetector(Fs, on_level=-40, off_level=-46)
+    tables = [detector(block) for block in blocks]
+    pulses = concat_pulses(tables + [detector.flush()])
+
+    """
+
+    def __init__(self, Fs, on_level, off_level, smooth=8, min_width=1, adc_scale=1.0, hints=None, hint_window=0,
+                 hint_level=None):
+        """ Конструктор обнаружителя.
+
+        Аргументы:
+        ----------
+        Fs: float
+            частота дискретизации входного сигнала, Гц
+        on_level: float
+            порог начала импульса, дБм (мощность считается как в block_power)
+        off_level: float
+            порог окончания импульса, дБм (не больше on_level)
+        smooth: int
+            длина сглаживающего окна, отсчетов
+        min_width: int
+            импульсы короче min_width отсчетов отбрасываются
+        adc_scale: float
+            масштаб отсчетов (отсчет -> В), например channel_correction.adc_scale
+        hints: np.array | None
+            упорядоченные номера отсчетов подсказок (например, событий запуска из футеров)
+        hint_window: int
+            длительность окна после подсказки, отсчетов
+        hint_level: float | None
+            порог начала импульса внутри окна подсказки, дБм; None -- off_level
+
+        """
+        if off_level > on_level:
+            raise ValueError('Порог выключения off_level должен быть не больше порога включения on_level')
+        self.Fs = Fs
+        self.smooth = smooth
+        self.min_width = min_width
+        self.adc_scale = adc_scale
+        self.on = _from_dbm(on_level, adc_scale)
+        self.off = _from_dbm(off_level, adc_scale)
+        self.hint_on = _from_dbm(off_level if hint_level is None else hint_level, adc_scale)
+        self.hints = np.empty(0, dtype=np.int64) if hints is None else np.asarray(hints, dtype=np.int64)
+        self.hint_window = hint_window
+
+        self.position = 0
+        self.active = False
+        self.tail = np.zeros(smooth - 1)
+        self.history = np.zeros(smooth, dtype=np.complex128)
+        self.open = None  # [start, peak, energy, cross, hinted] незавершенного импульса
+        self.last_start = None
+        self.last_stop = 0
+        self.is_complex = False
+
+    def _in_hint(self, positions):
+        """ Попадают ли отсчеты positions в окна подсказок """
+        if len(self.hints) == 0 or self.hint_window <= 0:
+            return np.zeros(len(positions), dtype=bool)
+        k = np.searchsorted(self.hints, positions, side='right') - 1
+        return (k >= 0) & (positions - self.hints[np.maximum(k, 0)] < self.hint_window)
+
+    def __call__(self, x):
+        """ Обрабатывает отрезок сигнала и возвращает PulseTable импульсов, закончившихся в нем """
+        x = np.asarray(x)
+        n = len(x)
+        if n == 0:
+            return _empty_pulses()
+        is_complex = self.is_complex = np.iscomplexobj(x)
+        if is_complex:
+            p = x.real.astype(np.float64)**2 + x.imag.astype(np.float64)**2
+        else:
+            p = x.astype(np.float64)**2
+
+        # Индексы extended (мгновенная мощность вместе с хвостом предыдущего
+        # отрезка) смещены на o = smooth - 1 относительно индексов отрезка
+        o = self.smooth - 1
+        extended = np.concatenate((self.tail, p))
+        cumulative = np.concatenate(([0.0], np.cumsum(extended)))
+        power = (cumulative[self.smooth:] - cumulative[:n]) / self.smooth
+        if o:
+            self.tail = extended[-o:]
+
+        positions = self.position + np.arange(n, dtype=np.int64)
+        hinted = self._in_hint(positions)
+        on = np.where(hinted, min(self.on, self.hint_on), self.on) if hinted.any() else self.on
+        active = _hysteresis(power, on, self.off, self.active)
+
+        changes = np.diff(active.astype(np.int8), prepend=np.int8(self.active))
+        starts = np.flatnonzero(changes == 1)
+        stops = np.flatnonzero(changes == -1)
+        n_closed = len(stops)
+        continued = self.active
+        if continued:
+            starts = np.concatenate(([0], starts))
+
+        # Границы уточняются по мгновенной мощности: окно сглаживания, на
+        # котором мощность впервые достигла порога, содержит первый отсчет
+        # импульса, а окно последнего активного отсчета -- последний
+        index = np.arange(n + o)
+        above = extended >= self.off
+        prev_above = np.maximum.accumulate(np.where(above, index, -1))
+        next_above = np.minimum.accumulate(np.where(above, index, n + o)[::-1])[::-1]
+        last_ext = stops - 1 + o
+        stop_ext = np.where(last_ext >= 0, prev_above[np.maximum(last_ext, 0)], -1) + 1
+        if active[-1]:
+            stop_ext = np.append(stop_ext, n + o)
+
+        lower = np.concatenate(([self.last_stop - self.position + o], stop_ext[:-1]))
+        lower = np.maximum(starts, lower)
+        first = next_above[np.minimum(lower, n + o - 1)]
+        start_ext = np.where(first <= starts + o, first, lower)
+        if continued:
+            start_ext[0] = o
+
+        peak = np.maximum.reduceat(np.append(extended, 0.0), np.stack((start_ext, stop_ext), axis=1).ravel())[::2]
+        peak = np.where(stop_ext > start_ext, peak, 0.0)
+        run_energy = cumulative[stop_ext] - cumulative[start_ext]
+        if is_complex:
+            z = np.concatenate((self.history, x.astype(np.complex128)))
+            cross = np.concatenate(([0j], np.cumsum(z[1:] * np.conj(z[:-1]))))
+            run_cross = cross[stop_ext] - cross[start_ext]
+            self.history = z[-self.smooth:]
+        else:
+            run_cross = np.zeros(len(starts), dtype=complex)
+        run_starts = self.position - o + start_ext
+        run_stops = self.position - o + stop_ext
+        run_hinted = hinted[starts]
+
+        if self.open is not None and len(starts):
+            run_starts[0] = self.open[0]
+            peak[0] = max(peak[0], self.open[1])
+            run_energy[0] += self.open[2]
+            run_cross[0] += self.open[3]
+            run_hinted[0] = self.open[4]
+        self.open = None
+        if active[-1]:
+            self.open = [int(run_starts[-1]), float(peak[-1]), float(run_energy[-1]), complex(run_cross[-1]),
+                         bool(run_hinted[-1])]
+        if n_closed:
+            self.last_stop = int(run_stops[n_closed - 1])
+        closed = slice(0, n_closed)
+
+        self.position += n
+        self.active = bool(active[-1])
+        return self._table(run_starts[closed], run_stops[closed], peak[closed], run_energy[closed],
+                           run_cross[closed] if is_complex else None, run_hinted[closed])
+
+    def _table(self, starts, stops, peak, energy, cross, hinted):
+        """ PulseTable по накопленным величинам завершенных импульсов """
+        width = stops - starts
+        keep = width >= self.min_width
+        starts, stops, width = starts[keep], stops[keep], width[keep]
+
+        pri = np.empty(len(starts))
+        if len(starts):
+            pri[0] = np.nan if self.last_start is None else (starts[0] - self.last_start) / self.Fs
+            pri[1:] = np.diff(starts) / self.Fs
+            self.last_start = int(starts[-1])
+        if cross is None:
+            carrier_offset = np.full(len(starts), np.nan)
+        else:
+            carrier_offset = np.angle(cross[keep]) * self.Fs / (2 * np.pi)
+        return PulseTable(start=starts.astype(np.int64), stop=stops.astype(np.int64), width=width / self.Fs, pri=pri,
+                          peak_power=_to_dbm(peak[keep], self.adc_scale),
+                          mean_power=_to_dbm(energy[keep] / np.maximum(width, 1), self.adc_scale),
+                          carrier_offset=carrier_offset, hinted=hinted[keep])
+
+    def flush(self):
+        """ Завершает незавершенный импульс в конце потока и возвращает его как PulseTable """
+        if self.open is None:
+            return _empty_pulses()
+        start, peak, energy, cross, hinted = self.open
+        self.open = None
+        self.active = False
+        return self._table(np.array([start]), np.array([self.position]), np.array([peak]), np.array([energy]),
+                           np.array([cross]) if self.is_complex else None, np.array([hinted]))
+
+
+def detect_pulses(reader, on_db=-30.0, off_db=-36.0, block_size=2**20, use_triggers=False, hint_window=0,
+                  hint_db=None, **kwargs):
+    """ Обнаруживает импульсы по отсчетам АЦП записи.
+
+    Аргументы:
+    ----------
+    reader: RSA306.reader.BaseReader
+        источник отсчетов
+    on_db, off_db: float
+        пороги начала и окончания импульса относительно reference_level, дБ
+    block_size: int
+        размер отрезка чтения, отсчетов
+    use_triggers: bool
+        использовать события запуска из футеров (reader.triggers()) как подсказки
+    hint_window: int
+        длительность окна после события запуска, отсчетов
+    hint_db: float | None
+        порог начала импульса в окне подсказки относительно reference_level, дБ; None -- off_db
+    kwargs:
+        smooth, min_width (см. PulseDetector)
+
+    Возвращает:
+    -----------
+    pulses: PulseTable
+        номера отсчетов -- от начала записи; carrier_offset не определено (вещественные отсчеты)
+
+    """
+    reference_level = float(reader.instrument_state.reference_level)
+    hints = reader.triggers().sample_index if use_triggers else None
+    detector = PulseDetector(float(reader.data_format.sample_rate), reference_level + on_db,
+                             reference_level + off_db, adc_scale=float(reader.channel_correction.adc_scale),
+                             hints=hints, hint_window=hint_window,
+                             hint_level=None if hint_db is None else reference_level + hint_db, **kwargs)
+    tables = [detector(samples) for samples in reader.readblock(block_size, True)]
+    tables.append(detector.flush())
+    return concat_pulses(tables)
+
+
+def scan_activity(reader, on_db=-30.0, off_db=-36.0, block_size=SAMPLES_PER_BLOCK, pad_blocks=1, merge_blocks=2,
+                  blocks_per_read=1024):
+    """ Находит интервалы записи, содержащие сигнал.
+
+    Аргументы:
+    ----------
+    reader: RSA306.reader.BaseReader | RSA306.captureset.CaptureSet
+        источник отсчетов
+    on_db: float
+        порог начала активности относительно reference_level, дБ
+    off_db: float
+        порог окончания активности относительно reference_level, дБ
+        (не больше on_db, разность задает гистерезис)
+    block_size: int
+        размер блока оценки мощности, отсчетов; при SAMPLES_PER_BLOCK мощность
+        r3f вычисляется пофреймово по отображению файла в память
+    pad_blocks: int
+        число блоков, добавляемых к каждому интервалу с обеих сторон
+    merge_blocks: int
+        интервалы, разделенные не более чем этим числом блоков, объединяются
+    blocks_per_read: int
+        число блоков, обрабатываемых за одно чтение
+
+    Возвращает:
+    -----------
+    intervals: np.array
+        массив int64 формы (N, 2): номера первого отсчета и отсчета,
+        следующего за последним, для каждого интервала активности
+
+    """
+    if off_db > on_db:
+        raise ValueError('Порог выключения off_db должен быть не больше порога включения on_db')
+    reference_level = float(reader.instrument_state.reference_level)
+    on_level, off_level = reference_level + on_db, reference_level + off_db
+
+    edges = []
+    state = False
+    n_blocks = 0
+    for power in _block_powers(reader, block_size, blocks_per_read):
+        if len(power) == 0:
+            continue
+        active = _hysteresis(power, on_level, off_level, state)
+        changes = np.flatnonzero(np.diff(active.astype(np.int8), prepend=np.int8(state)))
+        edges.append(changes + n_blocks)
+        state = bool(active[-1])
+        n_blocks += len(power)
+
+    edges = np.concatenate(edges) if edges else np.empty(0, dtype=np.int64)
+    if state:
+        edges = np.append(edges, n_blocks)
+    intervals = edges.reshape(-1, 2).astype(np.int64)
+
+    if len(intervals):
+        intervals[:, 0] = np.maximum(intervals[:, 0] - pad_blocks, 0)
+        intervals[:, 1] = np.minimum(intervals[:, 1] + pad_blocks, n_blocks)
+        intervals = merge_intervals(intervals, merge_blocks)
+    return intervals * block_size
+
+
+def merge_intervals(intervals, gap=0):
+    """ Объединяет пересекающиеся и близкие (не дальше gap) интервалы.
+
+    Аргументы:
+    ----------
+    intervals: np.array
+        массив (N, 2) интервалов [start, stop), упорядоченных по start
+    gap: int
+        наибольшее расстояние между объединяемыми интервалами
+
+    Возвращает:
+    -----------
+    np.array
+        массив (M, 2) непересекающихся интервалов
+
+    """
+    intervals = np.asarray(intervals, dtype=np.int64).reshape(-1, 2)
+    if len(intervals) == 0:
+        return intervals
+    reach = np.maximum.accumulate(intervals[:, 1])
+    starts_new = np.concatenate(([True], intervals[1:, 0] > reach[:-1] + gap))
+    group = np.cumsum(starts_new) - 1
+    merged = np.empty((group[-1] + 1, 2), dtype=np.int64)
+    merged[:, 0] = intervals[starts_new, 0]
+    merged[:, 1] = np.maximum.reduceat(intervals[:, 1], np.flatnonzero(starts_new))
+    return merged
+
+
+def iter_active_blocks(reader, intervals, samples_per_block, with_positions=False):
+    """ Считывает только отсчеты интервалов активности блоками фиксированного размера.
+
+    Аргументы:
+    ----------
+    reader: RSA306.reader.Reader | RSA306.captureset.CaptureSet
+        источник с методом read_range
+    intervals: np.array
+        интервалы (N, 2), например результат scan_activity
+    samples_per_block: int
+        размер блока, отсчетов; последний блок интервала содержит остаток
+        интервала и может быть короче (этапам с фиксированным размером
+        отрезка его нужно дополнить, как это делает decimated_iq)
+    with_positions: bool
+        True -- возвращать пары (номер первого отсчета блока, блок)
+
+    Возвращает:
+    -----------
+    adc_samples: np.array | tuple(int, np.array)
+        очередной блок отсчетов
+
+    Примечание:
+    -----------
+    Функция-генератор. Результат можно передать как источник в
+    ThreadedPipeline.run. Между интервалами сигнал прерывается, поэтому
+    состояние фильтров на границе интервала относится к предыдущему
+    интервалу; номера отсчетов with_positions позволяют разделить интервалы.
+
+    """
+    for start, stop in np.asarray(intervals, dtype=np.int64).reshape(-1, 2):
+        for block_start in range(int(start), int(stop), samples_per_block):
+            block = reader.read_range(block_start, min(block_start + samples_per_block, int(stop)))
+            if len(block) == 0:
+                break
+            yield (block_start, block) if with_positions else block
@@ -0,0 +1,270 @@
+""" Многоуровневая огибающая (min/max/RMS) записи для просмотра во времени.
+
+Огибающая вычисляется за один проход по записи и сохраняется рядом с ней в
+виде уровней: точка уровня 0 содержит минимум, максимум и средний квадрат
+base соседних отсчетов, точка уровня k -- тех же величин по base * 2**k
+отсчетам. Для отображения любого интервала берется уровень, число точек
+которого в интервале не превышает разрешения экрана, поэтому читается не
+более нескольких тысяч точек независимо от длительности записи.
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+_MAGIC = b'RSA306ENV1'
+_HEADER_ALIGN = 64
+
+ENVELOPE_DTYPE = np.dtype([('min', '<i2'), ('max', '<i2'), ('ms', '<f4')])
+
+
+class _LevelWriter(object):
+    """ Накопитель одного уровня огибающей: пишет точки и формирует точки следующего уровня """
+
+    __slots__ = 'file', 'pending', 'rows'
+
+    def __init__(self, file):
+        self.file = file
+        self.pending = None
+        self.rows = 0
+
+
+def _reduce(points):
+    """ Попарное объединение точек огибающей (длина points четная) """
+    pairs = points.reshape(-1, 2)
+    reduced = np.empty(len(pairs), dtype=ENVELOPE_DTYPE)
+    reduced['min'] = pairs['min'].min(axis=1)
+    reduced['max'] = pairs['max'].max(axis=1)
+    reduced['ms'] = pairs['ms'].mean(axis=1)
+    return reduced
+
+
+def _points(samples, base):
+    """ Точки уровня 0 для отсчетов samples (последняя точка может охватывать меньше base отсчетов) """
+    n_full = len(samples) // base
+    n_points = -(-len(samples) // base)
+    points = np.empty(n_points, dtype=ENVELOPE_DTYPE)
+    if n_full:
+        x = np.asarray(samples[:n_full * base]).reshape(n_full, base)
+        points['min'][:n_full] = x.min(axis=1)
+        points['max'][:n_full] = x.max(axis=1)
+        xf = x.astype(np.float32)
+        points['ms'][:n_full] = np.einsum('ij,ij->i', xf, xf) / base
+    if n_points > n_full:
+        tail = np.asarray(samples[n_full * base:])
+        points['min'][-1], points['max'][-1] = tail.min(), tail.max()
+        points['ms'][-1] = np.mean(tail.astype(np.float64)**2)
+    return points
+
+
+class Envelope(object):
+    """ Чтение огибающей, построенной build_envelope.
+
+    Атрибуты:
+    ---------
+    header: dict
+        параметры построения (base, sample_rate, n_samples, adc_scale, уровни)
+    sample_rate: float
+        частота дискретизации записи, Гц
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as env_file:
+            if env_file.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError('Файл %s не является огибающей записи' % path)
+            header_size, = struct.unpack('<Q', env_file.read(8))
+            self.header = json.loads(env_file.read(header_size).decode())
+        self.sample_rate = self.header['sample_rate']
+        self._levels = []
+        for level in self.header['levels']:
+            if level['rows'] == 0:
+                self._levels.append(np.empty(0, dtype=ENVELOPE_DTYPE))
+            else:
+                self._levels.append(np.memmap(path, dtype=ENVELOPE_DTYPE, mode='r', offset=level['offset'],
+                                              shape=(level['rows'],)))
+
+    @property
+    def n_levels(self):
+        return len(self._levels)
+
+    def level_rows(self, level):
+        """ Число точек уровня level """
+        return self.header['levels'][level]['rows']
+
+    def query(self, t_start, t_stop, max_points=2000, level=None, reader=None):
+        """ Огибающая интервала времени.
+
+        Аргументы:
+        ----------
+        t_start, t_stop: float
+            интервал времени от начала записи, с
+        max_points: int
+            наибольшее число точек результата; выбирается самый подробный
+            уровень, укладывающийся в это ограничение
+        level: int | None
+            номер уровня; None -- выбрать автоматически по max_points
+        reader: RSA306.reader.BaseReader | None
+            ридер записи; если задан и интервал содержит не более max_points
+            отсчетов, возвращаются сами отсчеты (min = max, rms = |x|)
+
+        Возвращает:
+        -----------
+        times: np.array
+            время начала каждой точки, с
+        v_min, v_max, v_rms: np.array
+            минимум, максимум и СКЗ напряжения на каждой точке, В (масштаб adc_scale)
+
+        """
+        h = self.header
+        adc_scale = np.float32(h['adc_scale'])
+        first = min(max(int(np.floor(t_start * self.sample_rate)), 0), h['n_samples'])
+        last = min(max(int(np.ceil(t_stop * self.sample_rate)), first), h['n_samples'])
+
+        if level is None and reader is not None and last - first <= max_points:
+            x = reader.read_range(first, last).astype(np.float32) * adc_scale
+            return np.arange(first, first + len(x)) / self.sample_rate, x, x, np.abs(x)
+
+        if level is None:
+            level = self.n_levels - 1
+            for k in range(self.n_levels):
+                if (last - first) / (h['base'] * 2**k) <= max_points:
+                    level = k
+                    break
+        points_size = h['base'] * 2**level
+        rows = self.level_rows(level)
+        i_start = min(first // points_size, rows)
+        i_stop = min(max(-(-last // points_size), i_start), rows)
+
+        points = np.asarray(self._levels[level][i_start:i_stop])
+        times = np.arange(i_start, i_stop) * points_size / self.sample_rate
+        return (times, points['min'].astype(np.float32) * adc_scale, points['max'].astype(np.float32) * adc_scale,
+                np.sqrt(points['ms']) * adc_scale)
+
+
+def envelope_path(capture_path):
+    """ Путь к файлу огибающей рядом с записью """
+    return os.path.splitext(capture_path)[0] + '.env'
+
+
+def _chunks(reader, samples_per_read):
+    """ Отрезки отсчетов записи: срезы отображения r3a в память или блоки readblock """
+    samples = reader.memmap() if reader.supports_memmap else None
+    if samples is not None and samples.dtype.names is None and samples.ndim == 1:
+        for start in range(0, len(samples), samples_per_read):
+            yield samples[start:start + samples_per_read]
+    else:
+        yield from reader.readblock(samples_per_read, True)
+
+
+def build_envelope(reader, path=None, base=64, points_per_read=16384):
+    """ Строит многоуровневую огибающую за один проход по записи.
+
+    Аргументы:
+    ----------
+    reader: RSA306.reader.BaseReader | RSA306.captureset.CaptureSet
+        источник отсчетов
+    path: str | None
+        путь к файлу огибающей; по умолчанию рядом с записью (расширение .env)
+    base: int
+        число отсчетов в точке уровня 0
+    points_per_read: int
+        число точек уровня 0, вычисляемых за одно чтение
+
+    Возвращает:
+    -----------
+    path: str
+        путь к построенному файлу
+
+    Примечание:
+    -----------
+    Каждый уровень охватывает всю запись: точка, оставшаяся без пары в
+    конце уровня, переносится на следующий уровень без объединения. Верхний
+    уровень состоит из одной точки. Средние квадраты точек объединяются с
+    равными весами, поэтому неполная последняя точка записи немного
+    искажает СКЗ точек верхних уровней, в которые она входит.
+
+    """
+    if path is None:
+        path = envelope_path(reader.readers[0]._path_to_file if hasattr(reader, 'readers') else reader._path_to_file)
+
+    tmp_dir = path + '.parts'
+    os.makedirs(tmp_dir, exist_ok=True)
+    levels = []
+
+    def level(k):
+        while len(levels) <= k:
+            levels.append(_LevelWriter(open(os.path.join(tmp_dir, '%d' % len(levels)), 'wb')))
+        return levels[k]
+
+    def push(k, points):
+        """ Записывает точки уровня k и передает попарные объединения на уровень k+1 """
+        lw = level(k)
+        lw.file.write(points.tobytes())
+        lw.rows += len(points)
+        if lw.pending is not None:
+            points = np.concatenate((lw.pending, points))
+        n_even = len(points) // 2 * 2
+        lw.pending = points[n_even:] if n_even < len(points) else None
+        if n_even:
+            push(k + 1, _reduce(points[:n_even]))
+
+    n_samples = 0
+    try:
+        for samples in _chunks(reader, base * points_per_read):
+            if len(samples) == 0:
+                continue
+            n_samples += len(samples)
+            push(0, _points(samples, base))
+
+        k = 0
+        while k < len(levels):
+            lw = levels[k]
+            if lw.pending is not None:
+                points, lw.pending = lw.pending, None
+                if lw.rows > 1:
+                    push(k + 1, points)
+            k += 1
+
+        for lw in levels:
+            lw.file.close()
+
+        header = {'base': base, 'sample_rate': float(reader.data_format.sample_rate), 'n_samples': n_samples,
+                  'adc_scale': float(reader.channel_correction.adc_scale), 'dtype': ENVELOPE_DTYPE.descr,
+                  'levels': []}
+        # Смещения уровней зависят от размера заголовка, поэтому начало данных
+        # увеличивается, пока заголовок с вычисленными смещениями не поместится
+        data_start = 0
+        while True:
+            offset = data_start
+            header['levels'] = []
+            for lw in levels:
+                header['levels'].append({'rows': lw.rows, 'offset': offset})
+                offset += lw.rows * ENVELOPE_DTYPE.itemsize
+            header_bytes = json.dumps(header).encode()
+            needed = -(-(len(_MAGIC) + 8 + len(header_bytes)) // _HEADER_ALIGN) * _HEADER_ALIGN
+            if needed <= data_start:
+                break
+            data_start = needed
+
+        with open(path, 'wb') as env_file:
+            env_file.write(_MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes)
+            env_file.write(b'\0' * (data_start - env_file.tell()))
+            for n in range(len(levels)):
+                with open(os.path.join(tmp_dir, '%d' % n), 'rb') as part:
+                    while True:
+                        chunk = part.read(2**24)
+                        if not chunk:
+                            break
+                        env_file.write(chunk)
+    finally:
+        for lw in levels:
+            lw.file.close()
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+    return path
@@ -0,0 +1,94 @@
+"""
+Извлечение событий запуска (триггеров) из футеров r3f и вырезка окон отсчетов вокруг них
+"""
+
+from collections import namedtuple
+from RSA306.rc import SAMPLES_PER_BLOCK, FRAME_STATUS_TRIGGER1, FRAME_STATUS_TRIGGER2
+import numpy as np
+
+TriggerEvents = namedtuple("TriggerEvents", "source sample_index timestamp frame_index")
+TriggerEvents.__doc__ = """ События запуска в столбцовом виде, упорядочены по sample_index.
+
+source: np.ndarray[uint8] - номер входа запуска (1 или 2)
+sample_index: np.ndarray[int64] - абсолютный номер отсчета события в файле
+timestamp: np.ndarray[uint64] - время события в тиках счетчика времени прибора
+frame_index: np.ndarray[int64] - номер фрейма, в котором произошло событие
+"""
+
+_TRIGGER_FIELDS = {1: ("trigger1_idx", FRAME_STATUS_TRIGGER1), 2: ("trigger2_idx", FRAME_STATUS_TRIGGER2)}
+
+
+def find_triggers(footers: np.ndarray, sources=(1, 2), ticks_per_sample=1) -> TriggerEvents:
+	""" Находит события запуска по массиву футеров
+
+	Аргументы:
+	----------
+	footers: np.ndarray
+		массив записей RSA306.types.FOOTER_DTYPE всех фреймов файла по порядку
+	sources: iterable
+		номера входов запуска, события которых нужно извлечь (1, 2)
+	ticks_per_sample: float
+		число тиков timestamp на один отсчет (time_sample_rate / sample_rate)
+
+	Возвращает:
+	-----------
+	events: TriggerEvents
+		события запуска
+	"""
+	source_lst, frame_lst, offset_lst = [], [], []
+	for source in sources:
+		field, status_bit = _TRIGGER_FIELDS[source]
+		frame_index = np.flatnonzero(footers["frame_status"] & status_bit)
+		frame_lst.append(frame_index)
+		offset_lst.append(footers[field][frame_index].astype(np.int64))
+		source_lst.append(np.full(len(frame_index), source, dtype=np.uint8))
+
+	frame_index = np.concatenate(frame_lst) if frame_lst else np.empty(0, dtype=np.int64)
+	offset = np.concatenate(offset_lst) if offset_lst else np.empty(0, dtype=np.int64)
+	source = np.concatenate(source_lst) if source_lst else np.empty(0, dtype=np.uint8)
+
+	sample_index = frame_index * SAMPLES_PER_BLOCK + offset
+	order = np.argsort(sample_index, kind="stable")
+	timestamp = footers["timestamp"][frame_index] + np.round(offset * ticks_per_sample).astype(np.uint64)
+
+	return TriggerEvents(source=source[order], sample_index=sample_index[order], timestamp=timestamp[order],
+						 frame_index=frame_index[order])
+
+
+def extract_windows(samples: np.ndarray, positions, pre: int, post: int, fill_value=0) -> np.ndarray:
+	""" Вырезает окна фиксированной длины вокруг заданных отсчетов
+
+	Аргументы:
+	----------
+	samples: np.ndarray
+		отсчеты файла: одномерный массив или двумерный (фрейм, отсчет), например Reader.memmap()["samples"]
+	positions: iterable[int]
+		абсолютные номера отсчетов событий
+	pre: int
+		число отсчетов до события
+	post: int
+		число отсчетов начиная с события
+	fill_value:
+		значение для отсчетов окна, выходящих за границы файла
+
+	Возвращает:
+	-----------
+	windows: np.ndarray
+		массив (число событий, pre + post); из memmap считываются только затронутые окнами страницы
+	"""
+	flat_size = samples.size
+	if flat_size == 0:
+		return np.full((len(positions), pre + post), fill_value, dtype=samples.dtype)
+
+	index = np.asarray(positions, dtype=np.int64)[:, np.newaxis] + np.arange(-pre, post, dtype=np.int64)
+	valid = (index >= 0) & (index < flat_size)
+	index = np.where(valid, index, 0)
+
+	if samples.ndim == 2:
+		row_size = samples.shape[1]
+		windows = samples[index // row_size, index % row_size]
+	else:
+		windows = samples[index]
+
+	windows[~valid] = fill_value
+	return windows
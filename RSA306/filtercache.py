@@ -0,0 +1,169 @@
+""" Кэш синтезированных фильтров и банков полифазных фильтров.
+
+Синтез КИХ-фильтров (kaiserord/firwin/firwin2) и разложение ИХ на банк
+полифазных фильтров для PPResample повторяются при каждом запуске обработки
+с одинаковыми параметрами. Кэш хранит готовые ИХ и банки в памяти и,
+при заданном каталоге, на диске, с ключом из всех параметров синтеза, и
+ограничивает свой размер вытеснением давно не использованных записей.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from fractions import Fraction
+
+import numpy as np
+
+from RSA306.conversion import fir_coefs, PPResample
+from RSA306.kernels import get_kernel
+
+
+def _plain(value):
+    """ Параметр синтеза в виде, пригодном для JSON (числа, списки) """
+    if isinstance(value, Fraction):
+        return [value.numerator, value.denominator]
+    if np.ndim(value):
+        return [float(v) for v in np.ravel(value)]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    return float(value)
+
+
+class FilterCache(object):
+    """ Кэш ИХ фильтров и банков полифазных фильтров.
+
+    Атрибуты:
+    ---------
+    hits, misses: int
+        число обращений, обслуженных кэшем, и число синтезов
+
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, directory=None, max_disk_bytes=2**30):
+        """ Конструктор кэша.
+
+        Аргументы:
+        ----------
+        max_bytes: int
+            наибольший суммарный размер массивов в памяти, байт
+        directory: str | None
+            каталог дискового кэша; None -- только память
+        max_disk_bytes: int
+            наибольший суммарный размер дискового кэша, байт
+
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _get(self, key, build):
+        """ Массив по ключу из памяти, с диска или построенный build() """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+
+        array = None
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + '.npy')
+            if os.path.exists(path):
+                try:
+                    array = np.load(path, mmap_mode='r')
+                    os.utime(path)
+                    self.hits += 1
+                except (OSError, ValueError):
+                    array = None
+        if array is None:
+            self.misses += 1
+            array = np.ascontiguousarray(build())
+            array.flags.writeable = False
+            if self.directory is not None:
+                self._store(key, array)
+
+        self._memory[key] = array
+        self._memory_bytes += array.nbytes
+        while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+        return array
+
+    def _store(self, key, array):
+        """ Записывает массив на диск и вытесняет давно не использованные файлы """
+        path = os.path.join(self.directory, key + '.npy')
+        tmp_path = path + '.%d.tmp' % os.getpid()
+        with open(tmp_path, 'wb') as tmp_file:
+            np.save(tmp_file, array)
+        os.replace(tmp_path, path)
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                entry_path = os.path.join(self.directory, name)
+                entries.append((os.path.getmtime(entry_path), os.path.getsize(entry_path), entry_path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            if entry_path != path:
+                os.remove(entry_path)
+                total -= size
+
+    @staticmethod
+    def _key(kind, params):
+        return kind + '-' + hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def fir_coefs(self, fp, fs, r, Fs=2, oddL=False, antisymmetric=False):
+        """ ИХ фильтра, как RSA306.conversion.fir_coefs, из кэша (массив только для чтения) """
+        params = {'fp': _plain(fp), 'fs': _plain(fs), 'r': _plain(r), 'Fs': _plain(Fs), 'oddL': bool(oddL),
+                  'antisymmetric': bool(antisymmetric)}
+        return self._get(self._key('taps', params),
+                         lambda: fir_coefs(fp, fs, r, Fs=Fs, oddL=oddL, antisymmetric=antisymmetric))
+
+    def polyphase_bank(self, b, ratio, dtype=float):
+        """ Банк полифазных фильтров PPResample для ИХ b и коэффициента ratio (массив только для чтения) """
+        dtype = np.dtype(dtype)
+        params = {'taps': hashlib.sha1(np.ascontiguousarray(b).tobytes()).hexdigest(), 'L': int(np.size(b)),
+                  'ratio': _plain(Fraction(ratio)), 'dtype': dtype.str}
+        return self._get(self._key('bank', params),
+                         lambda: get_kernel('polyphase_bank')(np.asarray(b), Fraction(ratio).denominator, dtype))
+
+    def resampler(self, ratio, fp, fs, r, Fs, chunk_size_in, chunk_size_out, dtype=float, oddL=False,
+                  antisymmetric=False):
+        """ PPResample с ИХ и банком фильтров из кэша.
+
+        Аргументы:
+        ----------
+        ratio: fractions.Fraction
+            коэффициент преобразования частоты дискретизации Fs2 / Fs1
+        fp, fs, r, Fs, oddL, antisymmetric:
+            параметры синтеза ФНЧ (см. RSA306.conversion.fir_coefs)
+        chunk_size_in, chunk_size_out, dtype:
+            параметры PPResample
+
+        """
+        b = self.fir_coefs(fp, fs, r, Fs=Fs, oddL=oddL, antisymmetric=antisymmetric)
+        bank = self.polyphase_bank(b, ratio, dtype)
+        return PPResample(ratio, b, chunk_size_in, chunk_size_out, dtype=dtype, bpartial=bank)
+
+    def clear(self):
+        """ Очищает кэш в памяти (дисковый кэш сохраняется) """
+        self._memory.clear()
+        self._memory_bytes = 0
+
+
+_default_cache = None
+
+
+def default_cache():
+    """ Общий кэш процесса; каталог дискового кэша задается переменной окружения RSA306_FILTER_CACHE """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = FilterCache(directory=os.environ.get('RSA306_FILTER_CACHE'))
+    return _default_cache
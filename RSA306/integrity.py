@@ -0,0 +1,201 @@
+"""
+Проверка непрерывности потока фреймов r3f по данным футеров
+"""
+
+from collections import namedtuple
+from RSA306.rc import SAMPLES_PER_BLOCK, FRAME_STATUS_ERROR_MASK
+import numpy as np
+
+FrameGap = namedtuple("FrameGap", "frame_index frame_id missing_frames status timestamp_jump")
+FrameGap.__doc__ = """ Нарушение целостности перед фреймом frame_index (номер фрейма в файле).
+
+missing_frames: число потерянных фреймов по разрыву frame_id
+status: биты ошибок из frame_status (с учетом маски)
+timestamp_jump: отклонение timestamp от ожидаемого с учетом потерянных фреймов, тики
+"""
+
+_FRAME_ID_MODULO = 1 << 32
+
+
+class FrameIntegrityChecker:
+	""" Потоковая проверка футеров: разрывы frame_id, биты ошибок frame_status и скачки timestamp
+
+	Аргументы:
+	---------
+	ticks_per_frame: int
+		ожидаемое приращение timestamp между соседними фреймами. В r3f timestamp считается в отсчетах АЦП,
+		поэтому по умолчанию равно SAMPLES_PER_BLOCK
+	status_mask: int
+		биты frame_status, считающиеся ошибкой (RSA306.rc.FRAME_STATUS_*)
+	fill: bool
+		True - readblock вставляет нули на место потерянных фреймов, сохраняя временную сетку отсчетов
+	max_fill_frames: int
+		наибольший заполняемый разрыв; больший разрыв (например, сбой frame_id) только регистрируется
+
+	Атрибуты:
+	---------
+	gaps: list[FrameGap]
+		все найденные нарушения
+	dropped_spans: list[tuple(int, int)]
+		интервалы [start, stop) потерянных отсчетов в координатах выходного потока readblock: номер отсчета в
+		файле плюс число нулей, вставленных перед ним при заполнении. Заполненный разрыв занимает missing_frames
+		фреймов нулей; незаполненный (fill=False или разрыв больше max_fill_frames) -- пустой интервал
+		start == stop в месте стыка. При fill=False координаты совпадают с номерами отсчетов файла
+	frames_checked: int
+		число проверенных фреймов
+	missing_frames: int
+		суммарное число потерянных фреймов
+
+	Примечание:
+	-----------
+	Экземпляр хранит последний frame_id и timestamp, поэтому проверяет стык между последовательными вызовами.
+	Для новой проверки нужно создать новый экземпляр.
+	"""
+
+	def __init__(self, ticks_per_frame=SAMPLES_PER_BLOCK, status_mask=FRAME_STATUS_ERROR_MASK, fill=False,
+				 max_fill_frames=1024):
+		self.ticks_per_frame = ticks_per_frame
+		self.status_mask = status_mask
+		self.fill = fill
+		self.max_fill_frames = max_fill_frames
+		self.gaps = []
+		self.dropped_spans = []
+		self.frames_checked = 0
+		self.missing_frames = 0
+		self._filled_frames = 0
+		self._next_frame = 0
+		self._last_frame_id = None
+		self._last_timestamp = None
+
+	def __call__(self, footers: np.ndarray, first_frame=None) -> list:
+		""" Проверяет очередной набор футеров
+
+		Аргументы:
+		----------
+		footers: np.ndarray
+			массив записей RSA306.types.FOOTER_DTYPE подряд идущих фреймов
+		first_frame: int | None
+			номер первого фрейма footers в файле; None -- следующий за предыдущим набором
+
+		Возвращает:
+		-----------
+		gaps: list[FrameGap]
+			нарушения, найденные в этом наборе
+		"""
+		n_frames = len(footers)
+		if n_frames == 0:
+			return []
+
+		frame_id = footers["frame_id"].astype(np.int64)
+		timestamp = footers["timestamp"].astype(np.int64)
+
+		if self._last_frame_id is None:
+			prev_frame_id = frame_id[0] - 1
+			prev_timestamp = timestamp[0] - self.ticks_per_frame
+		else:
+			prev_frame_id = self._last_frame_id
+			prev_timestamp = self._last_timestamp
+
+		id_step = np.diff(frame_id, prepend=prev_frame_id) % _FRAME_ID_MODULO
+		missing = id_step - 1
+		timestamp_jump = np.diff(timestamp, prepend=prev_timestamp) - id_step * self.ticks_per_frame
+		status = footers["frame_status"] & self.status_mask
+
+		bad = np.flatnonzero((missing != 0) | (status != 0) | (timestamp_jump != 0))
+
+		gaps = []
+		if first_frame is None:
+			first_frame = self._next_frame
+		for i in bad:
+			gap = FrameGap(frame_index=first_frame + int(i), frame_id=int(frame_id[i]),
+						   missing_frames=int(missing[i]), status=int(status[i]),
+						   timestamp_jump=int(timestamp_jump[i]))
+			if gap.missing_frames:
+				start = (gap.frame_index + self._filled_frames) * SAMPLES_PER_BLOCK
+				filled = gap.missing_frames if self.fill and gap.missing_frames <= self.max_fill_frames else 0
+				self.dropped_spans.append((start, start + filled * SAMPLES_PER_BLOCK))
+				self.missing_frames += gap.missing_frames
+				self._filled_frames += filled
+			gaps.append(gap)
+
+		self.gaps.extend(gaps)
+		self.frames_checked += n_frames
+		self._next_frame = first_frame + n_frames
+		self._last_frame_id = frame_id[-1]
+		self._last_timestamp = timestamp[-1]
+		return gaps
+
+	def zero_fill(self, samples: np.ndarray, gaps: list, first_frame: int) -> np.ndarray:
+		""" Вставляет нули на место потерянных фреймов
+
+		Аргументы:
+		----------
+		samples: np.ndarray
+			отсчеты подряд идущих фреймов, начиная с фрейма first_frame
+		gaps: list[FrameGap]
+			нарушения, найденные в этих фреймах
+		first_frame: int
+			номер первого фрейма samples в файле
+
+		Возвращает:
+		-----------
+		np.ndarray
+			отсчеты с нулями на месте потерянных фреймов (samples без копирования, если заполнять нечего)
+		"""
+		pieces = []
+		start = 0
+		for gap in gaps:
+			if 0 < gap.missing_frames <= self.max_fill_frames:
+				position = (gap.frame_index - first_frame) * SAMPLES_PER_BLOCK
+				pieces.append(samples[start:position])
+				pieces.append(np.zeros(gap.missing_frames * SAMPLES_PER_BLOCK, dtype=samples.dtype))
+				start = position
+
+		if not pieces:
+			return samples
+
+		pieces.append(samples[start:])
+		return np.concatenate(pieces)
+
+
+def span_mask(spans, start, length) -> np.ndarray:
+	""" Маска потерянных отсчетов для отрезка потока
+
+	Аргументы:
+	----------
+	spans: list[tuple(int, int)]
+		интервалы потерянных отсчетов, например FrameIntegrityChecker.dropped_spans
+	start: int
+		номер первого отсчета отрезка в потоке
+	length: int
+		длина отрезка
+
+	Возвращает:
+	-----------
+	mask: np.ndarray
+		bool массив длины length, True на месте потерянных отсчетов
+	"""
+	mask = np.zeros(length, dtype=bool)
+	stop = start + length
+	for span_start, span_stop in spans:
+		if span_start < stop and span_stop > start:
+			mask[max(span_start, start) - start:min(span_stop, stop) - start] = True
+	return mask
+
+
+def check_footers(footers: np.ndarray, **kwargs) -> list:
+	""" Проверяет футеры всего файла за один проход
+
+	Аргументы:
+	----------
+	footers: np.ndarray
+		массив записей RSA306.types.FOOTER_DTYPE, например Reader.footers()
+	kwargs:
+		параметры FrameIntegrityChecker
+
+	Возвращает:
+	-----------
+	gaps: list[FrameGap]
+		все найденные нарушения
+	"""
+	return FrameIntegrityChecker(**kwargs)(footers)
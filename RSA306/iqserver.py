@@ -0,0 +1,392 @@
+""" Локальный сервер отрезков комплексной огибающей.
+
+Клиенты (например, блокноты аналитиков) запрашивают у сервера отрезок записи
+по времени, центральной частоте и полосе и получают прореженную комплексную
+огибающую complex64 в двоичном виде по HTTP через TCP (localhost) или через
+Unix-сокет. Записи открываются один раз, а результаты обработки кэшируются
+по отрезкам фиксированной сетки, поэтому одинаковые и перекрывающиеся запросы,
+в том числе одновременные, вычисляются один раз.
+
+Вычисления выполняет SliceEngine, который можно использовать и без сети.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from fractions import Fraction
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+
+from RSA306.conversion import PPResample, PassbandToBaseband_IH
+from RSA306.filtercache import default_cache
+from RSA306.reader import get_reader
+
+DEFAULT_PORT = 8306
+_META_HEADER = 'X-RSA306-Meta'
+
+
+class _Stream(object):
+    """ Параметры обработки одной записи для пары (центральная частота, полоса) """
+
+    __slots__ = ('key', 'reader', 'Fs', 'fh', 'decimation', 'b', 'bank', 'chunk_size', 'warmup_chunks',
+                 'n_chunks', 'n_out', 'meta')
+
+
+class SliceEngine(object):
+    """ Вычисление отрезков комплексной огибающей с общим кэшем.
+
+    Запись делится на отрезки по chunk_size входных отсчетов. Отрезок
+    огибающей вычисляется переносом спектра (PassbandToBaseband_IH) и
+    прореживанием в целое число раз (PPResample) и хранится в общем LRU-кэше.
+    Для отрезка k обработчик (гетеродин и буферы фильтра) продолжает работу
+    после отрезка k-1, если тот только что вычислялся, иначе гетеродин
+    устанавливается на фазу первого отсчета, а буферы фильтра заполняются
+    предшествующими отсчетами записи. В обоих случаях результат совпадает
+    с непрерывной обработкой записи с начала.
+
+    Атрибуты:
+    ---------
+    stats: dict
+        computed -- число вычисленных отрезков, hits -- взятых из кэша,
+        coalesced -- дождавшихся вычисления, начатого другим запросом
+
+    """
+
+    def __init__(self, root, max_bytes=512 * 2**20, oversample=1.25, atten=60, chunk_target=2**20):
+        """ Конструктор.
+
+        Аргументы:
+        ----------
+        root: str
+            каталог записей; имена записей в запросах задаются относительно него
+        max_bytes: int
+            наибольший суммарный размер кэша отрезков огибающей, байт
+        oversample: float
+            отношение частоты дискретизации результата к запрошенной полосе (не меньше)
+        atten: float
+            подавление ФНЧ, дБ (аргумент r функции fir_coefs)
+        chunk_target: int
+            примерный размер отрезка сетки, входных отсчетов
+
+        """
+        self.root = os.path.realpath(root)
+        self.max_bytes = max_bytes
+        self.oversample = oversample
+        self.atten = atten
+        self.chunk_target = chunk_target
+        self.stats = {'computed': 0, 'hits': 0, 'coalesced': 0}
+        self._lock = threading.Lock()
+        self._filter_lock = threading.Lock()
+        self._readers = {}
+        self._read_locks = {}
+        self._streams = {}
+        self._chunks = OrderedDict()
+        self._chunks_bytes = 0
+        self._pending = {}
+        self._processors = OrderedDict()
+
+    def _reader(self, capture):
+        """ Ридер записи capture (путь относительно root) """
+        path = os.path.realpath(os.path.join(self.root, capture))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError('Запись %s вне каталога %s' % (capture, self.root))
+        if not os.path.isfile(path):
+            raise FileNotFoundError('Запись %s не найдена' % capture)
+        with self._lock:
+            if path not in self._readers:
+                self._readers[path] = get_reader(path)
+                self._read_locks[path] = threading.Lock()
+            return self._readers[path], self._read_locks[path]
+
+    def stream(self, capture, center_frequency, bandwidth):
+        """ Параметры обработки записи для центральной частоты и полосы, Гц """
+        reader, _ = self._reader(capture)
+        key = (os.path.realpath(os.path.join(self.root, capture)), float(center_frequency), float(bandwidth))
+        with self._lock:
+            if key in self._streams:
+                return self._streams[key]
+
+        Fs = float(reader.data_format.sample_rate)
+        f0 = float(reader.instrument_state.center_frequency)
+        f1 = float(reader.data_format.if_center_frequency)
+        if bandwidth <= 0 or abs(center_frequency - f0) + bandwidth / 2 > float(reader.data_format.bandwidth) / 2:
+            raise ValueError('Полоса %.6g Гц вокруг %.6g Гц выходит за полосу записи %.6g Гц вокруг %.6g Гц'
+                             % (bandwidth, center_frequency, float(reader.data_format.bandwidth), f0))
+        decimation = int(Fs // (self.oversample * bandwidth))
+        if decimation < 2:
+            raise ValueError('Полоса %.6g Гц слишком широка для прореживания' % bandwidth)
+
+        s = _Stream()
+        s.key, s.reader, s.Fs, s.decimation = key, reader, Fs, decimation
+        s.fh = f1 - f0 + center_frequency
+        Fs_out = Fs / decimation
+        with self._filter_lock:
+            s.b = default_cache().fir_coefs(bandwidth / 2, Fs_out - bandwidth / 2, self.atten, Fs=Fs)
+            s.bank = default_cache().polyphase_bank(s.b, Fraction(1, decimation), np.complex64)
+        s.chunk_size = max(1, self.chunk_target // decimation) * decimation
+        s.warmup_chunks = -(-s.bank.size // s.chunk_size)
+        s.n_chunks = -(-reader.n_samples // s.chunk_size)
+        s.n_out = reader.n_samples // decimation
+        s.meta = {'capture': capture, 'center_frequency': float(center_frequency), 'bandwidth': float(bandwidth),
+                  'sample_rate': Fs_out, 'decimation': decimation, 'fh': s.fh, 'taps': int(s.b.size),
+                  'delay': (s.b.size - 1) / 2 / Fs}
+        with self._lock:
+            return self._streams.setdefault(key, s)
+
+    def _processor(self, s, start_chunk):
+        """ Новый обработчик, гетеродин которого установлен на первый отсчет отрезка start_chunk """
+        chunk_out = s.chunk_size // s.decimation
+        decimator = PPResample(Fraction(1, s.decimation), s.b, s.chunk_size, chunk_out, dtype=np.complex64,
+                               bpartial=s.bank)
+        bconv = PassbandToBaseband_IH(s.chunk_size, s.Fs, s.fh, np.complex64, decimator=decimator)
+        nco = bconv.nco
+        nco.acc = nco.ftw * start_chunk * s.chunk_size % 2**nco.bits
+        return bconv
+
+    def _input(self, s, k):
+        """ Входные отсчеты отрезка k (последний дополняется нулями) """
+        reader, read_lock = self._reader(s.meta['capture'])
+        start = k * s.chunk_size
+        with read_lock:
+            x = reader.read_range(start, min(start + s.chunk_size, reader.n_samples))
+        if len(x) < s.chunk_size:
+            x = np.concatenate([x, np.zeros(s.chunk_size - len(x), dtype=x.dtype)])
+        return x
+
+    def _compute(self, s, k):
+        """ Вычисляет отрезок k огибающей """
+        with self._lock:
+            bconv = self._processors.pop((s.key, k), None)
+        if bconv is None:
+            first = max(0, k - s.warmup_chunks)
+            bconv = self._processor(s, first)
+            for j in range(first, k):
+                bconv(self._input(s, j))
+        y = bconv(self._input(s, k)).copy()
+        y = y[:max(0, min(len(y), s.n_out - k * len(y)))]
+        with self._lock:
+            self._processors[(s.key, k + 1)] = bconv
+            while len(self._processors) > 16:
+                self._processors.popitem(last=False)
+        return y
+
+    def chunk(self, s, k):
+        """ Отрезок k огибающей из кэша; одновременные запросы одного отрезка вычисляют его один раз """
+        key = s.key + (k,)
+        with self._lock:
+            if key in self._chunks:
+                self._chunks.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._chunks[key]
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+            else:
+                self.stats['coalesced'] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            y = self._compute(s, k)
+        except BaseException as error:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(error)
+            raise
+        y.flags.writeable = False
+        with self._lock:
+            del self._pending[key]
+            self._chunks[key] = y
+            self._chunks_bytes += y.nbytes
+            self.stats['computed'] += 1
+            while self._chunks_bytes > self.max_bytes and len(self._chunks) > 1:
+                _, evicted = self._chunks.popitem(last=False)
+                self._chunks_bytes -= evicted.nbytes
+        future.set_result(y)
+        return y
+
+    def iter_slice(self, capture, t_start, t_stop, center_frequency, bandwidth):
+        """ Отрезок огибающей по частям.
+
+        Аргументы:
+        ----------
+        capture: str
+            имя записи относительно root
+        t_start, t_stop: float
+            интервал времени от начала записи, с
+        center_frequency: float
+            центральная частота, Гц
+        bandwidth: float
+            полоса, Гц
+
+        Возвращает:
+        -----------
+        meta: dict
+            описание результата: sample_rate, t_start первого отсчета, count и параметры обработки
+        parts: generator
+            части результата (np.array complex64, только для чтения)
+
+        Примечание:
+        -----------
+        Отсчет j огибающей соответствует входному отсчету j*decimation; задержка
+        ФНЧ (meta['delay'], с) не компенсируется.
+
+        """
+        s = self.stream(capture, center_frequency, bandwidth)
+        D = s.decimation
+        j0 = min(-(-s.reader.time_to_sample(t_start) // D), s.n_out)
+        j1 = max(j0, min(-(-s.reader.time_to_sample(t_stop) // D), s.n_out))
+        meta = dict(s.meta, t_start=j0 * D / s.Fs, count=j1 - j0)
+        chunk_out = s.chunk_size // D
+
+        def parts():
+            for k in range(j0 // chunk_out, -(-j1 // chunk_out)):
+                y = self.chunk(s, k)
+                yield y[max(j0 - k * chunk_out, 0):j1 - k * chunk_out]
+
+        return meta, parts()
+
+    def slice(self, capture, t_start, t_stop, center_frequency, bandwidth):
+        """ Отрезок огибающей одним массивом: (iq, meta), см. iter_slice """
+        meta, parts = self.iter_slice(capture, t_start, t_stop, center_frequency, bandwidth)
+        parts = list(parts)
+        iq = np.concatenate(parts) if parts else np.empty(0, dtype=np.complex64)
+        return iq, meta
+
+
+class IQRequestHandler(BaseHTTPRequestHandler):
+    """ Обработчик запросов GET /iq?capture=...&t_start=...&t_stop=...&center=...&bandwidth=...
+
+    Тело ответа -- отсчеты complex64 (little-endian), описание -- JSON в заголовке X-RSA306-Meta.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != '/iq':
+            self._error(404, 'Неизвестный путь %s' % url.path)
+            return
+        try:
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            meta, parts = self.server.engine.iter_slice(
+                query['capture'], float(query['t_start']), float(query['t_stop']),
+                float(query['center']), float(query['bandwidth']))
+        except FileNotFoundError as error:
+            self._error(404, str(error))
+            return
+        except (KeyError, ValueError) as error:
+            self._error(400, 'Неверный запрос: %s' % error)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(meta['count'] * np.dtype(np.complex64).itemsize))
+        self.send_header(_META_HEADER, json.dumps(meta))
+        self.end_headers()
+        for part in parts:
+            self.wfile.write(part.astype('<c8', copy=False).tobytes())
+
+    def _error(self, code, message):
+        body = message.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(engine, address=('127.0.0.1', DEFAULT_PORT), verbose=False):
+    """ Создает сервер (не запуская его).
+
+    Аргументы:
+    ----------
+    engine: SliceEngine
+        вычислитель отрезков
+    address: tuple | str
+        (хост, порт) для TCP или путь Unix-сокета
+    verbose: bool
+        выводить журнал запросов
+
+    Возвращает:
+    -----------
+    server: socketserver.BaseServer
+        сервер; запуск -- serve_forever(), остановка -- shutdown() и server_close()
+
+    """
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.remove(address)
+        server = _UnixHTTPServer(address, IQRequestHandler)
+    else:
+        server = ThreadingHTTPServer(address, IQRequestHandler)
+    server.engine = engine
+    server.verbose = verbose
+    return server
+
+
+class _UnixHTTPConnection(HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def fetch_iq(address, capture, t_start, t_stop, center_frequency, bandwidth, timeout=None):
+    """ Запрашивает отрезок огибающей у сервера.
+
+    Аргументы:
+    ----------
+    address: tuple | str
+        (хост, порт) или путь Unix-сокета
+    capture, t_start, t_stop, center_frequency, bandwidth:
+        см. SliceEngine.iter_slice
+    timeout: float | None
+        тайм-аут соединения, с
+
+    Возвращает:
+    -----------
+    (iq, meta)
+        отсчеты complex64 и их описание
+
+    """
+    if isinstance(address, str):
+        connection = _UnixHTTPConnection(address, timeout=timeout)
+    else:
+        connection = HTTPConnection(*address, timeout=timeout)
+    query = urlencode({'capture': capture, 't_start': repr(float(t_start)), 't_stop': repr(float(t_stop)),
+                       'center': repr(float(center_frequency)), 'bandwidth': repr(float(bandwidth))})
+    try:
+        connection.request('GET', '/iq?' + query)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError('Сервер вернул %d: %s' % (response.status, body.decode('utf-8', 'replace')))
+        meta = json.loads(response.getheader(_META_HEADER))
+    finally:
+        connection.close()
+    return np.frombuffer(body, dtype='<c8').astype(np.complex64, copy=False), meta
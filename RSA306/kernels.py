@@ -0,0 +1,222 @@
+""" Реестр вычислительных ядер с необязательным ускорением numba.
+
+Последовательные циклы по отсчетам (полифазный передискретизатор и т.п.)
+реализованы в двух вариантах: на numpy и скомпилированные numba (@njit).
+Вариант выбирается при импорте переменной окружения RSA306_KERNEL_BACKEND
+('auto', 'numpy', 'numba') или функцией set_backend. При 'auto' numba
+используется, если она установлена.
+
+Оба варианта выполняют операции с плавающей точкой в одном и том же порядке,
+поэтому результаты совпадают побитно.
+"""
+
+import os
+from time import perf_counter
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+_REGISTRY = {}
+_backend = None
+
+
+def register(name, backend):
+    """ Декоратор регистрации ядра name для варианта backend ('numpy' | 'numba') """
+    def decorator(func):
+        _REGISTRY.setdefault(name, {})[backend] = func
+        return func
+    return decorator
+
+
+def available_backends():
+    """ Доступные варианты ядер """
+    return ('numpy', 'numba') if numba is not None else ('numpy',)
+
+
+def set_backend(name):
+    """ Выбирает вариант ядер: 'auto', 'numpy' или 'numba' """
+    global _backend
+    if name == 'auto':
+        name = 'numba' if numba is not None else 'numpy'
+    if name not in available_backends():
+        raise ValueError('Вариант ядер %s недоступен, доступны: %s' % (name, ', '.join(available_backends())))
+    _backend = name
+
+
+def get_backend():
+    """ Текущий вариант ядер """
+    return _backend
+
+
+def get_kernel(name, backend=None):
+    """ Возвращает реализацию ядра name для текущего (или заданного) варианта """
+    variants = _REGISTRY[name]
+    return variants.get(backend or _backend, variants['numpy'])
+
+
+def _njit(func):
+    """ Компилирует ядро numba при первом вызове; без numba возвращает None """
+    if numba is None:
+        return None
+    return numba.njit(cache=False, nogil=True)(func)
+
+
+# --- Банк полифазных фильтров ------------------------------------------------
+
+@register('polyphase_bank', 'numpy')
+def polyphase_bank_numpy(b, q, dtype):
+    """ Раскладывает ИХ b на q фаз: bpartial[i, j] = b[j*q + i] """
+    Lpartial = -(-b.size // q)
+    padded = np.zeros(Lpartial * q, dtype=dtype)
+    padded[:b.size] = b
+    return np.ascontiguousarray(padded.reshape(Lpartial, q).T)
+
+
+def _polyphase_bank_loop(b, bpartial):
+    q = bpartial.shape[0]
+    for k in range(b.size):
+        bpartial[k % q, k // q] = b[k]
+
+
+_polyphase_bank_jit = _njit(_polyphase_bank_loop)
+
+
+@register('polyphase_bank', 'numba')
+def polyphase_bank_numba(b, q, dtype):
+    bpartial = np.zeros((q, -(-b.size // q)), dtype=dtype)
+    _polyphase_bank_jit(np.asarray(b, dtype=dtype), bpartial)
+    return bpartial
+
+
+# --- Полифазный передискретизатор --------------------------------------------
+#
+# Свертка ветвей вычисляется в фиксированном порядке: сначала для каждого
+# отвода сумма по ветвям (0, 1, ..., q-1), затем сумма по отводам
+# (0, 1, ..., L-1). В numpy такой порядок дают редукция по оси 0 двумерного
+# массива и накопление add.accumulate (np.sum суммирует попарно).
+
+@register('ppresample', 'numpy')
+def ppresample_numpy(x, bufs, bpart, m_in, p, q, y):
+    """ Один отрезок PPResample: заполняет y, возвращает новый номер ветви m_in """
+    step = p % q
+    i = 0
+    for j in range(y.size):
+        while i <= j * q // p:
+            bufs[m_in, 0] = x[i]
+            i += 1
+            m_in = (m_in - step) % q
+        taps = np.add.reduce(bufs * bpart, axis=0)
+        y[j] = np.add.accumulate(taps)[-1]
+        bufs[:, 1:] = bufs[:, :-1]
+        bufs[:, 0] = 0
+    for k in range(i, x.size):
+        bufs[m_in, 0] = x[k]
+        m_in = (m_in - step) % q
+    return m_in
+
+
+def _branch_sum_scalar(bufs, bpart, t):
+    tap = bufs[0, t] * bpart[0, t]
+    for m in range(1, bufs.shape[0]):
+        tap = tap + bufs[m, t] * bpart[m, t]
+    return tap
+
+
+_branch_sum = _njit(_branch_sum_scalar)
+
+
+def _ppresample_loop(x, bufs, bpart, m_in, p, q, y):
+    step = p % q
+    n_branches, n_taps = bufs.shape
+    i = 0
+    for j in range(y.size):
+        while i <= j * q // p:
+            bufs[m_in, 0] = x[i]
+            i += 1
+            m_in = (m_in - step) % q
+        acc = _branch_sum(bufs, bpart, 0)
+        for t in range(1, n_taps):
+            acc = acc + _branch_sum(bufs, bpart, t)
+        y[j] = acc
+        for m in range(n_branches):
+            for t in range(n_taps - 1, 0, -1):
+                bufs[m, t] = bufs[m, t - 1]
+            bufs[m, 0] = 0
+    for k in range(i, x.size):
+        bufs[m_in, 0] = x[k]
+        m_in = (m_in - step) % q
+    return m_in
+
+
+_ppresample_jit = _njit(_ppresample_loop)
+
+
+@register('ppresample', 'numba')
+def ppresample_numba(x, bufs, bpart, m_in, p, q, y):
+    return _ppresample_jit(np.asarray(x, dtype=bufs.dtype), bufs, bpart, m_in, p, q, y)
+
+
+def benchmark(chunk_size_in=105000, L=3000, r=None, dtype=np.complex64, repeat=3):
+    """ Сравнивает варианты ядер PPResample по времени и результату.
+
+    Аргументы:
+    ----------
+    chunk_size_in: int
+        размер входного отрезка
+    L: int
+        длина ИХ фильтра
+    r: fractions.Fraction | None
+        коэффициент передискретизации (по умолчанию 1/500, как 112 МГц -> 224 кГц)
+    dtype: numpy.dtype
+        тип данных
+    repeat: int
+        число повторов, учитывается лучшее время
+
+    Возвращает:
+    -----------
+    result: dict
+        время обработки отрезка для каждого варианта, с, и признак побитного совпадения identical
+
+    """
+    from fractions import Fraction
+    from RSA306.conversion import PPResample
+
+    r = r or Fraction(1, 500)
+    rng = np.random.default_rng(0)
+    b = rng.standard_normal(L) / L
+    x = (rng.standard_normal(chunk_size_in) + 1j * rng.standard_normal(chunk_size_in)).astype(dtype) \
+        if np.dtype(dtype).kind == 'c' else rng.standard_normal(chunk_size_in).astype(dtype)
+
+    saved = _backend
+    result, outputs = {}, {}
+    try:
+        for backend in available_backends():
+            set_backend(backend)
+            resampler = PPResample(r, b, chunk_size_in, int(chunk_size_in * r), dtype=dtype)
+            resampler(x)  # прогрев (компиляция numba)
+            best = None
+            for _ in range(repeat):
+                start = perf_counter()
+                y = resampler(x)
+                elapsed = perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            outputs[backend] = y.copy()
+            result[backend] = best
+    finally:
+        _backend_restore(saved)
+
+    reference = outputs['numpy']
+    result['identical'] = all(np.array_equal(reference, y) for y in outputs.values())
+    return result
+
+
+def _backend_restore(name):
+    global _backend
+    _backend = name
+
+
+set_backend(os.environ.get('RSA306_KERNEL_BACKEND', 'auto'))
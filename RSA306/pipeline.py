@@ -0,0 +1,193 @@
+""" Многопоточный конвейер для этапов преобразования сигнала
+
+numpy и scipy отпускают GIL в БПФ, lfilter и на больших ufunc, поэтому этапы
+цепочки чтение -> перенос -> передискретизация -> демодуляция могут выполняться
+одновременно на разных ядрах. Каждый этап работает в своём потоке, этапы
+связаны ограниченными очередями, а буферы между ними переиспользуются.
+"""
+
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+import numpy as np
+
+
+_END = object()
+
+_POLL_INTERVAL = 0.05
+
+
+class _BufferPool(object):
+    """ Пул переиспользуемых буферов между двумя этапами конвейера.
+
+    Число буферов ограничено, поэтому пул одновременно служит механизмом
+    обратного давления: этап, опередивший потребителя, ждёт возврата буфера.
+    """
+
+    __slots__ = '_free', '_stop'
+
+    def __init__(self, size, stop):
+        self._free = Queue()
+        self._stop = stop
+        for _ in range(size):
+            self._free.put(None)
+
+    def acquire(self, like):
+        """ Возвращает свободный буфер той же формы и типа, что и like """
+        while True:
+            try:
+                buf = self._free.get(timeout=_POLL_INTERVAL)
+                break
+            except Empty:
+                if self._stop.is_set():
+                    return None
+        if buf is None or buf.shape != like.shape or buf.dtype != like.dtype:
+            buf = np.empty_like(like)
+        np.copyto(buf, like)
+        return buf
+
+    def release(self, buf):
+        self._free.put(buf)
+
+
+class ThreadedPipeline(object):
+    """ Конвейерное выполнение этапов преобразования в отдельных потоках.
+
+    Этап -- любой вызываемый объект, принимающий отрезок сигнала и
+    возвращающий результат (например, PassbandToBaseband_IH, PPResample,
+    FM_Demodulate). Каждый этап обрабатывает отрезки строго по порядку в одном
+    потоке, поэтому результат совпадает с последовательным выполнением.
+
+    Пример:
+    -------
+    pipeline = ThreadedPipeline([bconv, demod, resampler2], depth=4)
+    for block_out in pipeline.run(rsa_reader.readblock(block_size_1, False)):
+        ...
+
+    """
+
+    def __init__(self, stages, depth=2):
+        """ Конструктор конвейера.
+
+        Аргументы:
+        ----------
+        stages: list
+            последовательность этапов обработки
+        depth: int
+            ёмкость очереди между соседними этапами, отрезков
+
+        """
+        if depth < 1:
+            raise ValueError('Ёмкость очереди должна быть не меньше 1')
+        self.stages = list(stages)
+        self.depth = depth
+        self._queues = []
+        self._max_depths = []
+
+    @property
+    def queue_depths(self):
+        """ Текущее число отрезков в каждой очереди (вход этапа 0, ..., выход) """
+        return tuple(q.qsize() for q in self._queues)
+
+    @property
+    def max_queue_depths(self):
+        """ Наибольшее наблюдавшееся заполнение каждой очереди за запуск """
+        return tuple(self._max_depths)
+
+    def run(self, source):
+        """ Прогоняет отрезки источника через все этапы.
+
+        Аргументы:
+        ----------
+        source: iterable
+            источник отрезков, например Reader.readblock(...)
+
+        Возвращает:
+        -----------
+        y: np.array
+            результат последнего этапа для очередного отрезка
+
+        Примечание:
+        -----------
+        Функция-генератор. Возвращаемый буфер переиспользуется после перехода
+        к следующему отрезку, при необходимости сохранить его нужно скопировать.
+        Исключение в любом этапе останавливает конвейер и пробрасывается наружу.
+
+        """
+        n_links = len(self.stages) + 1
+        stop = Event()
+        errors = []
+        self._queues = [Queue(maxsize=self.depth) for _ in range(n_links)]
+        self._max_depths = [0] * n_links
+        pools = [_BufferPool(self.depth + 2, stop) for _ in range(n_links)]
+
+        threads = [Thread(target=self._feed, args=(source, pools[0], stop, errors), daemon=True)]
+        for k, stage in enumerate(self.stages):
+            threads.append(Thread(target=self._work, args=(k, stage, pools[k], pools[k + 1], stop, errors),
+                                  daemon=True))
+        for thread in threads:
+            thread.start()
+
+        out_queue, out_pool = self._queues[-1], pools[-1]
+        try:
+            while True:
+                item = self._get(out_queue, stop)
+                if item is _END or item is None:
+                    break
+                yield item
+                out_pool.release(item)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    def _put(self, k, item, stop):
+        queue = self._queues[k]
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=_POLL_INTERVAL)
+            except Full:
+                continue
+            self._max_depths[k] = max(self._max_depths[k], queue.qsize())
+            return True
+        return False
+
+    @staticmethod
+    def _get(queue, stop):
+        while True:
+            try:
+                return queue.get(timeout=_POLL_INTERVAL)
+            except Empty:
+                if stop.is_set():
+                    return None
+
+    def _feed(self, source, pool, stop, errors):
+        """ Поток чтения: копирует отрезки источника в буферы пула """
+        try:
+            for x in source:
+                buf = pool.acquire(np.asarray(x))
+                if buf is None or not self._put(0, buf, stop):
+                    return
+            self._put(0, _END, stop)
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+
+    def _work(self, k, stage, pool_in, pool_out, stop, errors):
+        """ Поток этапа k """
+        try:
+            while True:
+                x = self._get(self._queues[k], stop)
+                if x is None:
+                    return
+                if x is _END:
+                    self._put(k + 1, _END, stop)
+                    return
+                buf = pool_out.acquire(np.asarray(stage(x)))
+                pool_in.release(x)
+                if buf is None or not self._put(k + 1, buf, stop):
+                    return
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
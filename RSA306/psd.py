@@ -0,0 +1,211 @@
+""" Пакетное вычисление спектров мощности множества записей.
+
+Каждая запись (или отрезок записи из целого числа фреймов) обрабатывается
+отдельной задачей в пуле процессов. Процесс-исполнитель один раз готовит
+окно и план БПФ для заданного размера блока и использует их во всех своих
+задачах: с pyFFTW план строится по общей wisdom, полученной в основном
+процессе, без него используется scipy.fft с параметром workers.
+"""
+
+import math
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+import numpy as np
+import scipy.fft
+from scipy.interpolate import CubicSpline
+from scipy.signal import get_window
+
+from RSA306.rc import SAMPLES_PER_BLOCK, BYTES_PER_SAMPLE
+from RSA306.reader import get_reader
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+BatchPSD = namedtuple('BatchPSD', 'freqs spectra metadata stats')
+BatchPSD.__doc__ = """ Результат batch_psd.
+
+freqs: np.array
+    частоты столбцов относительно center_frequency записи, Гц
+spectra: np.array
+    калиброванные спектры, дБ, форма (число записей, len(freqs)), строки в порядке paths
+metadata: list[dict]
+    описание каждой записи (путь, center_frequency, reference_level, число блоков и отсчетов)
+stats: dict
+    число задач и процессов, общее число отсчетов и байт, время, отсчетов/с и байт/с
+"""
+
+DEFAULT_BLOCK_SIZE = math.ceil(2**16 / SAMPLES_PER_BLOCK) * SAMPLES_PER_BLOCK
+
+# Окна и планы БПФ процесса-исполнителя: (block_size, window, batch) -> (окно, функция БПФ)
+_PLANS = {}
+_FFT_WORKERS = 1
+
+
+def _init_worker(wisdom, fft_workers):
+    """ Инициализация процесса-исполнителя: общая wisdom pyFFTW и число потоков БПФ """
+    global _FFT_WORKERS
+    _FFT_WORKERS = fft_workers
+    if pyfftw is not None and wisdom is not None:
+        pyfftw.import_wisdom(wisdom)
+
+
+def _plan(block_size, window, batch):
+    """ Окно и функция БПФ для пачки из batch блоков по block_size отсчетов """
+    key = block_size, window, batch
+    if key not in _PLANS:
+        w = get_window(window, block_size)
+        if pyfftw is not None:
+            builder = pyfftw.builders.rfft(pyfftw.empty_aligned((batch, block_size), dtype='float64'), axis=1,
+                                           threads=_FFT_WORKERS, planner_effort='FFTW_MEASURE')
+
+            def fft(frames, builder=builder):
+                return builder(frames)
+        else:
+            def fft(frames):
+                return scipy.fft.rfft(frames, axis=1, workers=_FFT_WORKERS, overwrite_x=True)
+        _PLANS[key] = w, fft
+    return _PLANS[key]
+
+
+def _band(reader, block_size):
+    """ Номера отсчетов БПФ в полосе bandwidth вокруг if_center_frequency """
+    Fs = float(reader.data_format.sample_rate)
+    f1 = float(reader.data_format.if_center_frequency)
+    bandwidth = float(reader.data_format.bandwidth)
+    f = np.fft.rfftfreq(block_size, d=1/Fs)
+    band = np.flatnonzero((f1 - bandwidth/2 < f) & (f < f1 + bandwidth/2))
+    return f, int(band[0]), int(band[-1]) + 1
+
+
+def _psd_task(path, block_start, block_stop, block_size, window, batch):
+    """ Сумма модулей спектров блоков [block_start, block_stop) записи path.
+
+    Возвращает кортеж (сумма |S| в полосе, число блоков, время обработки, с).
+    """
+    started = perf_counter()
+    reader = get_reader(path)
+    _, j0, j1 = _band(reader, block_size)
+    S_abs = np.zeros(j1 - j0, dtype=np.float64)
+    for first in range(block_start, block_stop, batch):
+        n = min(batch, block_stop - first)
+        samples = reader.read_range(first * block_size, (first + n) * block_size)
+        w, fft = _plan(block_size, window, n)
+        frames = samples.reshape(n, block_size) * w
+        S_abs += np.abs(fft(frames)[:, j0:j1]).sum(axis=0)
+    return S_abs, block_stop - block_start, perf_counter() - started
+
+
+def batch_psd(paths, block_size=DEFAULT_BLOCK_SIZE, window='hann', max_blocks=None, blocks_per_task=None,
+              workers=None, fft_workers=1, batch=8):
+    """ Вычисляет калиброванные спектры множества записей в пуле процессов.
+
+    Аргументы:
+    ----------
+    paths: list[str]
+        пути к записям (r3f, r3a или r3h)
+    block_size: int
+        размер блока БПФ, отсчетов; по умолчанию целое число фреймов не меньше 2**16, как в example.py
+    window: str
+        окно БПФ (scipy.signal.get_window)
+    max_blocks: int | None
+        наибольшее число блоков каждой записи; None -- вся запись
+    blocks_per_task: int | None
+        число блоков в одной задаче; None -- одна задача на запись. Большие
+        записи удобно делить на задачи по целому числу блоков (и фреймов)
+    workers: int | None
+        число процессов; None -- по числу процессоров, 0 -- вычислять в текущем процессе
+    fft_workers: int
+        число потоков БПФ в каждом процессе
+    batch: int
+        число блоков, преобразуемых одним вызовом БПФ
+
+    Возвращает:
+    -----------
+    result: BatchPSD
+        частоты, спектры (дБ), описания записей и статистика производительности
+
+    Примечание:
+    -----------
+    Калибровка та же, что в example.py: средний модуль спектра умножается на
+    adc_scale, делится на частоту дискретизации и исправляется по таблице
+    АЧХ channel_correction. Все записи должны иметь одинаковые sample_rate,
+    if_center_frequency и bandwidth.
+
+    """
+    started = perf_counter()
+    readers = [get_reader(path) for path in paths]
+    if not readers:
+        raise ValueError('Список записей пуст')
+    first = readers[0]
+    for reader in readers[1:]:
+        for field in ('sample_rate', 'if_center_frequency', 'bandwidth'):
+            if getattr(reader.data_format, field) != getattr(first.data_format, field):
+                raise ValueError('Записи %s и %s различаются data_format.%s'
+                                 % (first._path_to_file, reader._path_to_file, field))
+
+    Fs = float(first.data_format.sample_rate)
+    f1 = float(first.data_format.if_center_frequency)
+    f, j0, j1 = _band(first, block_size)
+
+    tasks = []
+    n_blocks = []
+    for index, reader in enumerate(readers):
+        blocks = reader.n_samples // block_size
+        if max_blocks is not None:
+            blocks = min(blocks, max_blocks)
+        n_blocks.append(blocks)
+        step = blocks_per_task or max(blocks, 1)
+        for start in range(0, blocks, step):
+            tasks.append((index, (paths[index], start, min(start + step, blocks), block_size, window, batch)))
+
+    S_abs = np.zeros((len(readers), j1 - j0), dtype=np.float64)
+    task_seconds = 0.0
+    if workers == 0:
+        _init_worker(None, fft_workers)
+        for index, args in tasks:
+            partial, _, seconds = _psd_task(*args)
+            S_abs[index] += partial
+            task_seconds += seconds
+        workers_used = 0
+    else:
+        wisdom = None
+        if pyfftw is not None:
+            _init_worker(None, fft_workers)
+            _plan(block_size, window, batch)
+            wisdom = pyfftw.export_wisdom()
+        workers_used = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers_used, initializer=_init_worker,
+                                 initargs=(wisdom, fft_workers)) as executor:
+            futures = {executor.submit(_psd_task, *args): index for index, args in tasks}
+            for future in as_completed(futures):
+                partial, _, seconds = future.result()
+                S_abs[futures[future]] += partial
+                task_seconds += seconds
+
+    spectra = np.full_like(S_abs, -np.inf)
+    metadata = []
+    for index, reader in enumerate(readers):
+        correction = reader.channel_correction
+        amp_corrector = CubicSpline(correction.freq_table, correction.amp_table)
+        if n_blocks[index]:
+            S = S_abs[index] * float(correction.adc_scale) / (n_blocks[index] * Fs)
+            with np.errstate(divide='ignore'):
+                spectra[index] = 20 * np.log10(S) - amp_corrector(f[j0:j1])
+        metadata.append({'path': paths[index],
+                         'center_frequency': float(reader.instrument_state.center_frequency),
+                         'reference_level': float(reader.instrument_state.reference_level),
+                         'blocks': n_blocks[index], 'samples': n_blocks[index] * block_size,
+                         'duration': n_blocks[index] * block_size / Fs})
+
+    elapsed = perf_counter() - started
+    total_samples = sum(n_blocks) * block_size
+    stats = {'tasks': len(tasks), 'workers': workers_used, 'samples': total_samples,
+             'bytes': total_samples * BYTES_PER_SAMPLE, 'seconds': elapsed, 'task_seconds': task_seconds,
+             'samples_per_second': total_samples / elapsed if elapsed else 0.0,
+             'bytes_per_second': total_samples * BYTES_PER_SAMPLE / elapsed if elapsed else 0.0}
+    return BatchPSD(freqs=f[j0:j1] - f1, spectra=spectra, metadata=metadata, stats=stats)
@@ -0,0 +1,284 @@
+""" Многомасштабная спектрограмма записи для быстрого просмотра.
+
+Спектрограмма вычисляется за один проход по записи и сохраняется рядом с ней
+в виде пирамиды уровней: уровень k содержит строки, усредненные (mean) и
+с удержанием максимума (max) по 2**k соседним БПФ. Просмотрщик берет уровень,
+число строк которого в запрошенном интервале соответствует разрешению экрана,
+и обращается к исходным отсчетам только при увеличении сильнее уровня 0.
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+from scipy.signal import get_window
+
+_MAGIC = b'RSA306PYR1'
+_HEADER_ALIGN = 64
+
+
+class _LevelWriter(object):
+    """ Накопитель одного уровня пирамиды: пишет строки и формирует строки следующего уровня """
+
+    __slots__ = 'mean_file', 'max_file', 'pending_mean', 'pending_max', 'rows'
+
+    def __init__(self, mean_file, max_file):
+        self.mean_file = mean_file
+        self.max_file = max_file
+        self.pending_mean = None
+        self.pending_max = None
+        self.rows = 0
+
+
+class SpectrogramPyramid(object):
+    """ Чтение пирамиды спектрограмм, построенной build_pyramid.
+
+    Атрибуты:
+    ---------
+    header: dict
+        параметры построения (nfft, частоты, длительность строки, уровни)
+    freqs: np.array
+        частоты столбцов, Гц (радиочастота с учетом center_frequency)
+    frame_duration: float
+        длительность строки уровня 0, с
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as pyr_file:
+            if pyr_file.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError('Файл %s не является пирамидой спектрограмм' % path)
+            header_size, = struct.unpack('<Q', pyr_file.read(8))
+            self.header = json.loads(pyr_file.read(header_size).decode())
+        h = self.header
+        self.freqs = h['f_start'] + h['f_step'] * np.arange(h['n_bins'])
+        self.frame_duration = h['frame_duration']
+        self._levels = []
+        for level in h['levels']:
+            arrays = {}
+            for kind in ('mean', 'max'):
+                if level['rows'] == 0:
+                    arrays[kind] = np.empty((0, h['n_bins']), dtype=h['dtype'])
+                else:
+                    arrays[kind] = np.memmap(path, dtype=h['dtype'], mode='r', offset=level['offset_' + kind],
+                                             shape=(level['rows'], h['n_bins']))
+            self._levels.append(arrays)
+
+    @property
+    def n_levels(self):
+        return len(self._levels)
+
+    def level_rows(self, level):
+        """ Число строк уровня level """
+        return self.header['levels'][level]['rows']
+
+    def _to_db(self, values):
+        h = self.header
+        if h['dtype'] == 'uint8':
+            return h['db_floor'] + values.astype(np.float32) * h['db_step']
+        return values.astype(np.float32)
+
+    def query(self, t_start, t_stop, f_start=None, f_stop=None, max_rows=1024, kind='mean', level=None):
+        """ Возвращает фрагмент спектрограммы.
+
+        Аргументы:
+        ----------
+        t_start, t_stop: float
+            интервал времени от начала записи, с
+        f_start, f_stop: float | None
+            интервал частот, Гц; None -- вся полоса
+        max_rows: int
+            наибольшее число строк результата; выбирается самый подробный
+            уровень, укладывающийся в это ограничение
+        kind: str
+            'mean' -- среднее значение мощности, 'max' -- удержание максимума
+        level: int | None
+            номер уровня; None -- выбрать автоматически по max_rows
+
+        Возвращает:
+        -----------
+        times: np.array
+            время начала каждой строки, с
+        freqs: np.array
+            частоты столбцов, Гц
+        S_dB: np.array
+            мощность, дБ, форма (len(times), len(freqs))
+
+        """
+        if level is None:
+            level = self.n_levels - 1
+            for k in range(self.n_levels):
+                row_duration = self.frame_duration * 2**k
+                if (t_stop - t_start) / row_duration <= max_rows:
+                    level = k
+                    break
+        row_duration = self.frame_duration * 2**level
+        rows = self.level_rows(level)
+        i_start = min(max(int(np.floor(t_start / row_duration)), 0), rows)
+        i_stop = min(max(int(np.ceil(t_stop / row_duration)), i_start), rows)
+
+        f_mask = np.ones(len(self.freqs), dtype=bool)
+        if f_start is not None:
+            f_mask &= self.freqs >= f_start
+        if f_stop is not None:
+            f_mask &= self.freqs <= f_stop
+        j_start = int(np.argmax(f_mask)) if f_mask.any() else 0
+        j_stop = j_start + int(f_mask.sum())
+
+        data = self._levels[level][kind][i_start:i_stop, j_start:j_stop]
+        times = np.arange(i_start, i_stop) * row_duration
+        return times, self.freqs[j_start:j_stop], self._to_db(data)
+
+
+def pyramid_path(capture_path):
+    """ Путь к файлу пирамиды рядом с записью """
+    return os.path.splitext(capture_path)[0] + '.pyr'
+
+
+def build_pyramid(reader, path=None, nfft=4096, window='hann', dtype='float16', db_floor=-160.0, db_step=0.5,
+                  frames_per_read=64):
+    """ Строит пирамиду спектрограмм за один проход по записи.
+
+    Аргументы:
+    ----------
+    reader: RSA306.reader.BaseReader | RSA306.captureset.CaptureSet
+        источник отсчетов
+    path: str | None
+        путь к файлу пирамиды; по умолчанию рядом с записью (расширение .pyr)
+    nfft: int
+        размер БПФ, отсчетов; строки уровня 0 не перекрываются
+    window: str
+        окно БПФ (scipy.signal.get_window)
+    dtype: str
+        'float16' -- хранить дБ в половинной точности;
+        'uint8' -- хранить дБ с шагом db_step начиная с db_floor
+    db_floor, db_step: float
+        параметры квантования для dtype='uint8', дБ
+    frames_per_read: int
+        число БПФ, вычисляемых за одно чтение
+
+    Возвращает:
+    -----------
+    path: str
+        путь к построенному файлу
+
+    Примечание:
+    -----------
+    Сохраняются только частоты в полосе bandwidth вокруг
+    if_center_frequency. Мощность калибрована так же, как в example.py:
+    масштаб adc_scale и поправка АЧХ из channel_correction. Неполные пары
+    строк в конце уровня отбрасываются.
+
+    """
+    if dtype not in ('float16', 'uint8'):
+        raise ValueError('dtype должен быть float16 или uint8')
+    if path is None:
+        path = pyramid_path(reader.readers[0]._path_to_file if hasattr(reader, 'readers') else reader._path_to_file)
+
+    Fs = float(reader.data_format.sample_rate)
+    f1 = float(reader.data_format.if_center_frequency)
+    f0 = float(reader.instrument_state.center_frequency)
+    bandwidth = float(reader.data_format.bandwidth)
+    correction = reader.channel_correction
+
+    f = np.fft.rfftfreq(nfft, d=1/Fs)
+    band = np.flatnonzero((f1 - bandwidth/2 < f) & (f < f1 + bandwidth/2))
+    j0, j1 = int(band[0]), int(band[-1]) + 1
+    w = get_window(window, nfft).astype(np.float32)
+    scale = (float(correction.adc_scale) / w.sum())**2
+    gain = 10**(-np.interp(f[j0:j1], correction.freq_table, correction.amp_table) / 10)
+    gain = (gain * scale).astype(np.float32)
+
+    def encode(power):
+        db = 10 * np.log10(np.maximum(power, 1e-30))
+        if dtype == 'uint8':
+            return np.clip(np.round((db - db_floor) / db_step), 0, 255).astype(np.uint8)
+        return db.astype(np.float16)
+
+    tmp_dir = path + '.parts'
+    os.makedirs(tmp_dir, exist_ok=True)
+    levels = []
+
+    def level(k):
+        while len(levels) <= k:
+            n = len(levels)
+            levels.append(_LevelWriter(open(os.path.join(tmp_dir, '%d.mean' % n), 'wb'),
+                                       open(os.path.join(tmp_dir, '%d.max' % n), 'wb')))
+        return levels[k]
+
+    def push(k, mean_rows, max_rows):
+        """ Записывает строки уровня k и передает попарные агрегаты на уровень k+1 """
+        lw = level(k)
+        lw.mean_file.write(encode(mean_rows).tobytes())
+        lw.max_file.write(encode(max_rows).tobytes())
+        lw.rows += len(mean_rows)
+        if lw.pending_mean is not None:
+            mean_rows = np.concatenate((lw.pending_mean, mean_rows))
+            max_rows = np.concatenate((lw.pending_max, max_rows))
+        n_pairs = len(mean_rows) // 2
+        if len(mean_rows) % 2:
+            lw.pending_mean, lw.pending_max = mean_rows[-1:], max_rows[-1:]
+        else:
+            lw.pending_mean = lw.pending_max = None
+        if n_pairs:
+            pairs_mean = mean_rows[:2 * n_pairs].reshape(n_pairs, 2, -1)
+            pairs_max = max_rows[:2 * n_pairs].reshape(n_pairs, 2, -1)
+            push(k + 1, pairs_mean.mean(axis=1), pairs_max.max(axis=1))
+
+    try:
+        for block in reader.readblock(nfft * frames_per_read, True):
+            n_frames = len(block) // nfft
+            if n_frames == 0:
+                continue
+            frames = block[:n_frames * nfft].reshape(n_frames, nfft) * w
+            spectra = np.fft.rfft(frames, axis=1)[:, j0:j1]
+            power = (spectra.real**2 + spectra.imag**2).astype(np.float32) * gain
+            push(0, power, power)
+
+        for lw in levels:
+            lw.mean_file.close()
+            lw.max_file.close()
+
+        itemsize = np.dtype(dtype).itemsize
+        row_bytes = (j1 - j0) * itemsize
+        header = {'nfft': nfft, 'window': window, 'sample_rate': Fs, 'dtype': dtype,
+                  'db_floor': db_floor, 'db_step': db_step, 'n_bins': j1 - j0,
+                  'f_start': f[j0] - f1 + f0, 'f_step': Fs / nfft, 'frame_duration': nfft / Fs, 'levels': []}
+        # Смещения уровней зависят от размера заголовка, поэтому начало данных
+        # увеличивается, пока заголовок с вычисленными смещениями не поместится
+        data_start = 0
+        while True:
+            offset = data_start
+            header['levels'] = []
+            for lw in levels:
+                size = lw.rows * row_bytes
+                header['levels'].append({'rows': lw.rows, 'offset_mean': offset, 'offset_max': offset + size})
+                offset += 2 * size
+            header_bytes = json.dumps(header).encode()
+            needed = -(-(len(_MAGIC) + 8 + len(header_bytes)) // _HEADER_ALIGN) * _HEADER_ALIGN
+            if needed <= data_start:
+                break
+            data_start = needed
+
+        with open(path, 'wb') as pyr_file:
+            pyr_file.write(_MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes)
+            pyr_file.write(b'\0' * (data_start - pyr_file.tell()))
+            for n, lw in enumerate(levels):
+                for kind in ('mean', 'max'):
+                    with open(os.path.join(tmp_dir, '%d.%s' % (n, kind)), 'rb') as part:
+                        while True:
+                            chunk = part.read(2**24)
+                            if not chunk:
+                                break
+                            pyr_file.write(chunk)
+    finally:
+        for lw in levels:
+            lw.mean_file.close()
+            lw.max_file.close()
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+    return path
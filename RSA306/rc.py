@@ -11,3 +11,13 @@ BLOCK_R3F_SIZE = SAMPLES_PER_BLOCK * BYTES_PER_SAMPLE + TRANSPORT_FOOTER_SIZE
 
 FREQ_INDEX_LENGTH = 501 * 4  # 501 * 4 байта
 PHASE_INDEX_LENGTH = FREQ_INDEX_LENGTH
+
+
+# Биты поля frame_status футера фрейма r3f
+FRAME_STATUS_ADC_OVERRANGE = 1 << 0
+FRAME_STATUS_DISCONTINUITY = 1 << 1  # потеря данных при передаче по USB
+FRAME_STATUS_TRIGGER1 = 1 << 2
+FRAME_STATUS_TRIGGER2 = 1 << 3
+FRAME_STATUS_TIME_SYNC = 1 << 4
+
+FRAME_STATUS_ERROR_MASK = FRAME_STATUS_ADC_OVERRANGE | FRAME_STATUS_DISCONTINUITY
@@ -1,8 +1,13 @@
-from RSA306.rc import BYTES_PER_SAMPLE, BLOCK_R3F_SIZE, HEADER_DATA_LENGTH, SAMPLES_PER_BLOCK, TRANSPORT_FOOTER_SIZE
-from RSA306.parsers import parse_footer, parse_channel_correction, parse_instrument_state, \
+from RSA306.rc import BYTES_PER_SAMPLE, BLOCK_R3F_SIZE, HEADER_DATA_LENGTH, SAMPLES_PER_BLOCK
+from RSA306.parsers import parse_footers, parse_channel_correction, parse_instrument_state, \
 	parse_data_format, parse_version_info
-from RSA306.types import InstrumentState, ChannelCorrection, DataFormat, VersionInfo
+from RSA306.types import InstrumentState, ChannelCorrection, DataFormat, VersionInfo, R3F_FRAME_DTYPE, FooterRecords
+from RSA306.integrity import check_footers
+from RSA306.events import find_triggers, extract_windows
+from RSA306.timing import TimeModel
 from math import ceil
+from os.path import getsize, exists
+from time import monotonic, sleep
 import numpy as np
 
 
@@ -28,6 +33,9 @@ class BaseReader:
 	channel_correction: ChannelCorrection
 		данные коррекции из заголовка
 
+	supports_memmap: bool
+		True - отсчеты можно отобразить в память методом memmap (RawReader, Reader)
+
 	_path_to_file: string
 		путь к файлу
 
@@ -45,6 +53,8 @@ class BaseReader:
 	data_format: DataFormat
 	channel_correction: ChannelCorrection
 
+	supports_memmap = False
+
 	def __init__(self, path):
 		self._path_to_file = path
 		self._read_header_data()
@@ -64,6 +74,48 @@ class BaseReader:
 
 		raise NotImplementedError("Необходимо реализовать метод _read_header_data")
 
+	def _count_samples(self) -> int:
+		raise NotImplementedError("Необходимо реализовать метод _count_samples")
+
+	@property
+	def n_samples(self) -> int:
+		""" Число отсчетов в файле; вычисляется по размеру файла при каждом обращении, поэтому учитывает
+		данные, дописанные в еще записываемый файл """
+		return self._count_samples()
+
+	@property
+	def duration(self) -> float:
+		""" Длительность записи, с """
+		return self.n_samples / self.data_format.sample_rate
+
+	def time_to_sample(self, seconds) -> int:
+		""" Номер отсчета, ближайшего к моменту seconds от начала записи (по DataFormat.sample_rate) """
+		return int(round(seconds * self.data_format.sample_rate))
+
+	def sample_to_time(self, sample) -> float:
+		""" Время отсчета sample от начала записи, с """
+		return sample / self.data_format.sample_rate
+
+	def read_time(self, t_start, t_stop) -> np.ndarray:
+		""" Считывает отсчеты интервала [t_start, t_stop) от начала записи, с
+
+		Примечание:
+		-----------
+		Границы переводятся в номера отсчетов time_to_sample, поэтому соседние интервалы стыкуются без
+		пропусков и повторов. Наследник должен реализовать read_range.
+		"""
+		return self.read_range(self.time_to_sample(t_start), self.time_to_sample(t_stop))
+
+	def time_model(self) -> TimeModel:
+		""" Модель времени записи: номер отсчета <-> тик прибора <-> время UTC
+
+		Примечание:
+		-----------
+		Заголовок не содержит тика первого отсчета, поэтому базовая модель считает, что отсчету 0 соответствует
+		тик clock_samples. Reader уточняет модель по timestamp футеров.
+		"""
+		return TimeModel(self.data_format)
+
 	def __str__(self):
 		""" Вывод информации об экземпляре класса в строку. """
 		str_lst = []
@@ -114,7 +166,27 @@ class BaseReader:
 
 
 class RawReader(BaseReader):
-	""" Реализует чтение r3a и r3h файлов """
+	""" Реализует чтение r3a и r3h файлов
+
+	Аргументы:
+	---------
+	path: string
+		путь к любому из файлов пары: r3a (отсчеты) или r3h (заголовок)
+
+	Атрибуты:
+	---------
+	data_path: string
+		путь к файлу отсчетов r3a
+	header_path: string
+		путь к файлу заголовка r3h
+	"""
+
+	supports_memmap = True
+
+	def __init__(self, path):
+		self.data_path = path[:-1] + 'a'
+		self.header_path = path[:-1] + 'h'
+		super().__init__(path)
 
 	def _read_header_data(self) -> None:
 		""" Считывает данные из файлов
@@ -124,9 +196,12 @@ class RawReader(BaseReader):
 		Рядом с файлом r3a должен находиться файл с заголовками r3h
 		"""
 
-		with open(self._path_to_file[:-1] + 'h', 'rb') as header_file:
+		with open(self.header_path, 'rb') as header_file:
 			self.header_data = header_file.read(HEADER_DATA_LENGTH)
 
+	def _count_samples(self) -> int:
+		return getsize(self.data_path) // BYTES_PER_SAMPLE
+
 	def read(self) -> np.array:
 		""" Считывает отсчёты с АЦП из файла полностью.
 
@@ -135,12 +210,46 @@ class RawReader(BaseReader):
 		adc_samples: np.array
 			массив, содержащий все отсчёты сигнала, записанные в файл
 
+		Примечание:
+		-----------
+		Для больших файлов удобнее memmap или read_range: они не загружают файл целиком.
+
 		"""
-		data_path = self._path_to_file[:-1] + 'a'
-		adc_samples = np.fromfile(data_path, dtype=np.int16)
+		adc_samples = np.fromfile(self.data_path, dtype=np.int16)
 		return adc_samples
 
-	def readblock(self, samples_per_block, short_allowed=True) -> np.array:
+	def memmap(self) -> np.memmap:
+		""" Отображает отсчеты файла r3a в память без чтения
+
+		Возвращает:
+		-----------
+		adc_samples: np.memmap
+			массив int16 только для чтения; данные считываются с диска при обращении к элементам
+		"""
+		n_samples = getsize(self.data_path) // BYTES_PER_SAMPLE
+		if n_samples == 0:
+			return np.empty(0, dtype=np.int16)
+		return np.memmap(self.data_path, dtype=np.int16, mode='r', shape=(n_samples,))
+
+	def read_range(self, start, stop) -> np.ndarray:
+		""" Считывает отсчеты [start, stop) файла через отображение в память
+
+		Аргументы:
+		----------
+		start: int
+			номер первого отсчета
+		stop: int
+			номер отсчета, следующего за последним
+
+		Возвращает:
+		-----------
+		adc_samples: np.ndarray
+			отсчеты int16 (меньше stop - start, если диапазон выходит за конец файла)
+		"""
+		start = max(int(start), 0)
+		return np.array(self.memmap()[start:max(int(stop), start)])
+
+	def readblock(self, samples_per_block, short_allowed=True, start=0) -> np.array:
 		""" Считывает отсчёты с АЦП из файла по блокам заданного размера.
 
 		Аргументы:
@@ -151,6 +260,8 @@ class RawReader(BaseReader):
 			False - если последний блок неполный, он отбрасывается
 			True - если последний блок неполный, он возвращается как массив
 				   с числом отсчётов менее samples_per_block
+		start: int
+			номер отсчета, с которого начинается чтение (например, self.time_to_sample(t))
 
 		Возвращает:
 		-----------
@@ -165,9 +276,9 @@ class RawReader(BaseReader):
 		bytes_per_block = samples_per_block * BYTES_PER_SAMPLE
 		adc_bytebuf = bytearray(bytes_per_block)
 		adc_samples = np.frombuffer(adc_bytebuf, dtype=np.int16)
-		data_path = self._path_to_file[:-1] + 'a'
 		file_exhausted = False
-		with open(data_path, 'rb') as data_file:
+		with open(self.data_path, 'rb') as data_file:
+			data_file.seek(int(start) * BYTES_PER_SAMPLE)
 			while True:
 				n_bytes_read = data_file.readinto(adc_bytebuf)
 				if n_bytes_read is None:
@@ -181,6 +292,38 @@ class RawReader(BaseReader):
 				if file_exhausted:
 					break
 
+	def follow(self, samples_per_block, poll_interval=0.1, idle_timeout=None, from_start=True):
+		""" Считывает отсчёты из r3a файла, который ещё записывается (аналог tail -f).
+
+		Аргументы:
+		----------
+		samples_per_block: int
+			размер блока в отсчётах, возвращаются только полные блоки
+		poll_interval: float
+			период опроса файла на появление новых данных, с
+		idle_timeout: float | None
+			None - ожидать новые данные бесконечно
+			число - завершить чтение, если файл не рос дольше заданного времени, с
+		from_start: bool
+			True - начать с первого отсчёта файла
+			False - читать только новые данные: начать после последнего полного блока на момент вызова
+
+		Возвращает:
+		-----------
+		generator
+			итератор по отсчётам очередных полных блоков (np.array)
+
+		Примечание:
+		-----------
+		Позиция начала определяется при вызове метода, а не при первой итерации. Буфер чтения переиспользуется
+		между итерациями.
+
+		"""
+		bytes_per_block = samples_per_block * BYTES_PER_SAMPLE
+		offset = 0 if from_start else getsize(self.data_path) // bytes_per_block * bytes_per_block
+		chunks = _follow_file(self.data_path, offset, bytes_per_block, 1, poll_interval, idle_timeout)
+		return (np.frombuffer(chunk, dtype=np.int16) for chunk in chunks)
+
 
 class Reader(BaseReader):
 	""" Чтение r3f файлов
@@ -191,6 +334,8 @@ class Reader(BaseReader):
 
 	"""
 
+	supports_memmap = True
+
 	def _read_header_data(self) -> None:
 		with open(self._path_to_file, 'rb') as header_file:
 			self.header_data = header_file.read(HEADER_DATA_LENGTH)
@@ -205,7 +350,7 @@ class Reader(BaseReader):
 		"""
 		return np.concatenate([adc_samples for adc_samples in self.readblock(SAMPLES_PER_BLOCK)])
 
-	def readblock(self, samples_per_block, short_allowed=True, read_metadata=False):
+	def readblock(self, samples_per_block, short_allowed=True, read_metadata=False, checker=None, start=0):
 		""" Считывает отсчёты с АЦП из файла по блокам заданного размера.
 
 		Аргументы:
@@ -219,11 +364,18 @@ class Reader(BaseReader):
 		read_metadata: bool
 			False - не извлекает данные
 			True - извлекает данные, причем формат возвращаемых данных меняется на кортеж. Первыми в кортеже
-					располагаются отсчеты, вторым элементом кортежа является структура Footer с заголовками фрейма
+					располагаются отсчеты, вторым элементом кортежа является запись футера фрейма (np.record с полями
+					RSA306.types.FOOTER_DTYPE)
+		checker: RSA306.integrity.FrameIntegrityChecker | None
+			проверка целостности потока по футерам по ходу чтения; найденные разрывы накапливаются в checker.gaps.
+			Если checker.fill, на место потерянных фреймов вставляются нули (только при read_metadata=False)
+		start: int
+			номер отсчета, с которого начинается чтение (при read_metadata=True -- кратный SAMPLES_PER_BLOCK);
+			позволяет продолжить чтение с сохраненной позиции
 
 		Возвращает:
 		-----------
-		np.array | tuple(np.array, RSA306.rc.Footer)
+		np.array | tuple(np.array, np.record)
 			отсчеты АЦП или фреймы с отсчетами АЦП и заголовочными данными каждого фрейма
 
 		Примечание:
@@ -235,80 +387,281 @@ class Reader(BaseReader):
 			raise ValueError("Чтобы получать отсчеты сместе с метаданными необходимо указать размер блока с "
 							 "отсчетами равный 8178. Можно воспользоваться константой RSA306.rc.SAMPLES_PER_BLOCK")
 
-		with open(self._path_to_file, 'rb') as data_file:
-			data_file.seek(HEADER_DATA_LENGTH)
+		if read_metadata and start % SAMPLES_PER_BLOCK:
+			raise ValueError("При read_metadata=True начальный отсчет start должен быть кратен SAMPLES_PER_BLOCK")
 
-			excessed_adc_samples = np.array([])
+		num_blocks = ceil(samples_per_block / SAMPLES_PER_BLOCK)
 
-			num_blocks = ceil(samples_per_block / SAMPLES_PER_BLOCK)
+		frames = np.empty(num_blocks, dtype=R3F_FRAME_DTYPE)
+		frames_bytes = frames.view(np.uint8)
 
-			blocks_buffer = bytearray(num_blocks * BLOCK_R3F_SIZE)
-			blocks_buffer_mem = memoryview(blocks_buffer)
+		excessed_adc_samples = np.empty(0, dtype=np.int16)
+		frames_done, skip = divmod(int(start), SAMPLES_PER_BLOCK)
 
-			block_samples = np.empty(num_blocks, dtype=object)
-			if read_metadata:
-				block_header = np.empty(num_blocks, dtype=object)
+		with open(self._path_to_file, 'rb') as data_file:
+			data_file.seek(HEADER_DATA_LENGTH + frames_done * BLOCK_R3F_SIZE)
 
-			for block_index in range(num_blocks):
-				block_start_samples = block_index * BLOCK_R3F_SIZE
-				block_stop_samples = block_start_samples + BLOCK_R3F_SIZE - TRANSPORT_FOOTER_SIZE
+			while True:
+				n_read_block_size = data_file.readinto(frames_bytes) or 0
+				file_exhausted = n_read_block_size < len(frames_bytes)
+				blocks_count = n_read_block_size // BLOCK_R3F_SIZE
 
-				block_samples[block_index] = np.frombuffer(blocks_buffer_mem[block_start_samples:block_stop_samples],
-														   dtype=np.int16)
+				gaps = checker(frames["footer"][:blocks_count], frames_done) if checker is not None else []
 
 				if read_metadata:
-					block_start_header = block_index * BLOCK_R3F_SIZE + SAMPLES_PER_BLOCK * BYTES_PER_SAMPLE
-					block_stop_header = block_start_header + TRANSPORT_FOOTER_SIZE
+					if blocks_count and (not file_exhausted or short_allowed):
+						yield tuple(zip(frames["samples"][:blocks_count],
+										frames["footer"][:blocks_count].copy().view(FooterRecords)))
+				else:
+					samples_from_blocks = frames["samples"][:blocks_count].reshape(-1)
+					if gaps and checker.fill:
+						samples_from_blocks = checker.zero_fill(samples_from_blocks, gaps, frames_done)
 
-					block_header[block_index] = blocks_buffer_mem[block_start_header:block_stop_header]
+					if skip:
+						samples_from_blocks, skip = samples_from_blocks[skip:], 0
+					data = np.concatenate((excessed_adc_samples, samples_from_blocks))
+					n_full = len(data) // samples_per_block * samples_per_block
+					for start in range(0, n_full, samples_per_block):
+						yield data[start:start + samples_per_block]
+					excessed_adc_samples = data[n_full:]
 
-			file_exhausted = False
-			while True:
-				n_read_block_size = data_file.readinto(blocks_buffer)
+					if file_exhausted and short_allowed and len(excessed_adc_samples):
+						yield excessed_adc_samples
 
-				if len(excessed_adc_samples) >= samples_per_block:
-					divided = np.split(excessed_adc_samples, [samples_per_block])
+				frames_done += blocks_count
 
-					excessed_adc_samples = divided[1]
+				if file_exhausted:
+					break
 
-					yield divided[0]
+	@property
+	def n_frames(self) -> int:
+		""" Число полных фреймов в файле; вычисляется по размеру файла при каждом обращении """
+		return max(getsize(self._path_to_file) - HEADER_DATA_LENGTH, 0) // BLOCK_R3F_SIZE
 
-				if n_read_block_size is None:
-					file_exhausted = True
-				elif n_read_block_size < len(blocks_buffer):
-					file_exhausted = True
+	def _count_samples(self) -> int:
+		return self.n_frames * SAMPLES_PER_BLOCK
 
-					if short_allowed:
-						blocks_count = n_read_block_size // BLOCK_R3F_SIZE
+	def memmap(self) -> np.memmap:
+		""" Отображает фреймы файла в память без чтения
 
-						if read_metadata:
-							yield tuple(zip(block_samples[:blocks_count],
-											map(parse_footer, block_header)[:blocks_count]))
-						else:
-							samples_from_blocks = np.concatenate(block_samples[:blocks_count])
+		Возвращает:
+		-----------
+		frames: np.memmap
+			массив записей RSA306.types.R3F_FRAME_DTYPE: поле samples - отсчеты фрейма, поле footer - его футер.
+			Неполный последний фрейм не включается
+		"""
+		n_frames = self.n_frames
+		if n_frames == 0:
+			return np.empty(0, dtype=R3F_FRAME_DTYPE)
+		return np.memmap(self._path_to_file, dtype=R3F_FRAME_DTYPE, mode='r', offset=HEADER_DATA_LENGTH,
+						 shape=(n_frames,))
 
-							yield np.concatenate((excessed_adc_samples, samples_from_blocks))
+	def read_range(self, start, stop) -> np.ndarray:
+		""" Считывает отсчеты [start, stop) файла, обращаясь только к затронутым фреймам
 
-				else:
-					if read_metadata:
-						yield tuple(zip(block_samples, list(map(parse_footer, block_header))))
-					else:
-						samples_from_blocks = np.concatenate(block_samples)
+		Аргументы:
+		----------
+		start: int
+			номер первого отсчета
+		stop: int
+			номер отсчета, следующего за последним
+
+		Возвращает:
+		-----------
+		adc_samples: np.ndarray
+			отсчеты int16 (меньше stop - start, если диапазон выходит за конец файла)
+		"""
+		frames = self.memmap()["samples"]
+		start = max(int(start), 0)
+		stop = min(int(stop), len(frames) * SAMPLES_PER_BLOCK)
+		if stop <= start:
+			return np.empty(0, dtype=np.int16)
 
-						divided = np.split(samples_from_blocks, [samples_per_block - len(excessed_adc_samples)])
+		first_frame, last_frame = start // SAMPLES_PER_BLOCK, -(-stop // SAMPLES_PER_BLOCK)
+		samples = np.asarray(frames[first_frame:last_frame]).reshape(-1)
+		offset = first_frame * SAMPLES_PER_BLOCK
+		return samples[start - offset:stop - offset]
 
-						data = np.concatenate((excessed_adc_samples, divided[0]))
+	def footers(self) -> np.ndarray:
+		""" Считывает футеры всех фреймов, не копируя отсчеты
 
-						excessed_adc_samples = divided[1]
+		Возвращает:
+		-----------
+		footers: RSA306.types.FooterRecords
+			массив записей RSA306.types.FOOTER_DTYPE
+		"""
+		return np.array(self.memmap()["footer"]).view(FooterRecords)
 
-						yield data
+	def check_integrity(self, **kwargs) -> list:
+		""" Проверяет непрерывность фреймов всего файла по футерам
 
-				if file_exhausted:
+		Аргументы:
+		----------
+		kwargs:
+			параметры RSA306.integrity.FrameIntegrityChecker
+
+		Возвращает:
+		-----------
+		gaps: list[RSA306.integrity.FrameGap]
+			разрывы frame_id, ошибки frame_status и скачки timestamp
+		"""
+		return check_footers(self.footers(), **kwargs)
+
+	def triggers(self, sources=(1, 2)):
+		""" Находит все события запуска в файле по футерам, не читая отсчеты
+
+		Аргументы:
+		----------
+		sources: iterable
+			номера входов запуска (1, 2)
+
+		Возвращает:
+		-----------
+		events: RSA306.events.TriggerEvents
+			абсолютные номера отсчетов и время (тики timestamp) всех событий запуска
+		"""
+		ticks_per_sample = float(self.data_format.time_sample_rate) / float(self.data_format.sample_rate)
+		return find_triggers(self.footers(), sources=sources, ticks_per_sample=ticks_per_sample)
+
+	def trigger_windows(self, pre, post, events=None):
+		""" Вырезает окна отсчетов вокруг событий запуска
+
+		Аргументы:
+		----------
+		pre: int
+			число отсчетов до события
+		post: int
+			число отсчетов начиная с события
+		events: RSA306.events.TriggerEvents | None
+			события; по умолчанию все события файла (self.triggers())
+
+		Возвращает:
+		-----------
+		windows: np.ndarray
+			массив int16 (число событий, pre + post), отсчеты за пределами файла равны 0
+		"""
+		if events is None:
+			events = self.triggers()
+		return extract_windows(self.memmap()["samples"], events.sample_index, pre, post)
+
+	def time_model(self) -> TimeModel:
+		""" Модель времени записи, построенная по timestamp футеров всех фреймов
+
+		Возвращает:
+		-----------
+		RSA306.timing.TimeModel
+			модель для векторизованного перевода номер отсчета <-> тик прибора <-> время UTC
+		"""
+		return TimeModel.from_footers(self.data_format, self.footers())
+
+	def follow(self, read_metadata=False, frames_per_read=16, poll_interval=0.1, idle_timeout=None,
+			   from_start=True):
+		""" Считывает фреймы из r3f файла, который ещё записывается (аналог tail -f).
+
+		Аргументы:
+		----------
+		read_metadata: bool
+			False - возвращаются только отсчеты
+			True - возвращается кортеж пар (отсчеты фрейма, запись футера), как в readblock
+		frames_per_read: int
+			наибольшее число фреймов, возвращаемых за одну итерацию
+		poll_interval: float
+			период опроса файла на появление новых данных, с
+		idle_timeout: float | None
+			None - ожидать новые данные бесконечно
+			число - завершить чтение, если файл не рос дольше заданного времени, с
+		from_start: bool
+			True - начать с первого фрейма файла
+			False - читать только новые данные: начать после последнего полного фрейма на момент вызова
+
+		Возвращает:
+		-----------
+		generator
+			итератор, на каждой итерации возвращающий np.array | tuple(tuple(np.array, np.record)) - отсчеты всех
+			полностью записанных на текущий момент фреймов (не более frames_per_read)
+
+		Примечание:
+		-----------
+		Позиция начала определяется при вызове метода, а не при первой итерации. Возвращаются только целые
+		фреймы размером BLOCK_R3F_SIZE, недописанный фрейм ожидается до появления его окончания.
+
+		"""
+		offset = HEADER_DATA_LENGTH
+		if not from_start:
+			offset += max(getsize(self._path_to_file) - HEADER_DATA_LENGTH, 0) // BLOCK_R3F_SIZE * BLOCK_R3F_SIZE
+
+		chunks = _follow_file(self._path_to_file, offset, BLOCK_R3F_SIZE, frames_per_read, poll_interval,
+							  idle_timeout)
+		return _split_frames(chunks, read_metadata)
+
+
+def _split_frames(chunks, read_metadata):
+	""" Разбирает буферы с целыми фреймами r3f на отсчеты и футеры (генератор для Reader.follow) """
+	sample_bytes = SAMPLES_PER_BLOCK * BYTES_PER_SAMPLE
+	for chunk in chunks:
+		frames = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, BLOCK_R3F_SIZE)
+		if read_metadata:
+			footers = parse_footers(np.ascontiguousarray(frames[:, sample_bytes:]).tobytes())
+			yield tuple(zip((frames[i, :sample_bytes].view(np.int16) for i in range(len(frames))), footers))
+		else:
+			yield np.ascontiguousarray(frames[:, :sample_bytes]).view(np.int16).reshape(-1)
+
+
+def _follow_file(path, offset, frame_size, frames_per_read, poll_interval, idle_timeout):
+	""" Читает растущий файл целыми фреймами, опрашивая его на появление новых данных.
+
+	Аргументы:
+	----------
+	path: string
+		путь к файлу
+	offset: int
+		смещение начала чтения в байтах
+	frame_size: int
+		размер фрейма в байтах, возвращаются только целые фреймы
+	frames_per_read: int
+		наибольшее число фреймов за одну итерацию
+	poll_interval: float
+		период опроса файла, с
+	idle_timeout: float | None
+		время без новых данных, после которого чтение завершается; None - ждать бесконечно
+
+	Возвращает:
+	-----------
+	chunk: memoryview
+		буфер с целым числом фреймов, переиспользуется между итерациями
+
+	Примечание:
+	-----------
+	Функция-генератор. Используется опрос, а не inotify: он одинаково работает на всех платформах и на сетевых
+	дисках. Задержка появления данных не превышает poll_interval.
+	"""
+	buffer = bytearray(frame_size * frames_per_read)
+	buffer_mem = memoryview(buffer)
+	pending = 0
+
+	with open(path, 'rb', buffering=0) as data_file:
+		data_file.seek(offset)
+		last_growth = monotonic()
+		while True:
+			n_bytes_read = data_file.readinto(buffer_mem[pending:]) or 0
+			pending += n_bytes_read
+			whole = pending // frame_size * frame_size
+
+			if whole:
+				yield buffer_mem[:whole]
+				buffer[:pending - whole] = buffer[whole:pending]
+				pending -= whole
+
+			if n_bytes_read:
+				last_growth = monotonic()
+			elif not whole:
+				if idle_timeout is not None and monotonic() - last_growth >= idle_timeout:
 					break
+				sleep(poll_interval)
 
 
 def _is_compatible_extension(extension):
-	""" Проверяет совместимость файла. Возможные расширения [.3rf | .r3a | r3h]
+	""" Проверяет совместимость файла. Возможные расширения [.r3f | .r3a | .r3h | .r3z | .r3c]
 
 	Аргументы:
 	----------
@@ -321,7 +674,7 @@ def _is_compatible_extension(extension):
 		совместим файл или нет
 	"""
 
-	return extension in [".r3f", ".r3a", "r3h"]
+	return extension in [".r3f", ".r3a", ".r3h", ".r3z", ".r3c"]
 
 
 def get_reader(path) -> BaseReader:
@@ -340,15 +693,25 @@ def get_reader(path) -> BaseReader:
 	Примечание:
 	-----------
 	Для формата r3a необходимо наличие рядом файла с расширением r3h, в
-	нем хранятся заголовки
+	нем хранятся заголовки. Для пары r3a/r3h можно передать путь к любому из файлов. Файлы r3z (сжатые
+	контейнеры RSA306.compressed) читаются CompressedReader. Если рядом с r3a/r3h лежит файл футеров r3c
+	(результат RSA306.transcode.transcode_r3f), возвращается TranscodedReader
 	"""
 
 	extension = path[-4:]
 
 	if not _is_compatible_extension(extension):
-		raise ValueError("f'Допустимы расширения файлов: r3f, r3h, r3a; задано {}'".format(extension))
+		raise ValueError("Допустимы расширения файлов: r3f, r3h, r3a, r3z, r3c; задано {}".format(extension))
 
 	if extension == ".r3f":
 		return Reader(path)
 
+	if extension == ".r3z":
+		from RSA306.compressed import CompressedReader
+		return CompressedReader(path)
+
+	if exists(path[:-1] + 'c'):
+		from RSA306.transcode import TranscodedReader
+		return TranscodedReader(path)
+
 	return RawReader(path)
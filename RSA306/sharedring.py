@@ -0,0 +1,385 @@
+""" Раздача одного потока фреймов нескольким процессам через общую память.
+
+Производитель один раз читает запись (Reader, RawReader и т.п.) и помещает
+фреймы и их футеры в кольцевой буфер в multiprocessing.shared_memory.
+Потребители в других процессах подключаются к буферу по имени и получают
+представления numpy прямо на общую память, без копирования.
+
+Позиция чтения каждого потребителя хранится в управляющем блоке. Политика
+для отстающих потребителей:
+    'block' -- производитель ждет, пока самый медленный потребитель не
+               освободит ячейку;
+    'drop'  -- производитель не ждет; отставший больше чем на размер кольца
+               потребитель пропускает фреймы, пропуски считаются в dropped.
+
+Производитель отмечает в управляющем блоке конец записываемого участка
+(WRITING) до копирования фреймов и конец записанного (WRITE_SEQ) после него.
+При политике 'drop' потребитель копирует порцию и сверяет WRITING до и после
+копирования (как в seqlock): фреймы, которые производитель мог перезаписать
+за это время, отбрасываются. Каждый потерянный фрейм учитывается в dropped
+ровно один раз, так что число полученных и пропущенных фреймов в сумме равно
+числу записанных.
+"""
+
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from RSA306.rc import SAMPLES_PER_BLOCK
+from RSA306.types import FOOTER_DTYPE, FooterRecords
+
+_POLL_INTERVAL = 0.001
+
+# Управляющий блок: массив int64
+_WRITE_SEQ, _CLOSED, _SLOTS, _MAX_CONSUMERS, _POLICY, _WRITING = range(6)
+_HEADER_WORDS = 8
+_CONSUMER_WORDS = 4
+_ACTIVE, _READ_SEQ, _DROPPED = range(3)
+_POLICIES = ('block', 'drop')
+_ALIGN = 64
+
+
+def _layout(slots, max_consumers):
+    """ Смещения управляющего блока, отсчетов и футеров в общей памяти """
+    control_size = 8 * (_HEADER_WORDS + _CONSUMER_WORDS * max_consumers)
+    samples_offset = -(-control_size // _ALIGN) * _ALIGN
+    samples_size = slots * SAMPLES_PER_BLOCK * 2
+    footers_offset = samples_offset + -(-samples_size // _ALIGN) * _ALIGN
+    total = footers_offset + slots * FOOTER_DTYPE.itemsize
+    return samples_offset, footers_offset, total
+
+
+class _Ring(object):
+    """ Представления numpy на общую память кольца """
+
+    def __init__(self, shm, slots, max_consumers):
+        samples_offset, footers_offset, _ = _layout(slots, max_consumers)
+        self.shm = shm
+        self.control = np.ndarray(_HEADER_WORDS + _CONSUMER_WORDS * max_consumers, dtype=np.int64, buffer=shm.buf)
+        self.consumers = self.control[_HEADER_WORDS:].reshape(max_consumers, _CONSUMER_WORDS)
+        self.samples = np.ndarray((slots, SAMPLES_PER_BLOCK), dtype=np.int16, buffer=shm.buf, offset=samples_offset)
+        self.footers = np.ndarray(slots, dtype=FOOTER_DTYPE, buffer=shm.buf, offset=footers_offset)
+        self.slots = slots
+
+    def release(self):
+        del self.control, self.consumers, self.samples, self.footers
+
+
+class RingProducer(object):
+    """ Производитель: читает запись и записывает фреймы в кольцевой буфер.
+
+    Пример:
+    -------
+    producer = RingProducer(get_reader(path), slots=512, policy='block')
+    # передать producer.name процессам-потребителям, затем
+    producer.run()
+    producer.unlink()
+
+    """
+
+    def __init__(self, reader, slots=256, max_consumers=8, policy='block', name=None):
+        """ Конструктор производителя.
+
+        Аргументы:
+        ----------
+        reader: RSA306.reader.BaseReader
+            источник фреймов; для r3f фреймы и футеры берутся из memmap(),
+            для прочих ридеров отсчеты делятся на фреймы по SAMPLES_PER_BLOCK,
+            а в футерах заполняется только frame_id
+        slots: int
+            число фреймов в кольце
+        max_consumers: int
+            наибольшее число потребителей
+        policy: str
+            'block' или 'drop' (см. описание модуля)
+        name: str | None
+            имя блока общей памяти; None -- выбирается автоматически
+
+        """
+        if policy not in _POLICIES:
+            raise ValueError('Политика должна быть одной из: %s' % ', '.join(_POLICIES))
+        self.reader = reader
+        self.policy = policy
+        size = _layout(slots, max_consumers)[2]
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._ring = _Ring(self._shm, slots, max_consumers)
+        control = self._ring.control
+        control[:] = 0
+        control[_SLOTS], control[_MAX_CONSUMERS] = slots, max_consumers
+        control[_POLICY] = _POLICIES.index(policy)
+
+    @property
+    def name(self):
+        """ Имя блока общей памяти для подключения потребителей """
+        return self._shm.name
+
+    @property
+    def frames_written(self):
+        return int(self._ring.control[_WRITE_SEQ])
+
+    def _frames(self, frames_per_read):
+        """ Порции (отсчеты (n, SAMPLES_PER_BLOCK), футеры) из ридера """
+        frames = self.reader.memmap() if self.reader.supports_memmap else None
+        if frames is not None and frames.dtype.names and 'footer' in frames.dtype.names:
+            for start in range(0, len(frames), frames_per_read):
+                chunk = frames[start:start + frames_per_read]
+                yield chunk['samples'], chunk['footer']
+            return
+        n_frames = self.reader.n_samples // SAMPLES_PER_BLOCK
+        for start in range(0, n_frames, frames_per_read):
+            stop = min(start + frames_per_read, n_frames)
+            samples = self.reader.read_range(start * SAMPLES_PER_BLOCK, stop * SAMPLES_PER_BLOCK)
+            footers = np.zeros(stop - start, dtype=FOOTER_DTYPE)
+            footers['frame_id'] = np.arange(start, stop)
+            yield samples.reshape(-1, SAMPLES_PER_BLOCK), footers
+
+    def _free_slots(self):
+        """ Число ячеек, которые можно перезаписать, не нарушая политику """
+        ring = self._ring
+        if self.policy == 'drop':
+            return ring.slots
+        active = ring.consumers[:, _ACTIVE] != 0
+        if not active.any():
+            return ring.slots
+        oldest = int(ring.consumers[active, _READ_SEQ].min())
+        return ring.slots - (int(ring.control[_WRITE_SEQ]) - oldest)
+
+    def run(self, frames_per_read=16, wait_consumers=0, close=True):
+        """ Читает запись целиком в кольцо.
+
+        Аргументы:
+        ----------
+        frames_per_read: int
+            число фреймов, читаемых за одно обращение к ридеру
+        wait_consumers: int
+            перед началом дождаться подключения стольких потребителей
+        close: bool
+            по окончании отметить поток завершенным (потребители получат StopIteration)
+
+        """
+        ring = self._ring
+        while int((ring.consumers[:, _ACTIVE] != 0).sum()) < wait_consumers:
+            time.sleep(_POLL_INTERVAL)
+
+        for samples, footers in self._frames(frames_per_read):
+            done = 0
+            while done < len(samples):
+                free = self._free_slots()
+                if free <= 0:
+                    time.sleep(_POLL_INTERVAL)
+                    continue
+                seq = int(ring.control[_WRITE_SEQ])
+                slot = seq % ring.slots
+                n = min(len(samples) - done, free, ring.slots - slot)
+                ring.control[_WRITING] = seq + n
+                ring.samples[slot:slot + n] = samples[done:done + n]
+                ring.footers[slot:slot + n] = footers[done:done + n]
+                ring.control[_WRITE_SEQ] = seq + n
+                done += n
+        if close:
+            self.close()
+
+    def close(self):
+        """ Отмечает поток завершенным """
+        self._ring.control[_CLOSED] = 1
+
+    def consumer_stats(self):
+        """ Состояние потребителей: список словарей (index, read_seq, lag, dropped) """
+        ring = self._ring
+        write_seq = int(ring.control[_WRITE_SEQ])
+        return [{'index': i, 'read_seq': int(c[_READ_SEQ]), 'lag': write_seq - int(c[_READ_SEQ]),
+                 'dropped': int(c[_DROPPED])}
+                for i, c in enumerate(ring.consumers) if c[_ACTIVE]]
+
+    def unlink(self):
+        """ Освобождает общую память (после отключения потребителей) """
+        self._ring.release()
+        self._shm.close()
+        # Потребители снимают блок с учета resource_tracker (см. _attach), а
+        # unlink снимает его еще раз: регистрируем повторно, чтобы учет сошелся
+        _track(self._shm, register=True)
+        self._shm.unlink()
+
+
+class RingConsumer(object):
+    """ Потребитель: подключается к кольцу по имени и читает фреймы без копирования.
+
+    Пример:
+    -------
+    with RingConsumer(name) as consumer:
+        for samples, footers in consumer:
+            ...  # samples: (n, SAMPLES_PER_BLOCK) int16, footers: FooterRecords
+
+    Примечание:
+    -----------
+    При политике 'block' порции -- представления на общую память без
+    копирования; они действительны до следующей итерации: позиция чтения
+    сдвигается (и ячейки освобождаются для производителя) только при
+    запросе следующей порции. При политике 'drop' производитель не ждет
+    потребителя, поэтому порция копируется в буферы потребителя (до
+    max_frames фреймов) и возвращается только ее часть, не перезаписанная
+    во время копирования; буферы действительны до следующей итерации.
+
+    """
+
+    def __init__(self, name, index=None, max_frames=64, from_oldest=False):
+        """ Конструктор потребителя.
+
+        Аргументы:
+        ----------
+        name: str
+            имя блока общей памяти (RingProducer.name)
+        index: int | None
+            номер ячейки потребителя в управляющем блоке; None -- первая
+            свободная (при одновременном подключении нескольких потребителей
+            номера лучше задавать явно)
+        max_frames: int
+            наибольшее число фреймов в одной порции
+        from_oldest: bool
+            True -- начать с самого старого фрейма, еще находящегося в кольце;
+            False -- с очередного записываемого
+
+        """
+        self._shm = _attach(name)
+        header = np.ndarray(_HEADER_WORDS, dtype=np.int64, buffer=self._shm.buf)
+        slots, max_consumers = int(header[_SLOTS]), int(header[_MAX_CONSUMERS])
+        self.policy = _POLICIES[int(header[_POLICY])]
+        del header
+        self._ring = _Ring(self._shm, slots, max_consumers)
+        self.max_frames = max_frames
+        if self.policy == 'drop':
+            self._samples = np.empty((min(max_frames, slots), SAMPLES_PER_BLOCK), dtype=np.int16)
+            self._footers = np.empty(min(max_frames, slots), dtype=FOOTER_DTYPE)
+
+        consumers = self._ring.consumers
+        if index is None:
+            free = np.flatnonzero(consumers[:, _ACTIVE] == 0)
+            if len(free) == 0:
+                raise RuntimeError('Нет свободных мест для потребителей (max_consumers = %d)' % max_consumers)
+            index = int(free[0])
+        elif consumers[index, _ACTIVE]:
+            raise RuntimeError('Место потребителя %d уже занято' % index)
+        self.index = index
+        write_seq = int(self._ring.control[_WRITE_SEQ])
+        consumers[index, _READ_SEQ] = max(write_seq - slots, 0) if from_oldest else write_seq
+        consumers[index, _DROPPED] = 0
+        consumers[index, _ACTIVE] = 1
+        self._pending = 0
+
+    @property
+    def dropped(self):
+        """ Число пропущенных фреймов """
+        return int(self._ring.consumers[self.index, _DROPPED])
+
+    @property
+    def read_seq(self):
+        """ Номер следующего фрейма потока """
+        return int(self._ring.consumers[self.index, _READ_SEQ])
+
+    def _commit(self):
+        """ Освобождает ячейки предыдущей порции """
+        if not self._pending:
+            return
+        me = self._ring.consumers[self.index]
+        me[_READ_SEQ] += self._pending
+        self._pending = 0
+
+    def read(self, timeout=None):
+        """ Очередная порция фреймов.
+
+        Возвращает:
+        -----------
+        (samples, footers) | None
+            представления на общую память; None -- поток завершен или истек timeout
+
+        """
+        self._commit()
+        ring, me = self._ring, self._ring.consumers[self.index]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            write_seq = int(ring.control[_WRITE_SEQ])
+            read_seq = self._skip_overwritten(int(ring.control[_WRITING]))
+            if write_seq <= read_seq:
+                if ring.control[_CLOSED] or (deadline is not None and time.monotonic() >= deadline):
+                    return None
+                time.sleep(_POLL_INTERVAL)
+                continue
+
+            slot = read_seq % ring.slots
+            n = min(write_seq - read_seq, self.max_frames, ring.slots - slot)
+            if self.policy == 'block':
+                self._pending = n
+                return ring.samples[slot:slot + n], ring.footers[slot:slot + n].view(FooterRecords)
+
+            self._samples[:n] = ring.samples[slot:slot + n]
+            self._footers[:n] = ring.footers[slot:slot + n]
+            # Фреймы, которые производитель начал перезаписывать во время копирования, -- начало порции
+            lost = min(max(int(ring.control[_WRITING]) - ring.slots - read_seq, 0), n)
+            me[_DROPPED] += lost
+            me[_READ_SEQ] = read_seq + n
+            if lost < n:
+                return self._samples[lost:n], self._footers[lost:n].view(FooterRecords)
+
+    def _skip_overwritten(self, writing):
+        """ Пропускает фреймы, ячейки которых перезаписаны или перезаписываются; возвращает позицию чтения """
+        me = self._ring.consumers[self.index]
+        read_seq = int(me[_READ_SEQ])
+        lost = writing - self._ring.slots - read_seq
+        if lost > 0:
+            me[_DROPPED] += lost
+            read_seq += lost
+            me[_READ_SEQ] = read_seq
+        return read_seq
+
+    def __iter__(self):
+        while True:
+            batch = self.read()
+            if batch is None:
+                return
+            yield batch
+
+    def close(self):
+        """ Отключается от кольца и освобождает место потребителя """
+        if self._ring is None:
+            return
+        self._commit()
+        self._ring.consumers[self.index, _ACTIVE] = 0
+        self._ring.release()
+        self._ring = None
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _track(shm, register):
+    """ Ставит блок общей памяти на учет resource_tracker процесса или снимает с учета """
+    try:
+        from multiprocessing import resource_tracker
+    except ImportError:
+        return
+    if register:
+        resource_tracker.register(shm._name, 'shared_memory')
+    else:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+
+def _attach(name):
+    """ Подключение к существующей общей памяти.
+
+    Потребитель не владеет блоком, поэтому блок не должен оставаться на учете
+    resource_tracker: иначе при выходе процесса-потребителя трекер удалит
+    общую память, которой еще пользуется производитель. Начиная с Python 3.13
+    учет отключается аргументом track, в более ранних версиях блок снимается
+    с учета после подключения.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        _track(shm, register=False)
+        return shm
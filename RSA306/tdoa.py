@@ -0,0 +1,276 @@
+""" Разность времени прихода (TDOA) по взаимной корреляции синхронных записей.
+
+Несколько приборов RSA306 записывают сигнал с общей шкалой времени. Для
+каждого события (например, импульса или пакета) из всех записей вырезаются
+окна, начала которых совпадают по времени UTC согласно моделям времени,
+построенным по timestamp футеров (RSA306.timing.TimeModel). Для пачки событий
+сразу вычисляются взаимно корреляционные функции через БПФ (обобщенная
+взаимная корреляция, при необходимости с весом PHAT), их максимум уточняется
+интерполяцией спектральным дополнением нулями и параболой по трем точкам.
+
+Окна и планы БПФ кэшируются в процессе (как в RSA306.psd), поэтому пакетный
+расчет batch_tdoa удобно выполнять в пуле процессов.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.fft
+
+from RSA306.events import extract_windows
+from RSA306.reader import get_reader
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+TDOAResult = namedtuple('TDOAResult', 'delay lag peak start_samples')
+TDOAResult.__doc__ = """ Результат измерения разности времени прихода.
+
+delay: np.array
+    задержка сигнала в записи k относительно опорной (первой) записи, с; форма (число событий, число записей - 1)
+lag: np.array
+    та же задержка в отсчетах между окнами (без поправки на несовпадение начал окон), форма как у delay
+peak: np.array
+    нормированное значение максимума корреляции 0..1, форма как у delay
+start_samples: np.array
+    номера первых отсчетов окон в каждой записи, форма (число событий, число записей)
+"""
+
+# Планы БПФ процесса: (batch, nfft, M) -> (прямое вещественное БПФ, обратное комплексное БПФ)
+_PLANS = {}
+_FFT_WORKERS = 1
+
+
+def _init_worker(fft_workers):
+    """ Инициализация процесса-исполнителя: число потоков БПФ """
+    global _FFT_WORKERS
+    _FFT_WORKERS = fft_workers
+
+
+def _plan(batch, nfft, M):
+    """ Функции БПФ длины nfft и обратного БПФ длины M для пачки из batch окон """
+    key = batch, nfft, M
+    if key not in _PLANS:
+        if pyfftw is not None:
+            forward = pyfftw.builders.rfft(pyfftw.empty_aligned((batch, nfft), dtype='float32'), axis=1,
+                                           threads=_FFT_WORKERS, planner_effort='FFTW_MEASURE')
+            inverse = pyfftw.builders.ifft(pyfftw.empty_aligned((batch, M), dtype='complex64'), axis=1,
+                                           threads=_FFT_WORKERS, planner_effort='FFTW_MEASURE')
+
+            def rfft(x, forward=forward):
+                return forward(x)
+
+            def ifft(x, inverse=inverse):
+                return inverse(x)
+        else:
+            def rfft(x):
+                return scipy.fft.rfft(x, n=nfft, axis=1, workers=_FFT_WORKERS)
+
+            def ifft(x):
+                return scipy.fft.ifft(x, axis=1, workers=_FFT_WORKERS, overwrite_x=True)
+        _PLANS[key] = rfft, ifft
+    return _PLANS[key]
+
+
+def correlate_windows(reference, others, max_lag, upsample=8, band=None, Fs=None, weighting=None):
+    """ Векторизованная взаимная корреляция пачки окон.
+
+    Аргументы:
+    ----------
+    reference: np.array
+        окна опорной записи, форма (число событий, N), вещественные отсчеты
+    others: list[np.array]
+        окна остальных записей той же формы
+    max_lag: int
+        наибольшая искомая задержка, отсчетов (|задержка| <= max_lag < N)
+    upsample: int
+        коэффициент интерполяции корреляционной функции дополнением спектра нулями
+    band: tuple | None
+        полоса частот (f_lo, f_hi), Гц, в которой вычисляется корреляция (требует Fs);
+        None -- вся положительная полуось частот
+    Fs: float | None
+        частота дискретизации, Гц
+    weighting: str | None
+        None -- обычная корреляция, 'phat' -- взвешивание PHAT (по фазе взаимного спектра)
+
+    Возвращает:
+    -----------
+    (lag, peak): tuple(np.array, np.array)
+        задержки окон others относительно reference, отсчетов (дробные), и нормированные значения
+        максимума корреляции; форма (число событий, len(others))
+
+    Примечание:
+    -----------
+    Корреляция вычисляется по аналитическому сигналу (только положительные частоты), поэтому максимум ищется по
+    огибающей корреляционной функции и не перескакивает между периодами несущей.
+
+    """
+    reference = np.asarray(reference)
+    n_events, N = reference.shape
+    if not 0 <= max_lag < N:
+        raise ValueError('max_lag должен быть в пределах [0, %d)' % N)
+    nfft = scipy.fft.next_fast_len(N + max_lag, real=True)
+    n_bins = nfft // 2 + 1
+    M = nfft * upsample
+    rfft, ifft = _plan(n_events, nfft, M)
+
+    mask = np.ones(n_bins, dtype=bool)
+    if band is not None:
+        if Fs is None:
+            raise ValueError('Для band необходимо задать Fs')
+        f = np.fft.rfftfreq(nfft, d=1/Fs)
+        mask = (band[0] <= f) & (f <= band[1])
+
+    def spectrum(x):
+        padded = np.zeros((n_events, nfft), dtype=np.float32)
+        padded[:, :N] = x
+        return rfft(padded)[:, mask].astype(np.complex64)
+
+    A = spectrum(reference)
+    energy_a = np.sum(np.abs(A)**2, axis=1)
+    lags = np.arange(-max_lag * upsample, max_lag * upsample + 1)
+    lag = np.empty((n_events, len(others)))
+    peak = np.empty((n_events, len(others)))
+    cross = np.zeros((n_events, M), dtype=np.complex64)
+    for k, x in enumerate(others):
+        B = spectrum(x)
+        C = np.conj(A) * B
+        if weighting == 'phat':
+            C /= np.maximum(np.abs(C), np.finfo(np.float32).tiny)
+            scale = np.full(n_events, mask.sum(), dtype=float)
+        elif weighting is None:
+            scale = np.sqrt(energy_a * np.sum(np.abs(B)**2, axis=1))
+        else:
+            raise ValueError('Неизвестное взвешивание %s' % weighting)
+        cross[:] = 0
+        cross[:, np.flatnonzero(mask)] = C
+        c = np.abs(ifft(cross)[:, lags % M])
+
+        i = np.clip(np.argmax(c, axis=1), 1, len(lags) - 2)
+        rows = np.arange(n_events)
+        y0, y1, y2 = c[rows, i - 1], c[rows, i], c[rows, i + 1]
+        denominator = y0 - 2 * y1 + y2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = np.where(denominator < 0, 0.5 * (y0 - y2) / denominator, 0.0)
+        lag[:, k] = (lags[i] + delta) / upsample
+        with np.errstate(invalid='ignore', divide='ignore'):
+            peak[:, k] = np.where(scale > 0, y1 * M / scale, 0.0)
+    return lag, peak
+
+
+def _windows(reader, starts, length):
+    """ Окна отсчетов длины length с началами starts (выход за границы записи заполняется нулями) """
+    samples = reader.memmap() if reader.supports_memmap else None
+    if samples is not None:
+        if samples.dtype.names:
+            samples = samples['samples']
+        return extract_windows(samples, starts, 0, length)
+    windows = np.zeros((len(starts), length), dtype=np.int16)
+    for row, start in enumerate(starts):
+        x = reader.read_range(max(start, 0), start + length)
+        offset = max(-start, 0)
+        windows[row, offset:offset + len(x)] = x[:length - offset]
+    return windows
+
+
+def measure_tdoa(readers, event_times, window, max_lag, upsample=8, band=None, weighting=None, batch=32,
+                 time_models=None):
+    """ Разность времени прихода событий в синхронных записях.
+
+    Аргументы:
+    ----------
+    readers: list[RSA306.reader.BaseReader]
+        записи (не менее двух) с общей шкалой времени и одинаковой частотой дискретизации; первая -- опорная
+    event_times: np.array
+        времена начала окон событий, datetime64 (например, reference.time_model().sample_to_datetime(...))
+    window: int
+        длина окна, отсчетов
+    max_lag: int
+        наибольшая искомая задержка, отсчетов
+    upsample, band, weighting:
+        см. correlate_windows
+    batch: int
+        число событий, обрабатываемых одним вызовом БПФ
+    time_models: list[RSA306.timing.TimeModel] | None
+        модели времени записей; None -- reader.time_model()
+
+    Возвращает:
+    -----------
+    result: TDOAResult
+
+    Примечание:
+    -----------
+    Начала окон в разных записях округляются до целого отсчета; задержка delay учитывает разность времени
+    начал окон по моделям времени (с точностью до 1 нс).
+
+    """
+    if len(readers) < 2:
+        raise ValueError('Необходимо не менее двух записей')
+    Fs = float(readers[0].data_format.sample_rate)
+    for reader in readers[1:]:
+        if float(reader.data_format.sample_rate) != Fs:
+            raise ValueError('Записи различаются частотой дискретизации')
+    time_models = time_models or [reader.time_model() for reader in readers]
+    event_times = np.asarray(event_times, dtype='datetime64[ns]')
+
+    starts = np.stack([model.datetime_to_sample(event_times) for model in time_models], axis=1)
+    start_times = np.stack([model.sample_to_datetime(starts[:, k]) for k, model in enumerate(time_models)], axis=1)
+    offset = (start_times[:, 1:] - start_times[:, :1]).astype(np.int64) / 1e9
+
+    lag = np.empty((len(event_times), len(readers) - 1))
+    peak = np.empty_like(lag)
+    for first in range(0, len(event_times), batch):
+        rows = slice(first, first + batch)
+        windows = [_windows(reader, starts[rows, k], window) for k, reader in enumerate(readers)]
+        lag[rows], peak[rows] = correlate_windows(windows[0], windows[1:], max_lag, upsample=upsample, band=band,
+                                                  Fs=Fs, weighting=weighting)
+    return TDOAResult(delay=lag / Fs + offset, lag=lag, peak=peak, start_samples=starts)
+
+
+def _tdoa_task(paths, event_times, kwargs):
+    return measure_tdoa([get_reader(path) for path in paths], event_times, **kwargs)
+
+
+def batch_tdoa(paths, event_times, window, max_lag, events_per_task=256, workers=None, fft_workers=1, **kwargs):
+    """ measure_tdoa для большого числа событий в пуле процессов.
+
+    Аргументы:
+    ----------
+    paths: list[str]
+        пути к синхронным записям; первая -- опорная
+    event_times: np.array
+        времена начала окон событий, datetime64
+    window, max_lag:
+        см. measure_tdoa
+    events_per_task: int
+        число событий в одной задаче
+    workers: int | None
+        число процессов; None -- по числу процессоров, 0 -- вычислять в текущем процессе
+    fft_workers: int
+        число потоков БПФ в каждом процессе
+    kwargs:
+        upsample, band, weighting, batch (см. measure_tdoa)
+
+    Возвращает:
+    -----------
+    result: TDOAResult
+        результаты в порядке event_times
+
+    """
+    event_times = np.asarray(event_times, dtype='datetime64[ns]')
+    kwargs = dict(kwargs, window=window, max_lag=max_lag)
+    chunks = [event_times[start:start + events_per_task]
+              for start in range(0, len(event_times), events_per_task)] or [event_times]
+    if workers == 0:
+        _init_worker(fft_workers)
+        results = [_tdoa_task(paths, chunk, kwargs) for chunk in chunks]
+    else:
+        workers = min(workers or os.cpu_count(), len(chunks))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(fft_workers,)) as executor:
+            results = list(executor.map(_tdoa_task, [paths] * len(chunks), chunks, [kwargs] * len(chunks)))
+    return TDOAResult(*(np.concatenate(fields) for fields in zip(*results)))
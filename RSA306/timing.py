@@ -0,0 +1,118 @@
+"""
+Модель времени записи: соответствие номера отсчета, тика счетчика времени прибора и времени UTC
+"""
+
+from RSA306.rc import SAMPLES_PER_BLOCK
+from RSA306.types import DataFormat
+import numpy as np
+
+_NS_PER_SECOND = 10 ** 9
+
+
+class TimeModel:
+	""" Векторизованное преобразование между номером отсчета, тиком и временем UTC
+
+	Аргументы:
+	---------
+	data_format: DataFormat
+		данные формата из заголовка: ref_time, clock_samples, time_sample_rate, sample_rate
+	anchor_samples: np.ndarray | None
+		номера отсчетов опорных точек (начала фреймов, после которых нарушается равномерность времени)
+	anchor_ticks: np.ndarray | None
+		тики опорных точек
+
+	Атрибуты:
+	---------
+	ref_datetime: np.datetime64
+		время UTC, соответствующее тику clock_samples
+
+	Примечание:
+	-----------
+	Между опорными точками время считается равномерным: тик = тик опоры + (отсчет - отсчет опоры) *
+	time_sample_rate / sample_rate. Все вычисления целочисленные, поэтому точность не теряется на длинных записях.
+	Если опорные точки не заданы, отсчету 0 соответствует тик clock_samples.
+
+	События синхронизации времени (time_sync_idx, флаг FRAME_STATUS_TIME_SYNC) в модели не используются: футер не
+	содержит тика или времени UTC, которому соответствует событие, поэтому привязку задают только timestamp
+	футеров и пара ref_time/clock_samples заголовка.
+	"""
+
+	def __init__(self, data_format: DataFormat, anchor_samples=None, anchor_ticks=None):
+		self.time_sample_rate = int(data_format.time_sample_rate)
+		self.sample_rate = int(data_format.sample_rate)
+		self.clock_samples = int(data_format.clock_samples)
+
+		self.ref_datetime = data_format.ref_datetime
+
+		if anchor_samples is None:
+			anchor_samples, anchor_ticks = [0], [self.clock_samples]
+		self.anchor_samples = np.asarray(anchor_samples, dtype=np.int64)
+		self.anchor_ticks = np.asarray(anchor_ticks, dtype=np.int64)
+
+	@classmethod
+	def from_footers(cls, data_format: DataFormat, footers: np.ndarray):
+		""" Строит модель по футерам r3f
+
+		Аргументы:
+		----------
+		data_format: DataFormat
+			данные формата из заголовка
+		footers: np.ndarray
+			массив записей RSA306.types.FOOTER_DTYPE всех фреймов файла
+
+		Возвращает:
+		-----------
+		TimeModel
+			модель, в которой опорными точками служат только фреймы, нарушающие равномерность timestamp
+			(первый фрейм и фреймы после потерь)
+		"""
+		if len(footers) == 0:
+			return cls(data_format)
+
+		timestamp = footers["timestamp"].astype(np.int64)
+		frame_samples = np.arange(len(footers), dtype=np.int64) * SAMPLES_PER_BLOCK
+		ticks_per_frame = SAMPLES_PER_BLOCK * int(data_format.time_sample_rate) // int(data_format.sample_rate)
+
+		anchors = np.concatenate(([0], np.flatnonzero(np.diff(timestamp) != ticks_per_frame) + 1))
+
+		return cls(data_format, anchor_samples=frame_samples[anchors], anchor_ticks=timestamp[anchors])
+
+	def sample_to_tick(self, samples) -> np.ndarray:
+		""" Номера отсчетов -> тики счетчика времени прибора (int64) """
+		samples = np.asarray(samples, dtype=np.int64)
+		k = np.maximum(np.searchsorted(self.anchor_samples, samples, side='right') - 1, 0)
+		return self.anchor_ticks[k] + _scale(samples - self.anchor_samples[k], self.time_sample_rate, self.sample_rate)
+
+	def tick_to_sample(self, ticks) -> np.ndarray:
+		""" Тики счетчика времени прибора -> номера отсчетов (int64, с округлением вниз) """
+		ticks = np.asarray(ticks, dtype=np.int64)
+		k = np.maximum(np.searchsorted(self.anchor_ticks, ticks, side='right') - 1, 0)
+		return self.anchor_samples[k] + _scale(ticks - self.anchor_ticks[k], self.sample_rate, self.time_sample_rate)
+
+	def tick_to_datetime(self, ticks) -> np.ndarray:
+		""" Тики счетчика времени прибора -> время UTC (datetime64[ns]) """
+		ticks = np.asarray(ticks, dtype=np.int64)
+		nanoseconds = _scale(ticks - self.clock_samples, _NS_PER_SECOND, self.time_sample_rate)
+		return self.ref_datetime + nanoseconds.astype('timedelta64[ns]')
+
+	def datetime_to_tick(self, datetimes) -> np.ndarray:
+		""" Время UTC (datetime64) -> тики счетчика времени прибора (int64)
+
+		Округление выполняется вверх, поэтому преобразование точно обратно tick_to_datetime
+		"""
+		nanoseconds = (np.asarray(datetimes, dtype='datetime64[ns]') - self.ref_datetime).astype(np.int64)
+		return self.clock_samples - _scale(-nanoseconds, self.time_sample_rate, _NS_PER_SECOND)
+
+	def sample_to_datetime(self, samples) -> np.ndarray:
+		""" Номера отсчетов -> время UTC (datetime64[ns]) """
+		return self.tick_to_datetime(self.sample_to_tick(samples))
+
+	def datetime_to_sample(self, datetimes) -> np.ndarray:
+		""" Время UTC (datetime64) -> номера отсчетов (int64) """
+		return self.tick_to_sample(self.datetime_to_tick(datetimes))
+
+
+def _scale(values, numerator, denominator):
+	""" Точное floor(values * numerator / denominator) в int64 без переполнения промежуточного произведения """
+	quotient, remainder = np.divmod(values, denominator)
+	return quotient * numerator + remainder * numerator // denominator
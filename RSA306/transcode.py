@@ -0,0 +1,181 @@
+"""
+Перекодирование r3f в раздельные файлы: непрерывные отсчеты, футеры по столбцам и исходный заголовок
+
+В r3f каждые 8178 отсчетов чередуются с 28-байтным футером, поэтому отсчеты никогда не лежат на диске подряд.
+transcode_r3f один раз разделяет запись на:
+	<base>.r3a - отсчеты int16 подряд (тот же формат, что пишет прибор в режиме r3a);
+	<base>.r3h - исходный заголовок HEADER_DATA_LENGTH байт;
+	<base>.r3c - футеры по столбцам: каждое поле FOOTER_DTYPE хранится отдельным массивом.
+Повторные проходы анализа читают отсчеты последовательно и используют упреждающее чтение ОС целиком.
+"""
+
+from os.path import splitext
+import json
+import struct
+from RSA306.rc import HEADER_DATA_LENGTH, BLOCK_R3F_SIZE
+from RSA306.reader import RawReader, Reader
+from RSA306.pipeline import ThreadedPipeline
+from RSA306.events import find_triggers
+from RSA306.timing import TimeModel
+from RSA306.integrity import check_footers
+from RSA306.types import FOOTER_DTYPE, R3F_FRAME_DTYPE, FooterRecords
+import numpy as np
+
+COLUMNS_MAGIC = b"RSA306C1"
+_COLUMNS_ALIGN = 64
+
+
+def columns_path(path) -> str:
+	""" Путь к файлу футеров по столбцам для записи path (r3a, r3h или r3c) """
+	return splitext(path)[0] + ".r3c"
+
+
+def _columns_layout(count):
+	""" Заголовок файла столбцов и смещение начала данных """
+	columns, offset = {}, 0
+	for name in FOOTER_DTYPE.names:
+		field_dtype = FOOTER_DTYPE.fields[name][0]
+		base, shape = field_dtype.base, field_dtype.shape
+		columns[name] = {"dtype": base.str, "shape": list(shape), "offset": offset}
+		size = count * field_dtype.itemsize
+		offset += -(-size // _COLUMNS_ALIGN) * _COLUMNS_ALIGN
+	header = {"count": count, "columns": columns}
+	header_bytes = json.dumps(header).encode()
+	data_start = -(-(len(COLUMNS_MAGIC) + 8 + len(header_bytes)) // _COLUMNS_ALIGN) * _COLUMNS_ALIGN
+	return header, header_bytes, data_start, offset
+
+
+def _read_frames(path, n_frames, frames_per_read):
+	""" Читает фреймы r3f порциями в переиспользуемый буфер """
+	frames = np.empty(frames_per_read, dtype=R3F_FRAME_DTYPE)
+	frames_bytes = frames.view(np.uint8)
+	with open(path, "rb") as src:
+		src.seek(HEADER_DATA_LENGTH)
+		done = 0
+		while done < n_frames:
+			count = min(frames_per_read, n_frames - done)
+			n_read = src.readinto(frames_bytes[:count * BLOCK_R3F_SIZE]) or 0
+			count = n_read // BLOCK_R3F_SIZE
+			if count == 0:
+				break
+			yield frames[:count]
+			done += count
+
+
+def transcode_r3f(path, dst_base=None, frames_per_read=1024, depth=4) -> str:
+	""" Разделяет запись r3f на непрерывные отсчеты, футеры по столбцам и заголовок
+
+	Аргументы:
+	----------
+	path: string
+		путь к файлу r3f
+	dst_base: string | None
+		путь к результату без расширения; по умолчанию рядом с исходным файлом
+	frames_per_read: int
+		число фреймов в одной порции
+	depth: int
+		глубина очередей между потоками чтения, записи отсчетов и записи футеров
+
+	Возвращает:
+	-----------
+	path: string
+		путь к файлу отсчетов r3a; get_reader для него вернет TranscodedReader
+
+	Примечание:
+	-----------
+	Чтение исходного файла, запись отсчетов и запись футеров выполняются в разных потоках (ThreadedPipeline),
+	объем памяти ограничен depth порциями. Неполный последний фрейм отбрасывается.
+	"""
+	reader = Reader(path)
+	n_frames = reader.n_frames
+	dst_base = dst_base if dst_base is not None else splitext(path)[0]
+	data_path, header_path, footer_path = dst_base + ".r3a", dst_base + ".r3h", dst_base + ".r3c"
+
+	with open(header_path, "wb") as header_file:
+		header_file.write(reader.header_data)
+
+	header, header_bytes, data_start, data_size = _columns_layout(n_frames)
+	with open(footer_path, "wb") as footer_file:
+		footer_file.write(COLUMNS_MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+		footer_file.truncate(data_start + data_size)
+
+	columns = {}
+	for name, column in header["columns"].items():
+		if n_frames:
+			columns[name] = np.memmap(footer_path, dtype=column["dtype"], mode="r+",
+									  offset=data_start + column["offset"], shape=(n_frames, *column["shape"]))
+
+	with open(data_path, "wb") as data_file:
+		def write_samples(frames):
+			data_file.write(np.ascontiguousarray(frames["samples"]).data)
+			return frames["footer"]
+
+		done = 0
+		pipeline = ThreadedPipeline([write_samples], depth=depth)
+		for footers in pipeline.run(_read_frames(path, n_frames, frames_per_read)):
+			for name, column in columns.items():
+				column[done:done + len(footers)] = footers[name]
+			done += len(footers)
+
+	for column in columns.values():
+		column.flush()
+	return data_path
+
+
+class TranscodedReader(RawReader):
+	""" Чтение записи, перекодированной transcode_r3f: отсчеты r3a, заголовок r3h и футеры r3c
+
+	Аргументы:
+	---------
+	path: string
+		путь к любому из файлов r3a, r3h, r3c
+
+	Примечание:
+	-----------
+	memmap, read_range и readblock унаследованы от RawReader и читают непрерывный файл отсчетов без копирования
+	футеров. footers, check_integrity, triggers и time_model дают те же результаты, что Reader для исходного r3f.
+	"""
+
+	def __init__(self, path):
+		self.columns_path = columns_path(path)
+		super().__init__(splitext(path)[0] + ".r3a")
+		with open(self.columns_path, "rb") as columns_file:
+			if columns_file.read(len(COLUMNS_MAGIC)) != COLUMNS_MAGIC:
+				raise ValueError(f"Файл {self.columns_path} не является файлом футеров r3c")
+			header_size, = struct.unpack("<Q", columns_file.read(8))
+			self._columns_header = json.loads(columns_file.read(header_size).decode())
+		self._columns_start = _columns_layout(self._columns_header["count"])[2]
+
+	@property
+	def n_frames(self) -> int:
+		""" Число фреймов исходной записи """
+		return self._columns_header["count"]
+
+	def footer_column(self, name) -> np.ndarray:
+		""" Один столбец футеров (например 'timestamp') в виде np.memmap без чтения остальных полей """
+		column = self._columns_header["columns"][name]
+		if self.n_frames == 0:
+			return np.empty((0, *column["shape"]), dtype=column["dtype"])
+		return np.memmap(self.columns_path, dtype=column["dtype"], mode="r",
+						 offset=self._columns_start + column["offset"], shape=(self.n_frames, *column["shape"]))
+
+	def footers(self) -> np.ndarray:
+		""" Футеры всех фреймов в виде массива записей RSA306.types.FOOTER_DTYPE """
+		footers = np.zeros(self.n_frames, dtype=FOOTER_DTYPE)
+		for name in FOOTER_DTYPE.names:
+			footers[name] = self.footer_column(name)
+		return footers.view(FooterRecords)
+
+	def check_integrity(self, **kwargs) -> list:
+		""" Проверяет непрерывность фреймов по футерам, как Reader.check_integrity """
+		return check_footers(self.footers(), **kwargs)
+
+	def triggers(self, sources=(1, 2)):
+		""" События запуска по футерам, как Reader.triggers """
+		ticks_per_sample = float(self.data_format.time_sample_rate) / float(self.data_format.sample_rate)
+		return find_triggers(self.footers(), sources=sources, ticks_per_sample=ticks_per_sample)
+
+	def time_model(self) -> TimeModel:
+		""" Модель времени записи по футерам, как Reader.time_model """
+		return TimeModel.from_footers(self.data_format, self.footers())
+
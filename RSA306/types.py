@@ -2,20 +2,141 @@
 Содержит классы заполняемые из заголовков 
 """
 
-from collections import namedtuple
+from dataclasses import dataclass
+import numpy as np
+from RSA306.rc import SAMPLES_PER_BLOCK, FRAME_STATUS_ADC_OVERRANGE, FRAME_STATUS_DISCONTINUITY, \
+	FRAME_STATUS_TRIGGER1, FRAME_STATUS_TRIGGER2, FRAME_STATUS_TIME_SYNC
 
-VersionInfo = namedtuple("VersionInfo", "file_id endian file_format_version api_version fx3_version fpga_version "
-										"device_sn")
+# Секции заголовка -- dataclass со __slots__: поля хранятся без словаря экземпляра, значения приводятся парсерами
+# к int, float, str и tuple. Производные величины вычисляются один раз в __post_init__.
 
-InstrumentState = namedtuple("InstrumentState", "reference_level center_frequency temperature alignment "
-												"freq_reference trig_mode trig_source trig_trans trig_level")
 
-DataFormat = namedtuple("DataFormat", "data_type frame_offset frame_size sample_offset sample_size non_sample_offset "
-									  "non_sample_size if_center_frequency sample_rate bandwidth corrected time_type "
-									  "ref_time clock_samples time_sample_rate")
+@dataclass
+class VersionInfo:
+	""" Версии формата файла, ПО и прибора """
 
-ChannelCorrection = namedtuple("ChannelCorrection", "adc_scale path_delay correction_type table_entries freq_table "
-													"amp_table phase_table")
+	__slots__ = ("file_id", "endian", "file_format_version", "api_version", "fx3_version", "fpga_version",
+				 "device_sn")
 
-Footer = namedtuple("Footer", "frame_id trigger2_idx trigger1_idx time_sync_idx "
-								"frame_status timestamp reserved")
\ No newline at end of file
+	file_id: str
+	endian: int
+	file_format_version: tuple
+	api_version: tuple
+	fx3_version: tuple
+	fpga_version: tuple
+	device_sn: str
+
+
+@dataclass
+class InstrumentState:
+	""" Состояние прибора во время записи """
+
+	__slots__ = ("reference_level", "center_frequency", "temperature", "alignment", "freq_reference", "trig_mode",
+				 "trig_source", "trig_trans", "trig_level")
+
+	reference_level: float
+	center_frequency: float
+	temperature: float
+	alignment: int
+	freq_reference: int
+	trig_mode: int
+	trig_source: int
+	trig_trans: int
+	trig_level: float
+
+
+@dataclass
+class DataFormat:
+	""" Формат отсчетов и времени
+
+	Производные атрибуты:
+	---------------------
+	ref_datetime: np.datetime64
+		время UTC ref_time с точностью до наносекунды; NaT, если поля ref_time не образуют допустимую дату
+	"""
+
+	__slots__ = ("data_type", "frame_offset", "frame_size", "sample_offset", "sample_size", "non_sample_offset",
+				 "non_sample_size", "if_center_frequency", "sample_rate", "bandwidth", "corrected", "time_type",
+				 "ref_time", "clock_samples", "time_sample_rate", "ref_datetime")
+
+	data_type: int
+	frame_offset: int
+	frame_size: int
+	sample_offset: int
+	sample_size: int
+	non_sample_offset: int
+	non_sample_size: int
+	if_center_frequency: float
+	sample_rate: float
+	bandwidth: float
+	corrected: int
+	time_type: int
+	ref_time: tuple
+	clock_samples: int
+	time_sample_rate: int
+
+	def __post_init__(self):
+		year, month, day, hour, minute, second, nanosecond = self.ref_time
+		try:
+			self.ref_datetime = (np.datetime64(f'{year:04d}-{month:02d}-{day:02d}T{hour:02d}:{minute:02d}:'
+											   f'{second:02d}', 'ns') + np.timedelta64(nanosecond, 'ns'))
+		except ValueError:
+			# Нулевое или недопустимое ref_time (например, в заголовках без привязки ко времени) не мешает чтению
+			self.ref_datetime = np.datetime64('NaT', 'ns')
+
+
+@dataclass(eq=False)
+class ChannelCorrection:
+	""" Коррекция канала: масштаб АЦП и таблицы АЧХ/ФЧХ """
+
+	__slots__ = ("adc_scale", "path_delay", "correction_type", "table_entries", "freq_table", "amp_table",
+				 "phase_table")
+
+	adc_scale: float
+	path_delay: float
+	correction_type: int
+	table_entries: int
+	freq_table: np.ndarray
+	amp_table: np.ndarray
+	phase_table: np.ndarray
+
+
+# Футер фрейма r3f в виде записи numpy: позволяет разбирать футеры сразу массивом
+FOOTER_DTYPE = np.dtype([("reserved", "<u2", (3,)), ("padding", "<u2"), ("frame_id", "<u4"), ("trigger2_idx", "<u2"),
+						 ("trigger1_idx", "<u2"), ("time_sync_idx", "<u2"), ("frame_status", "<u2"),
+						 ("timestamp", "<u8")])
+
+# Фрейм r3f целиком: отсчеты АЦП и футер, размер записи равен BLOCK_R3F_SIZE
+R3F_FRAME_DTYPE = np.dtype([("samples", "<i2", (SAMPLES_PER_BLOCK,)), ("footer", FOOTER_DTYPE)])
+
+
+class FooterRecords(np.recarray):
+	""" Массив футеров FOOTER_DTYPE с доступом к полям как к атрибутам (footers.frame_id)
+
+	Флаги frame_status декодируются при первом обращении и запоминаются в экземпляре. Срез массива -- новый
+	экземпляр со своим кэшем.
+	"""
+
+	_FLAGS = {"adc_overrange": FRAME_STATUS_ADC_OVERRANGE, "discontinuity": FRAME_STATUS_DISCONTINUITY,
+			  "trigger1": FRAME_STATUS_TRIGGER1, "trigger2": FRAME_STATUS_TRIGGER2, "time_sync": FRAME_STATUS_TIME_SYNC}
+
+	def __array_finalize__(self, obj):
+		super().__array_finalize__(obj)
+		self._decoded = {}
+
+	def flag(self, name) -> np.ndarray:
+		""" Булев массив флага name: adc_overrange, discontinuity, trigger1, trigger2, time_sync """
+		if name not in self._decoded:
+			self._decoded[name] = (np.asarray(self["frame_status"]) & self._FLAGS[name]) != 0
+		return self._decoded[name]
+
+
+class Footer(np.record):
+	""" Футер одного фрейма: запись numpy с полями FOOTER_DTYPE (footer.frame_id, footer.timestamp, ...)
+
+	Возвращается RSA306.parsers.parse_footer. Элементы массивов FooterRecords -- обычные np.record с теми же полями.
+	"""
+
+
+# Тип данных массива, элементы которого -- экземпляры Footer
+FOOTER_RECORD_DTYPE = np.dtype((Footer, FOOTER_DTYPE))
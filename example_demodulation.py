@@ -5,10 +5,10 @@ import matplotlib.pyplot as plt
 import numpy as np
 from scipy.signal import get_window
 from scipy.interpolate import CubicSpline
-from scipy.io.wavfile import write
 
 from RSA306.reader import get_reader, BaseReader
 from RSA306.conversion import fir_coefs, PPResample, PassbandToBaseband_IH, FM_Demodulate
+from RSA306.audio import AudioSink, BlockAGC
 
 
 fm_r3f_path = 'data/FM-2022.06.07.14.40.46.902.r3f'
@@ -62,25 +62,16 @@ print(f'{block_size_1}')
 print(f'{block_size_2}')
 print(f'{block_size_3}')
 
-out_lst = []
-
 Nblocks = 0
-for i, block_samples in enumerate(rsa_reader.readblock(block_size_1, False)):
-    duration_done = (i + 1) * block_size_1 / Fs1
-
-    if duration_done > 25:
-        break
-
-    print(f'\r{i} ({duration_done:.3f} s)', end='', flush=True)
-    block_IQ = bconv(block_samples)
-    block_demod = demod(block_IQ)
-    block_out = resampler2(block_demod)
-    out_lst.append(block_out.copy())
-
-s_out = np.concatenate(out_lst)
-s_out /= np.max(np.abs(s_out))
-s_out *= 2**15-1
-
-write(f'dist/{f_station/1e6:.1f} FM.wav', int(Fs3), s_out.astype(np.int16))
-
-
+with AudioSink(f'dist/{f_station/1e6:.1f} FM.wav', Fs3, agc=BlockAGC(target=0.9)) as sink:
+    for i, block_samples in enumerate(rsa_reader.readblock(block_size_1, False)):
+        duration_done = (i + 1) * block_size_1 / Fs1
+
+        if duration_done > 25:
+            break
+
+        print(f'\r{i} ({duration_done:.3f} s)', end='', flush=True)
+        block_IQ = bconv(block_samples)
+        block_demod = demod(block_IQ)
+        block_out = resampler2(block_demod)
+        sink.write(block_out)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, 'data')
+sys.path.insert(0, ROOT)
+
+R3F_PATH = os.path.join(DATA, 'DATA1-2020.01.16.11.50.44.823.r3f')
+R3F_NEXT_PATH = os.path.join(DATA, 'DATA1-2020.01.16.11.51.03.655.r3f')
+R3A_PATH = os.path.join(DATA, 'DATA2-2020.01.16.12.06.56.091.r3a')
+R3H_PATH = os.path.join(DATA, 'DATA2-2020.01.16.12.06.56.091.r3h')
+
+
+@pytest.fixture
+def r3f_path():
+    return R3F_PATH
+
+
+@pytest.fixture
+def r3a_path():
+    return R3A_PATH
@@ -0,0 +1,89 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from RSA306.detection import _block_powers, block_power, iter_active_blocks, merge_intervals, scan_activity
+from RSA306.rc import SAMPLES_PER_BLOCK
+from RSA306.reader import get_reader
+
+from conftest import R3A_PATH, R3F_PATH, R3H_PATH
+
+BLOCK = 1000
+# Амплитуды блоков: тишина, сигнал (выше on_db = -30 дБ) и промежуточный уровень между порогами
+QUIET, LOUD, MID = 30, 1000, 160
+LAYOUT = [(10, QUIET), (10, LOUD), (5, MID), (15, QUIET), (5, MID), (1, LOUD), (2, QUIET), (2, LOUD), (50, QUIET)]
+
+
+@pytest.fixture(scope='module')
+def reader(tmp_path_factory):
+    """ r3a с блоками постоянной мощности по LAYOUT (порог on -30 дБ ~ 222, off -36 дБ ~ 112 единиц АЦП) """
+    tmp_path = tmp_path_factory.mktemp('activity')
+    rng = np.random.default_rng(0)
+    amplitude = np.repeat([a for n, a in LAYOUT], [n * BLOCK for n, a in LAYOUT])
+    samples = (amplitude * rng.choice([-1, 1], len(amplitude))).astype(np.int16)
+    shutil.copy(R3H_PATH, tmp_path / 'activity.r3h')
+    (tmp_path / 'activity.r3a').write_bytes(samples.tobytes())
+    return get_reader(str(tmp_path / 'activity.r3a'))
+
+
+@pytest.mark.parametrize('blocks_per_read', [1, 7, 1000])
+def test_hysteresis_intervals(reader, blocks_per_read):
+    intervals = scan_activity(reader, block_size=BLOCK, pad_blocks=0, merge_blocks=0, blocks_per_read=blocks_per_read)
+    # Промежуточный уровень продолжает активность (блоки 20-24) и не начинает ее (блоки 40-44)
+    assert intervals.tolist() == [[10 * BLOCK, 25 * BLOCK], [45 * BLOCK, 46 * BLOCK], [48 * BLOCK, 50 * BLOCK]]
+
+
+def test_padding_and_merging(reader):
+    intervals = scan_activity(reader, block_size=BLOCK, pad_blocks=0, merge_blocks=2)
+    assert intervals.tolist() == [[10 * BLOCK, 25 * BLOCK], [45 * BLOCK, 50 * BLOCK]]
+    intervals = scan_activity(reader, block_size=BLOCK, pad_blocks=1, merge_blocks=0)
+    assert intervals.tolist() == [[9 * BLOCK, 26 * BLOCK], [44 * BLOCK, 51 * BLOCK]]
+
+
+def test_activity_until_end(tmp_path):
+    shutil.copy(R3H_PATH, tmp_path / 'tail.r3h')
+    samples = np.concatenate([np.full(3 * BLOCK, QUIET), np.full(2 * BLOCK, LOUD)]).astype(np.int16)
+    (tmp_path / 'tail.r3a').write_bytes(samples.tobytes())
+    intervals = scan_activity(get_reader(str(tmp_path / 'tail.r3a')), block_size=BLOCK, pad_blocks=1)
+    assert intervals.tolist() == [[2 * BLOCK, 5 * BLOCK]]
+
+
+def test_active_blocks_read_only_intervals(reader):
+    intervals = scan_activity(reader, block_size=BLOCK, pad_blocks=0, merge_blocks=2)
+    samples = reader.read()
+    blocks = [(start, block.copy()) for start, block in iter_active_blocks(reader, intervals, 4096, True)]
+    assert sum(len(block) for _, block in blocks) == int(np.sum(intervals[:, 1] - intervals[:, 0]))
+    for start, block in blocks:
+        assert np.array_equal(block, samples[start:start + len(block)])
+    assert np.array_equal(np.concatenate([block for _, block in blocks]),
+                          np.concatenate([samples[a:b] for a, b in intervals]))
+
+
+def test_block_power_matches_definition():
+    x = np.full(2 * BLOCK + 5, 100, dtype=np.int16)
+    power = block_power(x, BLOCK, adc_scale=0.01)
+    assert power.shape == (2,)
+    assert np.allclose(power, 10 * np.log10(1.0 / 50) + 30)
+
+
+def test_merge_intervals():
+    assert merge_intervals([[0, 5], [3, 8], [10, 12], [20, 30], [21, 22]], gap=2).tolist() == [[0, 12], [20, 30]]
+    assert merge_intervals(np.empty((0, 2))).shape == (0, 2)
+
+
+def test_thresholds_checked(reader):
+    with pytest.raises(ValueError):
+        scan_activity(reader, on_db=-40, off_db=-30)
+
+
+@pytest.mark.parametrize('path', [R3A_PATH, R3F_PATH], ids=['r3a', 'r3f'])
+def test_default_block_size(path):
+    reader = get_reader(path)
+    intervals = scan_activity(reader, on_db=-200.0, off_db=-200.0, pad_blocks=0)
+    n_blocks = reader.n_samples // SAMPLES_PER_BLOCK
+    assert intervals.tolist() == [[0, n_blocks * SAMPLES_PER_BLOCK]]
+    samples = reader.read_range(0, n_blocks * SAMPLES_PER_BLOCK)
+    adc_scale = float(reader.channel_correction.adc_scale)
+    expected = block_power(samples, SAMPLES_PER_BLOCK, adc_scale)
+    assert np.array_equal(np.concatenate(list(_block_powers(reader, SAMPLES_PER_BLOCK, 16))), expected)
@@ -0,0 +1,108 @@
+import wave
+
+import numpy as np
+import pytest
+
+from RSA306 import audio
+from RSA306.audio import AudioSink, BlockAGC, fm_gain
+
+
+def _read_wav(path):
+    with wave.open(path, 'rb') as wav:
+        assert wav.getnchannels() == 1 and wav.getsampwidth() == 2
+        return wav.getframerate(), np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+
+
+def _tone(n, amplitude, seed=0):
+    return (amplitude * np.sin(0.05 * np.arange(n) + seed)).astype(np.float32)
+
+
+def test_wav_written_block_by_block(tmp_path):
+    path = str(tmp_path / 'out.wav')
+    blocks = [_tone(1000, 0.3, k) for k in range(5)] + [np.full(10, 1.5, dtype=np.float32)]
+    with AudioSink(path, 32000.0, gain=2.0) as sink:
+        for block in blocks:
+            sink.write(block)
+    assert sink.frames_written == 5010
+    assert sink.clipped == 10
+    Fs, pcm = _read_wav(path)
+    assert Fs == 32000
+    x = np.concatenate(blocks) * np.float32(2.0)
+    assert np.array_equal(pcm, np.round(np.clip(x, -1, 1) * 32767).astype('<i2'))
+
+
+def test_agc_steady_state_reaches_target():
+    agc = BlockAGC(target=0.5, release=1.05)
+    for k in range(200):
+        y = agc(_tone(1000, 0.01, k))
+    assert agc.gain == pytest.approx(50.0, rel=1e-3)
+    assert np.abs(y).max() == pytest.approx(0.5, rel=2e-3)
+
+
+def test_agc_attack_immediate_release_limited():
+    agc = BlockAGC(target=0.5, release=1.05, initial_gain=5.0)
+    agc(_tone(1000, 0.5))
+    assert agc.gain == pytest.approx(1.0, rel=1e-5)
+    gains = [agc.gain]
+    for k in range(10):
+        agc(_tone(1000, 0.05, k))
+        gains.append(agc.gain)
+    assert np.allclose(np.array(gains[1:]) / gains[:-1], 1.05)
+
+
+def test_agc_release_ramps_within_block():
+    agc = BlockAGC(target=0.5, initial_gain=1.0)
+    x = np.ones(100, dtype=np.float32)
+    first = agc(x * 0.1)
+    # Восстановление: усиление растет линейно от прежнего значения к новому
+    assert first[0] / 0.1 == pytest.approx(1.0 + 0.05 / 100, rel=1e-5)
+    assert first[-1] / 0.1 == pytest.approx(1.05, rel=1e-6)
+
+
+@pytest.mark.parametrize('quiet', [0.001, 0.1])
+def test_agc_attack_keeps_peak_below_target(quiet):
+    agc = BlockAGC(target=0.5)
+    for k in range(20):
+        agc(_tone(1000, quiet, k))
+    x = _tone(1000, 0.9)
+    loud = agc(x)
+    assert np.abs(loud).max() <= 0.5 * (1 + 1e-6)
+    # Атака: новое усиление применяется ко всему отрезку
+    assert np.allclose(loud, x * agc.gain, rtol=1e-6, atol=0)
+
+
+def test_agc_silence_limited_by_max_gain():
+    agc = BlockAGC(max_gain=20.0)
+    assert not agc(np.zeros(100, dtype=np.float32)).any()
+    assert agc.gain == 20.0
+
+
+def test_agc_state_roundtrip():
+    agc = BlockAGC()
+    assert agc.get_state()['gain'].size == 0
+    agc(_tone(500, 0.2))
+    resumed = BlockAGC()
+    resumed.set_state(agc.get_state())
+    x = _tone(500, 0.3, 1)
+    assert np.array_equal(resumed(x), agc(x))
+
+
+def test_unsupported_format(tmp_path):
+    with pytest.raises(ValueError):
+        AudioSink(str(tmp_path / 'out.mp3'), 32000)
+
+
+@pytest.mark.skipif(audio.soundfile is None, reason='soundfile не установлен')
+def test_flac_lossless(tmp_path):
+    path = str(tmp_path / 'out.flac')
+    x = _tone(4000, 0.7)
+    with AudioSink(path, 48000) as sink:
+        sink.write(x[:1500])
+        sink.write(x[1500:])
+    pcm, Fs = audio.soundfile.read(path, dtype='int16')
+    assert Fs == 48000
+    assert np.array_equal(pcm, np.round(x * 32767).astype('<i2'))
+
+
+def test_fm_gain():
+    assert fm_gain(75e3, 150e3) == 0.5
@@ -0,0 +1,105 @@
+import os
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from RSA306.cache import IQCache, decimated_iq, iter_segments
+from RSA306.conversion import PPResample, PassbandToBaseband_IH
+from RSA306.detection import iter_active_blocks
+from RSA306.filtercache import default_cache
+from RSA306.reader import get_reader
+
+from conftest import R3A_PATH
+
+FH = 28e6
+ARGS = dict(fh=FH, Fs_out=1.12e6, fp=300e3, fs=500e3)
+
+
+def _expected(x, Fs, fh, Fs_out, fp, fs, atten=60, start=0):
+    """ Обработка всего сигнала одним отрезком, дополненным нулями """
+    r = Fraction(Fs_out) / Fraction(Fs)
+    b = default_cache().fir_coefs(fp, fs, atten, Fs=Fs)
+    chunk_size = -(-len(x) // r.denominator) * r.denominator
+    decimator = PPResample(r, b, chunk_size, int(chunk_size * r), dtype=np.complex64)
+    bconv = PassbandToBaseband_IH(chunk_size, Fs, fh, np.complex64, decimator=decimator)
+    bconv.nco.acc = bconv.nco.ftw * start % 2**bconv.nco.bits
+    padded = np.zeros(chunk_size, dtype=x.dtype)
+    padded[:len(x)] = x
+    return bconv(padded)[:-(-len(x) * r.numerator // r.denominator)].copy()
+
+
+@pytest.fixture(scope='module')
+def reader():
+    return get_reader(R3A_PATH)
+
+
+def test_direct_keeps_tail(reader):
+    Fs = float(reader.data_format.sample_rate)
+    iq, _ = decimated_iq(reader, **ARGS)
+    assert len(iq) == -(-reader.n_samples // 100)
+    expected = _expected(reader.read_range(0, reader.n_samples), Fs, **ARGS)
+    assert np.allclose(iq, expected, rtol=0, atol=1e-3 * np.abs(expected).max())
+
+
+def test_derived_matches_length_and_uses_cache(reader, tmp_path):
+    cache = IQCache(str(tmp_path))
+    fine, _ = decimated_iq(reader, cache=cache, **ARGS)
+    coarse, meta = decimated_iq(reader, cache=cache, fh=FH, Fs_out=112e3, fp=30e3, fs=50e3)
+    assert meta['source'] is not None
+    assert len(coarse) == -(-len(fine) // 10)
+    expected = _expected(np.asarray(fine), 1.12e6, 0.0, 112e3, 30e3, 50e3)
+    assert np.allclose(coarse, expected, rtol=0, atol=1e-3 * np.abs(expected).max())
+
+
+def test_derived_stored_apart_from_direct(reader, tmp_path):
+    coarse_args = dict(fh=FH, Fs_out=112e3, fp=30e3, fs=50e3)
+    direct, _ = decimated_iq(reader, **coarse_args)
+    cache = IQCache(str(tmp_path))
+    decimated_iq(reader, cache=cache, **ARGS)
+    derived, meta = decimated_iq(reader, cache=cache, **coarse_args)
+    assert meta['source'] is not None and not np.array_equal(derived, direct)
+    # Без источника вычисляется и сохраняется прямой результат, производный остается под своим ключом
+    for key, entry in cache.entries():
+        if entry['Fs_out'] == ARGS['Fs_out']:
+            for path in cache._paths(key):
+                os.remove(path)
+    iq, meta = decimated_iq(reader, cache=cache, **coarse_args)
+    assert meta['source'] is None and np.array_equal(iq, direct)
+    assert len(cache.entries()) == 2
+    # При наличии прямого результата источник не используется
+    decimated_iq(reader, cache=cache, **ARGS)
+    iq, meta = decimated_iq(reader, cache=cache, **coarse_args)
+    assert meta['source'] is None and np.array_equal(iq, direct)
+
+
+def test_iter_active_blocks_sized_to_intervals(reader):
+    intervals = np.array([[100, 1100], [5000, 5250]])
+    blocks = [(start, block.copy()) for start, block in iter_active_blocks(reader, intervals, 400, True)]
+    assert [(start, len(block)) for start, block in blocks] == [(100, 400), (500, 400), (900, 200), (5000, 250)]
+    for start, block in blocks:
+        assert np.array_equal(block, reader.read_range(start, start + len(block)))
+
+
+def test_intervals_give_positioned_segments(reader):
+    Fs = float(reader.data_format.sample_rate)
+    intervals = np.array([[1000, 51000], [300000, 300777], [reader.n_samples - 5000, reader.n_samples + 100]])
+    iq, meta = decimated_iq(reader, intervals=intervals, **ARGS)
+    segments = list(iter_segments(iq, meta))
+    assert [start for start, _ in segments] == [1000, 300000, reader.n_samples - 5000]
+    assert [len(x) for _, x in segments] == [500, 8, 50]
+    assert sum(len(x) for _, x in segments) == len(iq)
+    for (start, x), (_, stop) in zip(segments, np.minimum(intervals, reader.n_samples)):
+        expected = _expected(reader.read_range(start, stop), Fs, start=start, **ARGS)
+        assert np.allclose(x, expected, rtol=0, atol=1e-3 * np.abs(expected).max())
+
+
+def test_derived_from_short_source(reader, tmp_path):
+    cache = IQCache(str(tmp_path))
+    intervals = np.array([[0, 1234], [10000, 12000]])
+    fine, _ = decimated_iq(reader, cache=cache, intervals=intervals, **ARGS)
+    coarse, meta = decimated_iq(reader, cache=cache, intervals=intervals, fh=FH, Fs_out=112e3, fp=30e3, fs=50e3)
+    assert meta['source'] is not None
+    assert len(fine) == 13 + 20
+    assert meta['segments'] == [[0, 0, 2], [10000, 2, 2]]
+    assert len(coarse) == 4
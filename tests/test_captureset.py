@@ -0,0 +1,91 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from RSA306.captureset import CaptureSet
+from RSA306.rc import BYTES_PER_SAMPLE, HEADER_DATA_LENGTH, SAMPLES_PER_BLOCK
+from RSA306.reader import get_reader
+from RSA306.types import R3F_FRAME_DTYPE
+
+from conftest import R3A_PATH, R3F_PATH, R3H_PATH
+
+SPLITS = [0, 37, 38, 100, 160]
+
+
+def _split_r3f(tmp_path, splits, removed=()):
+    with open(R3F_PATH, 'rb') as source:
+        header = source.read(HEADER_DATA_LENGTH)
+        frames = np.frombuffer(source.read(), dtype=R3F_FRAME_DTYPE)
+    paths = []
+    for k, (lo, hi) in enumerate(zip(splits[:-1], splits[1:])):
+        path = tmp_path / ('part-%d.r3f' % k)
+        part = frames[[i for i in range(lo, hi) if i not in removed]]
+        path.write_bytes(header + part.tobytes())
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture(scope='module')
+def original():
+    reader = get_reader(R3F_PATH)
+    return reader, reader.read_range(0, reader.n_samples)
+
+
+@pytest.mark.parametrize('block_size', [SAMPLES_PER_BLOCK, 5000, 3 * SAMPLES_PER_BLOCK + 11])
+def test_readblock_spans_files(tmp_path, original, block_size):
+    reader, samples = original
+    capture = CaptureSet(_split_r3f(tmp_path, SPLITS))
+    assert len(capture) == len(samples)
+    assert list(capture.offsets) == [s * SAMPLES_PER_BLOCK for s in SPLITS]
+    blocks = [block.copy() for block in capture.readblock(block_size, True)]
+    assert all(len(block) == block_size for block in blocks[:-1])
+    assert np.array_equal(np.concatenate(blocks), samples)
+    full = [block.copy() for block in capture.readblock(block_size, False)]
+    assert len(full) == len(samples) // block_size
+    assert np.array_equal(np.concatenate(full), samples[:len(full) * block_size])
+
+
+def test_read_range_across_boundaries(tmp_path, original):
+    _, samples = original
+    capture = CaptureSet(_split_r3f(tmp_path, SPLITS))
+    for start, stop in [(0, 10), (37 * SAMPLES_PER_BLOCK - 5, 38 * SAMPLES_PER_BLOCK + 5),
+                        (10, len(samples) - 10), (len(samples) - 3, len(samples) + 100)]:
+        assert np.array_equal(capture.read_range(start, stop), samples[start:stop])
+    assert np.array_equal(capture.read(), samples)
+
+
+def test_footers_and_time_model(tmp_path, original):
+    reader, _ = original
+    _split_r3f(tmp_path, SPLITS)
+    # Шаблон glob: файлы упорядочиваются по имени
+    capture = CaptureSet(str(tmp_path / 'part-*.r3f'))
+    assert capture.boundary_gaps == []
+    assert np.array_equal(capture.footers(), reader.footers())
+    starts = np.arange(reader.n_frames) * SAMPLES_PER_BLOCK
+    assert np.array_equal(capture.time_model().sample_to_tick(starts), reader.time_model().sample_to_tick(starts))
+
+
+def test_boundary_gap_detected(tmp_path):
+    paths = _split_r3f(tmp_path, SPLITS, removed=(100, 101))
+    capture = CaptureSet(paths)
+    assert [(gap.file_index, gap.missing_frames) for gap in capture.boundary_gaps] == [(3, 2)]
+    with pytest.raises(ValueError):
+        CaptureSet(paths, strict=True)
+
+
+def test_r3a_set(tmp_path):
+    samples = get_reader(R3A_PATH).read_range(0, 300000)
+    paths = []
+    for k, (lo, hi) in enumerate([(0, 100001), (100001, 100001), (100001, 300000)]):
+        shutil.copy(R3H_PATH, tmp_path / ('part-%d.r3h' % k))
+        (tmp_path / ('part-%d.r3a' % k)).write_bytes(samples[lo:hi].tobytes())
+        paths.append(str(tmp_path / ('part-%d.r3a' % k)))
+    capture = CaptureSet(paths)
+    assert len(capture) * BYTES_PER_SAMPLE == samples.nbytes
+    assert np.array_equal(np.concatenate([b.copy() for b in capture.readblock(65536)]), samples)
+
+
+def test_mixed_formats_rejected():
+    with pytest.raises(ValueError):
+        CaptureSet([R3F_PATH, R3A_PATH])
@@ -0,0 +1,90 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from RSA306.checkpoint import load_checkpoint, run_checkpointed
+from RSA306.conversion import PPResample, PassbandToBaseband_IH
+from RSA306.filtercache import default_cache
+from RSA306.reader import get_reader
+
+from conftest import R3A_PATH
+
+BLOCK_SIZE = 100 * 1000
+
+
+def _stages(Fs):
+    r = Fraction(1, 100)
+    b = default_cache().fir_coefs(300e3, 500e3, 60, Fs=Fs)
+    decimator = PPResample(r, b, BLOCK_SIZE, int(BLOCK_SIZE * r), dtype=np.complex64)
+    return [PassbandToBaseband_IH(BLOCK_SIZE, Fs, 28.7e6, np.complex64, decimator=decimator)]
+
+
+@pytest.fixture(scope='module')
+def reader():
+    return get_reader(R3A_PATH)
+
+
+@pytest.fixture(scope='module')
+def reference(reader, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('ref') / 'ref.iq')
+    result = run_checkpointed(reader, _stages(float(reader.data_format.sample_rate)), BLOCK_SIZE, path,
+                              checkpoint_every=0)
+    assert result['done'] and result['resumed_from'] is None
+    with open(path, 'rb') as ref_file:
+        return ref_file.read()
+
+
+def test_reference_length(reader, reference):
+    n_blocks = reader.n_samples // BLOCK_SIZE
+    assert len(reference) == n_blocks * BLOCK_SIZE // 100 * np.dtype(np.complex64).itemsize
+
+
+@pytest.mark.parametrize('max_blocks', [1, 3, 5])
+def test_resume_bit_identical(reader, reference, tmp_path, max_blocks):
+    path = str(tmp_path / 'out.iq')
+    Fs = float(reader.data_format.sample_rate)
+    runs = 0
+    while True:
+        # Каждый запуск -- новые этапы, как после перезапуска процесса
+        result = run_checkpointed(reader, _stages(Fs), BLOCK_SIZE, path, checkpoint_every=0,
+                                  max_blocks=max_blocks)
+        if runs:
+            assert result['resumed_from'] == runs * max_blocks * BLOCK_SIZE
+        runs += 1
+        if result['done']:
+            break
+    assert runs > 1
+    with open(path, 'rb') as out_file:
+        assert out_file.read() == reference
+
+
+def test_resume_after_torn_output(reader, reference, tmp_path):
+    """ Данные, записанные после последней контрольной точки, отбрасываются """
+    path = str(tmp_path / 'out.iq')
+    Fs = float(reader.data_format.sample_rate)
+    run_checkpointed(reader, _stages(Fs), BLOCK_SIZE, path, checkpoint_every=0, max_blocks=2)
+    with open(path, 'ab') as out_file:
+        out_file.write(b'\xff' * 1000)
+    result = run_checkpointed(reader, _stages(Fs), BLOCK_SIZE, path, checkpoint_every=0)
+    assert result['resumed_from'] == 2 * BLOCK_SIZE and result['done']
+    with open(path, 'rb') as out_file:
+        assert out_file.read() == reference
+
+
+def test_done_checkpoint_is_noop(reader, reference, tmp_path):
+    path = str(tmp_path / 'out.iq')
+    Fs = float(reader.data_format.sample_rate)
+    run_checkpointed(reader, _stages(Fs), BLOCK_SIZE, path, checkpoint_every=0)
+    result = run_checkpointed(reader, _stages(Fs), BLOCK_SIZE, path, checkpoint_every=0)
+    assert result['blocks'] == 0 and result['done']
+    _, meta = load_checkpoint(path + '.ckpt.npz')
+    assert meta['output_bytes'] == len(reference)
+
+
+def test_mismatched_job_rejected(reader, tmp_path):
+    path = str(tmp_path / 'out.iq')
+    Fs = float(reader.data_format.sample_rate)
+    run_checkpointed(reader, _stages(Fs), BLOCK_SIZE, path, checkpoint_every=0, max_blocks=1)
+    with pytest.raises(ValueError):
+        run_checkpointed(reader, _stages(Fs), BLOCK_SIZE // 2, path, checkpoint_every=0)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from RSA306.compressed import CompressedReader, compress_capture, decode_chunk, encode_chunk
+from RSA306.integrity import FrameIntegrityChecker
+from RSA306.rc import SAMPLES_PER_BLOCK
+from RSA306.reader import get_reader
+
+from conftest import R3A_PATH, R3F_PATH
+
+
+@pytest.fixture(scope='module')
+def r3z(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('r3z')
+    return (compress_capture(R3F_PATH, str(directory / 'f.r3z'), chunk_samples=100000, codec='zlib'),
+            compress_capture(R3A_PATH, str(directory / 'a.r3z'), chunk_samples=100000, codec='zlib'))
+
+
+@pytest.mark.parametrize('values', [np.arange(-5000, 5000, 3, dtype=np.int16) << 4,
+                                    np.array([-32768, 32767, 0, -1, 1], dtype=np.int16),
+                                    np.zeros(7, dtype=np.int16)])
+def test_chunk_roundtrip(values):
+    data, shift, delta = encode_chunk(values, 'zlib')
+    assert np.array_equal(decode_chunk(data, len(values), shift, delta, 'zlib'), values)
+
+
+def test_lossless_roundtrip(r3z):
+    for source, container in zip((R3F_PATH, R3A_PATH), r3z):
+        original, compressed = get_reader(source), get_reader(container)
+        assert isinstance(compressed, CompressedReader)
+        assert compressed.header_data == original.header_data
+        assert compressed.n_samples == original.n_samples
+        assert np.array_equal(compressed.read(), original.read_range(0, original.n_samples))
+        assert np.array_equal(compressed.read_range(99990, 250017), original.read_range(99990, 250017))
+    original = get_reader(R3F_PATH)
+    assert np.array_equal(get_reader(r3z[0]).footers(), original.footers())
+
+
+def test_readblock_metadata_and_checker_match_reader(r3z):
+    original, compressed = get_reader(R3F_PATH), get_reader(r3z[0])
+    start = 3 * SAMPLES_PER_BLOCK
+    def frames(reader):
+        # Reader.readblock переиспользует буфер, поэтому фреймы копируются сразу
+        return [(samples.tobytes(), footer.tobytes())
+                for batch in reader.readblock(2 * SAMPLES_PER_BLOCK, True, read_metadata=True, start=start)
+                for samples, footer in batch]
+
+    expected = frames(original)
+    assert len(expected) == original.n_frames - 3
+    assert frames(compressed) == expected
+
+    checkers = FrameIntegrityChecker(fill=True), FrameIntegrityChecker(fill=True)
+    blocks = [np.concatenate([block.copy() for block in reader.readblock(30000, checker=checker, start=start + 5)])
+              for reader, checker in zip((original, compressed), checkers)]
+    assert np.array_equal(blocks[0], blocks[1])
+    assert checkers[0].gaps == checkers[1].gaps
+
+
+def test_triggers_and_unsupported_features(r3z):
+    original, compressed, raw = get_reader(R3F_PATH), get_reader(r3z[0]), get_reader(r3z[1])
+    assert np.array_equal(compressed.triggers().sample_index, original.triggers().sample_index)
+    assert not compressed.supports_memmap and not hasattr(compressed, 'memmap')
+    assert original.supports_memmap and raw.supports_memmap is False
+    with pytest.raises(ValueError):
+        raw.triggers()
+    with pytest.raises(ValueError):
+        next(raw.readblock(SAMPLES_PER_BLOCK, read_metadata=True))
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from RSA306.envelope import Envelope, build_envelope
+from RSA306.reader import get_reader
+
+from conftest import R3A_PATH, R3F_PATH
+
+
+@pytest.fixture(scope='module', params=[R3A_PATH, R3F_PATH], ids=['r3a', 'r3f'])
+def built(request, tmp_path_factory):
+    reader = get_reader(request.param)
+    path = str(tmp_path_factory.mktemp('env') / 'capture.env')
+    # base не делит длину записи, points_per_read -- не степень двойки
+    build_envelope(reader, path, base=100, points_per_read=1000)
+    return reader, Envelope(path), reader.read_range(0, reader.n_samples)
+
+
+def test_levels_cover_capture(built):
+    reader, env, samples = built
+    assert env.header['n_samples'] == len(samples) == reader.n_samples
+    assert env.level_rows(0) == -(-len(samples) // 100)
+    for level in range(1, env.n_levels):
+        assert env.level_rows(level) == -(-env.level_rows(level - 1) // 2)
+    assert env.level_rows(env.n_levels - 1) == 1
+
+
+def test_min_max_per_level(built):
+    _, env, samples = built
+    n = len(samples)
+    for level in range(env.n_levels):
+        size = 100 * 2**level
+        rows = env.level_rows(level)
+        padded = np.empty(rows * size, dtype=samples.dtype)
+        padded[:n] = samples
+        # Дополнение последним отсчетом не меняет min/max неполной точки
+        padded[n:] = samples[-1]
+        blocks = padded.reshape(rows, size)
+        points = np.asarray(env._levels[level])
+        assert np.array_equal(points['min'], blocks.min(axis=1)), level
+        assert np.array_equal(points['max'], blocks.max(axis=1)), level
+
+
+def test_ms_of_full_points(built):
+    _, env, samples = built
+    for level in range(3):
+        size = 100 * 2**level
+        n_full = len(samples) // size
+        x = samples[:n_full * size].astype(np.float64).reshape(n_full, size)
+        ms = np.asarray(env._levels[level])['ms'][:n_full]
+        assert np.allclose(ms, (x**2).mean(axis=1), rtol=1e-5)
+
+
+def test_query_selects_level(built):
+    reader, env, samples = built
+    scale = np.float32(reader.channel_correction.adc_scale)
+    duration = len(samples) / env.sample_rate
+    times, v_min, v_max, v_rms = env.query(0, duration, max_points=500)
+    assert 0 < len(times) <= 500
+    level = [env.level_rows(k) for k in range(env.n_levels)].index(len(times))
+    # Выбран самый подробный уровень, укладывающийся в max_points
+    assert len(samples) / (100 * 2**(level - 1)) > 500
+    assert times[1] - times[0] == pytest.approx(100 * 2**level / env.sample_rate)
+    assert np.isclose(v_min.min(), samples.min() * scale)
+    assert np.isclose(v_max.max(), samples.max() * scale)
+    assert np.all(v_min <= v_max) and np.all(v_rms >= 0)
+
+
+def test_query_raw_samples(built):
+    reader, env, samples = built
+    t0 = 1000 / env.sample_rate
+    times, v_min, v_max, _ = env.query(t0, t0 + 300 / env.sample_rate, max_points=400, reader=reader)
+    expected = samples[1000:1300].astype(np.float32) * np.float32(reader.channel_correction.adc_scale)
+    assert np.array_equal(v_min, expected) and np.array_equal(v_max, expected)
+    assert len(times) == 300
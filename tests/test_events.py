@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from RSA306.events import extract_windows, find_triggers
+from RSA306.rc import FRAME_STATUS_TRIGGER1, FRAME_STATUS_TRIGGER2, HEADER_DATA_LENGTH, SAMPLES_PER_BLOCK
+from RSA306.reader import get_reader
+from RSA306.types import R3F_FRAME_DTYPE
+
+from conftest import R3F_PATH
+
+# (номер фрейма, вход запуска, смещение в фрейме)
+TRIGGERS = [(0, 1, 5), (3, 2, 8000), (3, 1, 100), (40, 2, 0), (159, 1, SAMPLES_PER_BLOCK - 1)]
+FIELDS = {1: ('trigger1_idx', FRAME_STATUS_TRIGGER1), 2: ('trigger2_idx', FRAME_STATUS_TRIGGER2)}
+
+
+@pytest.fixture
+def triggered(tmp_path):
+    """ Копия записи с событиями запуска TRIGGERS в футерах """
+    with open(R3F_PATH, 'rb') as source:
+        header = source.read(HEADER_DATA_LENGTH)
+        frames = np.frombuffer(source.read(), dtype=R3F_FRAME_DTYPE).copy()
+    footers = frames['footer']
+    for frame, source, offset in TRIGGERS:
+        field, status_bit = FIELDS[source]
+        footers['frame_status'][frame] |= status_bit
+        footers[field][frame] = offset
+    path = tmp_path / 'triggered.r3f'
+    path.write_bytes(header + frames.tobytes())
+    return str(path), frames
+
+
+def _expected():
+    events = sorted((frame * SAMPLES_PER_BLOCK + offset, source, frame) for frame, source, offset in TRIGGERS)
+    return np.array(events, dtype=np.int64).T
+
+
+def test_find_triggers_sorted_by_sample(triggered):
+    _, frames = triggered
+    events = find_triggers(frames['footer'], ticks_per_sample=2)
+    sample_index, source, frame_index = _expected()
+    assert np.array_equal(events.sample_index, sample_index)
+    assert np.array_equal(events.source, source)
+    assert np.array_equal(events.frame_index, frame_index)
+    offsets = sample_index - frame_index * SAMPLES_PER_BLOCK
+    assert np.array_equal(events.timestamp, frames['footer']['timestamp'][frame_index] + 2 * offsets.astype(np.uint64))
+
+
+def test_find_triggers_single_source(triggered):
+    _, frames = triggered
+    events = find_triggers(frames['footer'], sources=(2,))
+    assert list(events.sample_index) == [3 * SAMPLES_PER_BLOCK + 8000, 40 * SAMPLES_PER_BLOCK]
+    assert set(events.source) == {2}
+
+
+def test_reader_triggers_and_windows(triggered):
+    path, frames = triggered
+    reader = get_reader(path)
+    events = reader.triggers()
+    assert np.array_equal(events.sample_index, _expected()[0])
+    windows = reader.trigger_windows(10, 20, events)
+    flat = frames['samples'].reshape(-1)
+    assert windows.shape == (len(TRIGGERS), 30)
+    for window, position in zip(windows, events.sample_index):
+        lo, hi = max(position - 10, 0), min(position + 20, len(flat))
+        expected = np.zeros(30, dtype=np.int16)
+        expected[lo - position + 10:hi - position + 10] = flat[lo:hi]
+        assert np.array_equal(window, expected)
+
+
+def test_capture_without_triggers():
+    events = get_reader(R3F_PATH).triggers()
+    assert len(events.sample_index) == len(events.source) == 0
+
+
+def test_extract_windows_flat_and_framed():
+    samples = np.arange(1000, dtype=np.int16).reshape(10, 100)
+    positions = [0, 150, 998]
+    flat = extract_windows(samples.reshape(-1), positions, 3, 4, fill_value=-1)
+    framed = extract_windows(samples, positions, 3, 4, fill_value=-1)
+    assert np.array_equal(flat, framed)
+    assert list(flat[0]) == [-1, -1, -1, 0, 1, 2, 3]
+    assert list(flat[1]) == list(range(147, 154))
+    assert list(flat[2]) == [995, 996, 997, 998, 999, -1, -1]
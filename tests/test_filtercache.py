@@ -0,0 +1,92 @@
+import os
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from RSA306.conversion import PPResample, fir_coefs
+from RSA306.filtercache import FilterCache
+
+ARGS = dict(fp=300e3, fs=500e3, r=60, Fs=112e6)
+
+
+def test_taps_match_direct_synthesis():
+    cache = FilterCache()
+    b = cache.fir_coefs(**ARGS)
+    assert np.array_equal(b, fir_coefs(300e3, 500e3, 60, Fs=112e6))
+    assert not b.flags.writeable
+    assert cache.fir_coefs(**ARGS) is b
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.fir_coefs(300e3, 500e3, 60, Fs=112e6, oddL=True) is not b
+    assert cache.misses == 2
+
+
+def test_disk_cache_shared_between_instances(tmp_path):
+    first = FilterCache(directory=str(tmp_path))
+    b = first.fir_coefs(**ARGS)
+    bank = first.polyphase_bank(b, Fraction(1, 100), np.complex64)
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.npy')]) == 2
+
+    second = FilterCache(directory=str(tmp_path))
+    assert np.array_equal(second.fir_coefs(**ARGS), b)
+    assert np.array_equal(second.polyphase_bank(b, Fraction(1, 100), np.complex64), bank)
+    assert (second.hits, second.misses) == (2, 0)
+
+
+def test_bank_keyed_on_taps_ratio_and_dtype():
+    cache = FilterCache()
+    b = cache.fir_coefs(**ARGS)
+    bank = cache.polyphase_bank(b, Fraction(1, 100), np.complex64)
+    assert bank.shape == (100, -(-b.size // 100)) and bank.dtype == np.complex64
+    assert cache.polyphase_bank(b.copy(), Fraction(1, 100), np.complex64) is bank
+    assert cache.polyphase_bank(b, Fraction(1, 50), np.complex64) is not bank
+    assert cache.polyphase_bank(b, Fraction(1, 100), np.complex128) is not bank
+    assert cache.polyphase_bank(b * 2, Fraction(1, 100), np.complex64) is not bank
+
+
+def test_cached_resampler_matches_direct():
+    cache = FilterCache()
+    ratio = Fraction(1, 100)
+    resampler = cache.resampler(ratio, chunk_size_in=10000, chunk_size_out=100, dtype=np.complex64, **ARGS)
+    direct = PPResample(ratio, fir_coefs(300e3, 500e3, 60, Fs=112e6), 10000, 100, dtype=np.complex64)
+    rng = np.random.default_rng(0)
+    for _ in range(3):
+        x = (rng.standard_normal(10000) + 1j * rng.standard_normal(10000)).astype(np.complex64)
+        assert np.array_equal(resampler(x), direct(x))
+    # Банк только для чтения и общий для всех передискретизаторов с теми же параметрами
+    other = cache.resampler(ratio, chunk_size_in=20000, chunk_size_out=200, dtype=np.complex64, **ARGS)
+    assert other.bpartial is resampler.bpartial
+
+
+def test_bank_shape_checked():
+    b = np.ones(10)
+    with pytest.raises(ValueError):
+        PPResample(Fraction(1, 4), b, 8, 2, bpartial=np.zeros((3, 3)))
+
+
+def test_memory_eviction():
+    cache = FilterCache(max_bytes=1)
+    first = cache.fir_coefs(**ARGS)
+    cache.fir_coefs(200e3, 400e3, 60, Fs=112e6)
+    assert cache.fir_coefs(**ARGS) is not first
+    assert cache.misses == 3
+
+
+def test_disk_eviction_keeps_newest(tmp_path):
+    cache = FilterCache(directory=str(tmp_path), max_disk_bytes=1)
+    cache.fir_coefs(**ARGS)
+    b = cache.fir_coefs(200e3, 400e3, 60, Fs=112e6)
+    files = [name for name in os.listdir(tmp_path) if name.endswith('.npy')]
+    assert len(files) == 1
+    assert np.array_equal(np.load(os.path.join(tmp_path, files[0])), b)
+
+
+def test_corrupt_file_rebuilt(tmp_path):
+    cache = FilterCache(directory=str(tmp_path))
+    b = np.array(cache.fir_coefs(**ARGS))
+    name, = os.listdir(tmp_path)
+    (tmp_path / name).write_bytes(b'broken')
+    fresh = FilterCache(directory=str(tmp_path))
+    assert np.array_equal(fresh.fir_coefs(**ARGS), b)
+    assert fresh.misses == 1
+    assert np.array_equal(np.load(os.path.join(tmp_path, name)), b)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from scipy.signal import lfilter
+
+from RSA306.conversion import FixedPointFrontEnd
+
+FS = 112e6
+
+
+def _reference(x, fh, R, N):
+    """ Перенос спектра в float64 и каскад N фильтров скользящего среднего длины R """
+    n = np.arange(len(x))
+    v = x * np.exp(2j * np.pi * fh / FS * n)
+    for _ in range(N):
+        v = lfilter(np.ones(R) / R, 1, v)
+    return v[R - 1::R]
+
+
+@pytest.mark.parametrize('fh', [FS / 4, 3 * FS / 4, FS / 2, 28.7e6])
+def test_matches_float_reference_across_chunks(fh):
+    R, N, chunk_size = 8, 3, 8 * 1023
+    rng = np.random.default_rng(1)
+    x = (rng.standard_normal(5 * chunk_size) * 3000).astype(np.int16)
+    front = FixedPointFrontEnd(chunk_size, FS, fh, R, N)
+    y = np.concatenate([front(x[k:k + chunk_size]).copy() for k in range(0, len(x), chunk_size)])
+    expected = _reference(x.astype(np.float64), fh, R, N)
+    tolerance = 1e-3 if front.lo_shift == 0 else 0.05
+    assert np.max(np.abs(y - expected)) < tolerance * np.max(np.abs(expected))
+
+
+def test_fs4_path_is_exact_integer_mixing():
+    R, N, chunk_size = 4, 2, 4 * 1001
+    x = np.arange(-3 * chunk_size, 3 * chunk_size, 2, dtype=np.int16)
+    front = FixedPointFrontEnd(chunk_size, FS, FS / 4, R, N)
+    assert front.lo_shift == 0
+    y = np.concatenate([front(x[k:k + chunk_size]).copy() for k in range(0, len(x), chunk_size)])
+    lo = np.array([1, 1j, -1, -1j])[np.arange(len(x)) % 4]
+    v = x.astype(np.int64) * lo
+    for _ in range(N):
+        v = np.convolve(v, np.ones(R))[:len(x)]
+    expected = v[R - 1::R] / R**N
+    assert np.array_equal(y, expected.astype(np.complex64))
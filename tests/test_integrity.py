@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from RSA306.integrity import FrameIntegrityChecker, span_mask
+from RSA306.rc import FRAME_STATUS_ERROR_MASK, HEADER_DATA_LENGTH, SAMPLES_PER_BLOCK
+from RSA306.reader import get_reader
+from RSA306.types import R3F_FRAME_DTYPE
+
+from conftest import R3F_PATH
+
+REMOVED = [10, 11, 12, 50]
+JUMP_AFTER = 100
+JUMP = 5000
+
+
+@pytest.fixture
+def damaged(tmp_path):
+    """ Копия записи без фреймов REMOVED и со скачком frame_id на JUMP после фрейма JUMP_AFTER """
+    with open(R3F_PATH, 'rb') as source:
+        header = source.read(HEADER_DATA_LENGTH)
+        frames = np.frombuffer(source.read(), dtype=R3F_FRAME_DTYPE).copy()
+    frames['footer']['frame_status'] &= ~np.uint16(FRAME_STATUS_ERROR_MASK)
+    frames['footer']['frame_id'][JUMP_AFTER:] += JUMP
+    frames['footer']['timestamp'][JUMP_AFTER:] += JUMP * SAMPLES_PER_BLOCK
+    kept = np.delete(frames, REMOVED)
+    path = tmp_path / 'damaged.r3f'
+    path.write_bytes(header + kept.tobytes())
+    return str(path), frames, kept
+
+
+def _read(path, checker, start=0):
+    return np.concatenate([block.copy() for block in get_reader(path).readblock(3 * SAMPLES_PER_BLOCK, True,
+                                                                                   checker=checker, start=start)])
+
+
+def test_filled_spans_are_in_output_coordinates(damaged):
+    path, frames, _ = damaged
+    checker = FrameIntegrityChecker(fill=True)
+    out = _read(path, checker)
+    assert [gap.missing_frames for gap in checker.gaps] == [3, 1, JUMP]
+    spans = checker.dropped_spans
+    assert spans[0] == (10 * SAMPLES_PER_BLOCK, 13 * SAMPLES_PER_BLOCK)
+    assert spans[1] == (50 * SAMPLES_PER_BLOCK, 51 * SAMPLES_PER_BLOCK)
+    assert spans[2] == (JUMP_AFTER * SAMPLES_PER_BLOCK,) * 2
+    assert len(out) == frames['samples'].size
+    mask = span_mask(spans, 0, len(out))
+    assert not out[mask].any()
+    assert np.array_equal(out[~mask], np.delete(frames, REMOVED)['samples'].reshape(-1))
+    assert np.array_equal(out, np.where(mask, 0, frames['samples'].reshape(-1)))
+
+
+def test_unfilled_spans_are_file_positions(damaged):
+    path, _, kept = damaged
+    checker = FrameIntegrityChecker(fill=False)
+    out = _read(path, checker)
+    assert np.array_equal(out, kept['samples'].reshape(-1))
+    assert checker.dropped_spans == [(10 * SAMPLES_PER_BLOCK,) * 2, (47 * SAMPLES_PER_BLOCK,) * 2,
+                                     (96 * SAMPLES_PER_BLOCK,) * 2]
+
+
+def test_frame_index_counts_from_file_start(damaged):
+    path, _, _ = damaged
+    checker = FrameIntegrityChecker(fill=False)
+    _read(path, checker, start=40 * SAMPLES_PER_BLOCK)
+    assert [gap.frame_index for gap in checker.gaps] == [47, 96]
@@ -0,0 +1,107 @@
+import os
+import threading
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from RSA306.conversion import PPResample, PassbandToBaseband_IH
+from RSA306.iqserver import SliceEngine, fetch_iq, make_server
+
+from conftest import DATA, R3A_PATH
+
+CAPTURE = os.path.basename(R3A_PATH)
+CENTER = 2401.3e6
+BANDWIDTH = 1e6
+
+
+def _engine():
+    return SliceEngine(DATA, chunk_target=2**16)
+
+
+@pytest.fixture(scope='module')
+def reference():
+    """ Огибающая всей записи при непрерывной обработке с начала """
+    engine = _engine()
+    s = engine.stream(CAPTURE, CENTER, BANDWIDTH)
+    chunk_out = s.chunk_size // s.decimation
+    decimator = PPResample(Fraction(1, s.decimation), s.b, s.chunk_size, chunk_out, dtype=np.complex64)
+    bconv = PassbandToBaseband_IH(s.chunk_size, s.Fs, s.fh, np.complex64, decimator=decimator)
+    x = s.reader.read_range(0, s.reader.n_samples)
+    x = np.concatenate([x, np.zeros(s.n_chunks * s.chunk_size - len(x), dtype=x.dtype)])
+    y = np.concatenate([bconv(x[k:k + s.chunk_size]).copy() for k in range(0, len(x), s.chunk_size)])
+    assert s.n_chunks > 10 and s.warmup_chunks >= 1
+    return y[:s.n_out], s.Fs, s.decimation
+
+
+def _window(reference, t_start, t_stop):
+    y, Fs, D = reference
+    j0 = -(-int(np.ceil(t_start * Fs)) // D)
+    j1 = -(-int(np.ceil(t_stop * Fs)) // D)
+    return y[j0:j1]
+
+
+WINDOWS = [(0.006, 0.007), (0.0001, 0.0003), (0.009, 0.0117), (0.0, 0.001), (0.0065, 0.0066)]
+
+
+def test_slices_bit_identical_in_any_order(reference):
+    engine = _engine()
+    for t_start, t_stop in WINDOWS:
+        iq, meta = engine.slice(CAPTURE, t_start, t_stop, CENTER, BANDWIDTH)
+        expected = _window(reference, t_start, t_stop)
+        assert meta['count'] == len(iq) == len(expected)
+        assert np.array_equal(iq, expected), (t_start, t_stop)
+
+
+def test_repeated_and_concurrent_requests_computed_once(reference):
+    engine = _engine()
+    results = [None] * 8
+
+    def request(i):
+        results[i] = engine.slice(CAPTURE, 0.002, 0.004, CENTER, BANDWIDTH)[0]
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    expected = _window(reference, 0.002, 0.004)
+    assert all(np.array_equal(iq, expected) for iq in results)
+    s = engine.stream(CAPTURE, CENTER, BANDWIDTH)
+    chunk_out = s.chunk_size // s.decimation
+    j0, j1 = len(_window(reference, 0, 0.002)), len(_window(reference, 0, 0.004))
+    computed = engine.stats['computed']
+    assert computed == -(-j1 // chunk_out) - j0 // chunk_out
+    engine.slice(CAPTURE, 0.002, 0.004, CENTER, BANDWIDTH)
+    assert engine.stats['computed'] == computed and engine.stats['hits'] >= computed
+
+
+def test_invalid_requests():
+    engine = _engine()
+    with pytest.raises(ValueError):
+        engine.slice('../' + CAPTURE, 0, 0.001, CENTER, BANDWIDTH)
+    with pytest.raises(FileNotFoundError):
+        engine.slice('missing.r3a', 0, 0.001, CENTER, BANDWIDTH)
+    with pytest.raises(ValueError):
+        engine.slice(CAPTURE, 0, 0.001, 2430e6, BANDWIDTH)
+
+
+@pytest.mark.parametrize('transport', ['tcp', 'unix'])
+def test_server_roundtrip(reference, tmp_path, transport):
+    address = ('127.0.0.1', 0) if transport == 'tcp' else str(tmp_path / 'iq.sock')
+    server = make_server(_engine(), address)
+    if transport == 'tcp':
+        address = server.server_address
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        iq, meta = fetch_iq(address, CAPTURE, 0.003, 0.005, CENTER, BANDWIDTH, timeout=30)
+        assert np.array_equal(iq, _window(reference, 0.003, 0.005))
+        assert meta['count'] == len(iq) and meta['decimation'] == reference[2]
+        with pytest.raises(RuntimeError, match='404'):
+            fetch_iq(address, 'missing.r3a', 0, 0.001, CENTER, BANDWIDTH, timeout=30)
+        with pytest.raises(RuntimeError, match='400'):
+            fetch_iq(address, CAPTURE, 0, 0.001, 2430e6, BANDWIDTH, timeout=30)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,81 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+from scipy.signal import upfirdn
+
+from RSA306 import kernels
+from RSA306.conversion import PPResample
+
+requires_numba = pytest.mark.skipif('numba' not in kernels.available_backends(), reason='numba не установлена')
+
+
+@pytest.fixture
+def backend():
+    """ Восстанавливает вариант ядер после теста """
+    saved = kernels.get_backend()
+    yield kernels.set_backend
+    kernels.set_backend(saved)
+
+
+def _signal(n, dtype, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal(n) + 1j * rng.standard_normal(n)
+    return (x if np.dtype(dtype).kind == 'c' else x.real).astype(dtype)
+
+
+def _run(r, b, x, chunk_size_in, dtype):
+    resampler = PPResample(r, b, chunk_size_in, int(chunk_size_in * r), dtype=dtype)
+    return np.concatenate([resampler(x[k:k + chunk_size_in]).copy() for k in range(0, len(x), chunk_size_in)])
+
+
+@pytest.mark.parametrize('r', [Fraction(1, 10), Fraction(3, 7), Fraction(2, 5)])
+def test_numpy_kernel_matches_upfirdn(backend, r):
+    backend('numpy')
+    b = np.hanning(61) / np.hanning(61).sum()
+    x = _signal(70 * 5, np.float64)
+    y = _run(r, b, x, 70, np.float64)
+    expected = upfirdn(b, x, r.numerator, r.denominator) * r.numerator
+    assert np.allclose(y, expected[:len(y)], rtol=0, atol=1e-12)
+
+
+@requires_numba
+@pytest.mark.parametrize('dtype', [np.float32, np.float64, np.complex64, np.complex128])
+@pytest.mark.parametrize('r', [Fraction(1, 10), Fraction(3, 7)])
+def test_numba_bit_identical(backend, dtype, r):
+    b = np.hanning(101) / np.hanning(101).sum()
+    x = _signal(140 * 6, dtype)
+    outputs = {}
+    for name in ('numpy', 'numba'):
+        backend(name)
+        outputs[name] = _run(r, b, x, 140, dtype)
+    assert outputs['numba'].dtype == outputs['numpy'].dtype
+    assert np.array_equal(outputs['numba'], outputs['numpy'])
+
+
+@requires_numba
+def test_polyphase_bank_identical():
+    b = np.random.default_rng(1).standard_normal(1001)
+    for q in (1, 7, 500):
+        numpy_bank = kernels.get_kernel('polyphase_bank', 'numpy')(b, q, np.complex64)
+        numba_bank = kernels.get_kernel('polyphase_bank', 'numba')(b, q, np.complex64)
+        assert numpy_bank.shape == (q, -(-b.size // q))
+        assert np.array_equal(numpy_bank, numba_bank)
+        assert numpy_bank[3 % q, 3 // q] == np.complex64(b[3])
+
+
+def test_backend_selection(backend):
+    backend('numpy')
+    assert kernels.get_backend() == 'numpy'
+    assert kernels.get_kernel('ppresample') is kernels.ppresample_numpy
+    backend('auto')
+    assert kernels.get_backend() == kernels.available_backends()[-1]
+    with pytest.raises(ValueError):
+        backend('cuda')
+
+
+@requires_numba
+def test_benchmark_reports_identical():
+    result = kernels.benchmark(chunk_size_in=2000, L=200, r=Fraction(1, 20), repeat=1)
+    assert result['identical']
+    assert set(result) == {'numpy', 'numba', 'identical'}
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from RSA306.conversion import NCO
+
+FS = 112e6
+
+
+def _exact(nco, n):
+    """ exp(1j*phi) по точной фазе аккумулятора для отсчетов n (целые Python) """
+    modulus = 2**nco.bits
+    phase = np.array([(nco.ftw * k) % modulus / modulus for k in n])
+    return np.exp(2j * np.pi * phase)
+
+
+@pytest.mark.parametrize('f', [28.7e6, -10.123456e6, FS / 4, 1.0])
+def test_chunk_size_independent(f):
+    whole = NCO(FS, f, 3 * 1000)
+    parts = NCO(FS, f, 1000)
+    expected = np.concatenate([whole().copy() for _ in range(4)])
+    result = np.concatenate([parts().copy() for _ in range(12)])
+    assert np.array_equal(result, expected)
+
+
+def test_long_run_phase_error():
+    nco = NCO(FS, 28.7e6, 4096)
+    # Фаза после ~10**12 отсчетов задается аккумулятором, без прогона всех отрезков
+    start = 10**12 // 4096 * 4096
+    nco.acc = nco.ftw * start % 2**nco.bits
+    y = nco()
+    n = [start + k for k in range(0, 4096, 97)]
+    assert np.abs(y[::97] - _exact(nco, n)).max() < 1e-6
+    for chunk in range(1, 50):
+        y = nco()
+    n = [start + chunk * 4096 + k for k in range(0, 4096, 97)]
+    assert np.abs(y[::97] - _exact(nco, n)).max() < 1e-6
+    assert np.abs(np.abs(y) - 1).max() < 1e-6
+
+
+def test_frequency_and_phase():
+    nco = NCO(FS, 28.7e6, 1024, phi0=np.pi / 3)
+    assert nco.f_actual == pytest.approx(28.7e6, rel=1e-15)
+    assert nco.phase == pytest.approx(np.pi / 3)
+    y = nco()
+    assert np.angle(y[0]) == pytest.approx(np.pi / 3, abs=1e-6)
+    assert NCO(FS, -FS / 4, 16).f_actual == -FS / 4
+    assert np.allclose(NCO(FS, FS / 4, 8)(), [1, 1j, -1, -1j] * 2, atol=1e-7)
+
+
+def test_state_roundtrip():
+    reference = NCO(FS, 13.3e6, 500)
+    for _ in range(3):
+        reference()
+    resumed = NCO(FS, 13.3e6, 500)
+    resumed.set_state(reference.get_state())
+    assert np.array_equal(resumed(), reference())
+
+
+def test_narrow_accumulator():
+    nco = NCO(FS, 28e6, 64, bits=32, table_bits=16)
+    assert nco.ftw == 2**30
+    assert np.allclose(nco(), np.tile([1, 1j, -1, -1j], 16), atol=1e-7)
+    with pytest.raises(ValueError):
+        NCO(FS, 28e6, 64, bits=32, table_bits=17)
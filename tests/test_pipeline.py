@@ -0,0 +1,83 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from RSA306.conversion import FM_Demodulate, PPResample, PassbandToBaseband_IH
+from RSA306.filtercache import default_cache
+from RSA306.pipeline import ThreadedPipeline
+from RSA306.reader import get_reader
+
+from conftest import R3A_PATH
+
+BLOCK_SIZE = 100 * 1000
+
+
+def _stages(Fs):
+    r = Fraction(1, 100)
+    b = default_cache().fir_coefs(300e3, 500e3, 60, Fs=Fs)
+    decimator = PPResample(r, b, BLOCK_SIZE, int(BLOCK_SIZE * r), dtype=np.complex64)
+    bconv = PassbandToBaseband_IH(BLOCK_SIZE, Fs, 28.7e6, np.complex64, decimator=decimator)
+    demod = FM_Demodulate(int(BLOCK_SIZE * r), Fs * r, 75e3, np.float32)
+    return [bconv, demod]
+
+
+@pytest.fixture(scope='module')
+def reader():
+    return get_reader(R3A_PATH)
+
+
+@pytest.mark.parametrize('depth', [1, 3])
+def test_matches_sequential(reader, depth):
+    Fs = float(reader.data_format.sample_rate)
+    expected = []
+    stages = _stages(Fs)
+    for x in reader.readblock(BLOCK_SIZE, False):
+        for stage in stages:
+            x = stage(x)
+        expected.append(np.array(x))
+
+    pipeline = ThreadedPipeline(_stages(Fs), depth=depth)
+    # readblock переиспользует буфер: конвейер обязан копировать отрезки
+    result = [y.copy() for y in pipeline.run(reader.readblock(BLOCK_SIZE, False))]
+    assert len(result) == len(expected)
+    for y, y_expected in zip(result, expected):
+        assert np.array_equal(y, y_expected)
+    assert all(d <= depth for d in pipeline.max_queue_depths)
+
+
+def test_bounded_queues_with_slow_consumer():
+    pipeline = ThreadedPipeline([lambda x: x + 1, lambda x: x * 2], depth=2)
+    source = (np.full(4, i) for i in range(50))
+    result = []
+    for y in pipeline.run(source):
+        result.append(int(y[0]))
+        assert all(d <= 2 for d in pipeline.queue_depths)
+    assert result == [(i + 1) * 2 for i in range(50)]
+    assert all(d <= 2 for d in pipeline.max_queue_depths)
+
+
+def test_stage_error_propagates():
+    def failing(x):
+        if x[0] == 5:
+            raise RuntimeError('stage failed')
+        return x
+
+    pipeline = ThreadedPipeline([failing])
+    seen = []
+    with pytest.raises(RuntimeError, match='stage failed'):
+        for y in pipeline.run(np.full(2, i) for i in range(100)):
+            seen.append(int(y[0]))
+    assert seen == list(range(5))
+
+
+def test_early_close_stops_threads():
+    pipeline = ThreadedPipeline([lambda x: x], depth=1)
+    gen = pipeline.run(np.full(2, i) for i in range(1000))
+    assert int(next(gen)[0]) == 0
+    gen.close()
+
+
+def test_invalid_depth():
+    with pytest.raises(ValueError):
+        ThreadedPipeline([], depth=0)
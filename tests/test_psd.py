@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from scipy.interpolate import CubicSpline
+from scipy.signal import get_window
+
+from RSA306.psd import batch_psd
+from RSA306.rc import SAMPLES_PER_BLOCK
+from RSA306.reader import get_reader
+
+from conftest import R3F_NEXT_PATH, R3F_PATH
+
+BLOCK_SIZE = 4 * SAMPLES_PER_BLOCK
+PATHS = [R3F_PATH, R3F_NEXT_PATH]
+
+
+def _expected(path, max_blocks):
+    """ Спектр записи, вычисленный по всем блокам одним БПФ, как в example.py """
+    reader = get_reader(path)
+    Fs = float(reader.data_format.sample_rate)
+    f1 = float(reader.data_format.if_center_frequency)
+    bandwidth = float(reader.data_format.bandwidth)
+    n_blocks = min(reader.n_samples // BLOCK_SIZE, max_blocks)
+    samples = reader.read_range(0, n_blocks * BLOCK_SIZE)
+    frames = samples.reshape(n_blocks, BLOCK_SIZE) * get_window('hann', BLOCK_SIZE)
+    f = np.fft.rfftfreq(BLOCK_SIZE, d=1 / Fs)
+    band = (f1 - bandwidth / 2 < f) & (f < f1 + bandwidth / 2)
+    S = np.abs(np.fft.rfft(frames, axis=1)[:, band]).mean(axis=0) * float(reader.channel_correction.adc_scale) / Fs
+    correction = reader.channel_correction
+    return f[band] - f1, 20 * np.log10(S) - CubicSpline(correction.freq_table, correction.amp_table)(f[band])
+
+
+@pytest.fixture(scope='module')
+def serial():
+    return batch_psd(PATHS, block_size=BLOCK_SIZE, max_blocks=20, workers=0, batch=3)
+
+
+def test_matches_direct_computation(serial):
+    assert serial.spectra.shape == (len(PATHS), len(serial.freqs))
+    for row, path in zip(serial.spectra, PATHS):
+        freqs, expected = _expected(path, 20)
+        assert np.allclose(serial.freqs, freqs)
+        assert np.allclose(row, expected, rtol=0, atol=1e-9)
+    assert [meta['path'] for meta in serial.metadata] == PATHS
+    assert all(meta['blocks'] == 20 and meta['samples'] == 20 * BLOCK_SIZE for meta in serial.metadata)
+    assert serial.stats['samples'] == 2 * 20 * BLOCK_SIZE
+
+
+def test_process_pool_matches_serial(serial):
+    pooled = batch_psd(PATHS, block_size=BLOCK_SIZE, max_blocks=20, workers=2, blocks_per_task=6, batch=3)
+    assert pooled.stats['tasks'] == 2 * 4 and pooled.stats['workers'] == 2
+    assert np.allclose(pooled.spectra, serial.spectra, rtol=0, atol=1e-9)
+
+
+def test_empty_paths_rejected():
+    with pytest.raises(ValueError):
+        batch_psd([])
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from RSA306.detection import PulseDetector, _to_dbm, concat_pulses
+
+FS = 1e6
+WIDTH = 200
+PRI = 1000
+N_PULSES = 20
+OFFSET = 1e3
+
+
+def _pulses(n=N_PULSES * PRI, amplitude=100.0, noise=1.0, seed=0):
+    rng = np.random.default_rng(seed)
+    x = noise * (rng.standard_normal(n) + 1j * rng.standard_normal(n)) / np.sqrt(2)
+    t = np.arange(n)
+    starts = 137 + PRI * np.arange(N_PULSES)
+    for start in starts:
+        x[start:start + WIDTH] += amplitude * np.exp(2j * np.pi * OFFSET * t[start:start + WIDTH] / FS)
+    return x.astype(np.complex64), starts
+
+
+def _detect(x, block, smooth):
+    detector = PulseDetector(FS, on_level=_to_dbm(20.0**2, 1.0), off_level=_to_dbm(10.0**2, 1.0), smooth=smooth)
+    tables = [detector(x[i:i + block]) for i in range(0, len(x), block)]
+    return concat_pulses(tables + [detector.flush()])
+
+
+@pytest.mark.parametrize('smooth', [1, 8, 33])
+@pytest.mark.parametrize('block', [4096, 777])
+def test_rectangular_pulse_edges_width_and_pri(smooth, block):
+    x, starts = _pulses()
+    pulses = _detect(x, block, smooth)
+    assert np.array_equal(pulses.start, starts)
+    assert np.array_equal(pulses.stop, starts + WIDTH)
+    assert np.allclose(pulses.width, WIDTH / FS)
+    assert np.isnan(pulses.pri[0])
+    assert np.allclose(pulses.pri[1:], PRI / FS)
+    assert np.allclose(pulses.mean_power, _to_dbm(100.0**2 + 1, 1.0), atol=0.1)
+    assert np.allclose(pulses.carrier_offset, OFFSET, atol=50)
+
+
+def test_result_does_not_depend_on_block_size():
+    x, _ = _pulses()
+    a, b = _detect(x, 2**16, 8), _detect(x, 501, 8)
+    for name in ('start', 'stop', 'width', 'pri', 'hinted'):
+        assert np.array_equal(getattr(a, name), getattr(b, name), equal_nan=name == 'pri')
+    for name in ('peak_power', 'mean_power', 'carrier_offset'):
+        assert np.allclose(getattr(a, name), getattr(b, name))
+
+
+def test_open_pulse_is_closed_by_flush():
+    x, starts = _pulses()
+    x = x[:starts[-1] + WIDTH // 2]
+    pulses = _detect(x, 4096, 8)
+    assert pulses.start[-1] == starts[-1]
+    assert pulses.stop[-1] == len(x)
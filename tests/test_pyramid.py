@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from scipy.signal import get_window
+
+from RSA306.pyramid import SpectrogramPyramid, build_pyramid
+from RSA306.reader import get_reader
+
+from conftest import R3A_PATH
+
+NFFT = 1024
+
+
+@pytest.fixture(scope='module')
+def reader():
+    return get_reader(R3A_PATH)
+
+
+@pytest.fixture(scope='module')
+def reference(reader):
+    """ Спектрограмма уровня 0, вычисленная непосредственно по всей записи (линейная мощность) """
+    samples = reader.read_range(0, reader.n_samples)
+    n_rows = len(samples) // NFFT
+    w = get_window('hann', NFFT)
+    spectra = np.fft.rfft(samples[:n_rows * NFFT].reshape(n_rows, NFFT) * w, axis=1)
+    return np.abs(spectra)**2
+
+
+@pytest.fixture(scope='module', params=['float16', 'uint8'])
+def pyramid(request, reader, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('pyr') / 'capture.pyr')
+    # frames_per_read не степень двойки: пары строк уровня 0 пересекают границы чтений;
+    # диапазон uint8 (db_floor, db_step) охватывает все значения записи без ограничения
+    build_pyramid(reader, path, nfft=NFFT, dtype=request.param, db_floor=-200.0, db_step=1.0,
+                  frames_per_read=7)
+    return SpectrogramPyramid(path)
+
+
+def test_level_sizes(pyramid, reference):
+    assert pyramid.level_rows(0) == len(reference)
+    for level in range(1, pyramid.n_levels):
+        assert pyramid.level_rows(level) == pyramid.level_rows(level - 1) // 2
+    assert pyramid.level_rows(pyramid.n_levels - 1) == 1
+    assert pyramid.frame_duration == pytest.approx(NFFT / pyramid.header['sample_rate'])
+
+
+def _levels_db(pyramid, kind):
+    return [pyramid._to_db(np.asarray(pyramid._levels[k][kind])) for k in range(pyramid.n_levels)]
+
+
+def _tolerance(pyramid):
+    return pyramid.header['db_step'] / 2 + 1e-3 if pyramid.header['dtype'] == 'uint8' else 0.1
+
+
+def test_level0_matches_direct_fft(pyramid, reference, reader):
+    level0 = _levels_db(pyramid, 'mean')[0]
+    assert np.array_equal(level0, _levels_db(pyramid, 'max')[0])
+    f = np.fft.rfftfreq(NFFT, d=1 / pyramid.header['sample_rate'])
+    f1, bandwidth = float(reader.data_format.if_center_frequency), float(reader.data_format.bandwidth)
+    band = (f1 - bandwidth / 2 < f) & (f < f1 + bandwidth / 2)
+    assert band.sum() == pyramid.header['n_bins']
+    # Калибровка -- постоянный для столбца множитель: разность с прямым БПФ не зависит от строки
+    offset = level0 - 10 * np.log10(reference[:, band])
+    assert np.ptp(offset, axis=0).max() <= 2 * _tolerance(pyramid)
+
+
+def test_max_levels_hold_maximum(pyramid):
+    levels = _levels_db(pyramid, 'max')
+    for k in range(1, pyramid.n_levels):
+        rows = pyramid.level_rows(k)
+        pairs = levels[k - 1][:2 * rows].reshape(rows, 2, -1)
+        assert np.array_equal(levels[k], pairs.max(axis=1)), k
+
+
+def test_mean_levels_average_power(pyramid):
+    levels = _levels_db(pyramid, 'mean')
+    linear0 = 10**(levels[0].astype(np.float64) / 10)
+    for k in range(1, pyramid.n_levels):
+        rows = pyramid.level_rows(k)
+        expected = 10 * np.log10(linear0[:rows * 2**k].reshape(rows, 2**k, -1).mean(axis=1))
+        assert np.allclose(levels[k], expected, atol=2 * _tolerance(pyramid)), k
+
+
+def test_query_selects_level(pyramid):
+    duration = pyramid.level_rows(0) * pyramid.frame_duration
+    times, freqs, S = pyramid.query(0, duration, max_rows=100)
+    assert S.shape == (len(times), len(freqs)) and 0 < len(times) <= 100
+    level = int(round(np.log2((times[1] - times[0]) / pyramid.frame_duration)))
+    assert pyramid.level_rows(level) == len(times)
+    assert pyramid.level_rows(0) / 2**(level - 1) > 100
+
+    f_mid = pyramid.freqs[len(pyramid.freqs) // 2]
+    _, freqs, S = pyramid.query(0, duration, f_start=f_mid, f_stop=f_mid + 1e6, level=0)
+    assert freqs[0] >= f_mid and freqs[-1] <= f_mid + 1e6
+    assert S.shape == (pyramid.level_rows(0), len(freqs))
@@ -0,0 +1,168 @@
+import shutil
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from RSA306.parsers import parse_footer
+from RSA306.rc import BLOCK_R3F_SIZE, BYTES_PER_SAMPLE, HEADER_DATA_LENGTH, SAMPLES_PER_BLOCK
+from RSA306.reader import get_reader
+from RSA306.types import Footer
+
+from conftest import R3A_PATH, R3F_PATH, R3H_PATH
+
+
+def test_r3f_size_follows_growing_file(tmp_path):
+    with open(R3F_PATH, 'rb') as source:
+        data = source.read(HEADER_DATA_LENGTH + 15 * BLOCK_R3F_SIZE)
+    path = tmp_path / 'growing.r3f'
+    path.write_bytes(data[:HEADER_DATA_LENGTH + 10 * BLOCK_R3F_SIZE + 100])
+    reader = get_reader(str(path))
+    assert reader.n_frames == 10
+    assert reader.n_samples == 10 * SAMPLES_PER_BLOCK
+    path.write_bytes(data)
+    assert reader.n_frames == 15
+    assert reader.n_samples == 15 * SAMPLES_PER_BLOCK
+    assert len(reader.memmap()) == 15
+
+
+def test_r3a_size_follows_growing_file(tmp_path):
+    shutil.copy(R3H_PATH, tmp_path / 'growing.r3h')
+    with open(R3A_PATH, 'rb') as source:
+        data = source.read(2000 * BYTES_PER_SAMPLE)
+    path = tmp_path / 'growing.r3a'
+    path.write_bytes(data[:1000 * BYTES_PER_SAMPLE])
+    reader = get_reader(str(path))
+    assert reader.n_samples == 1000
+    path.write_bytes(data)
+    assert reader.n_samples == 2000
+
+
+def test_zero_ref_time_opens(tmp_path):
+    header = bytearray(open(R3H_PATH, 'rb').read())
+    header[2108:2136] = bytes(28)
+    (tmp_path / 'zero.r3h').write_bytes(bytes(header))
+    shutil.copy(R3A_PATH, tmp_path / 'zero.r3a')
+    reader = get_reader(str(tmp_path / 'zero.r3a'))
+    assert np.isnat(reader.data_format.ref_datetime)
+    assert np.array_equal(reader.read_range(0, 100), get_reader(R3A_PATH).read_range(0, 100))
+
+
+def test_parse_footer_returns_footer_record():
+    reader = get_reader(R3F_PATH)
+    with open(R3F_PATH, 'rb') as source:
+        source.seek(HEADER_DATA_LENGTH + BLOCK_R3F_SIZE + SAMPLES_PER_BLOCK * BYTES_PER_SAMPLE)
+        footer = parse_footer(source.read(BLOCK_R3F_SIZE - SAMPLES_PER_BLOCK * BYTES_PER_SAMPLE))
+    assert isinstance(footer, Footer)
+    assert footer.frame_id == reader.footers().frame_id[1]
+    assert footer.timestamp == reader.footers().timestamp[1]
+
+
+def _grow(path, data, start, step, delay=0.005):
+    """ Дописывает data[start:] в файл кусками step байт, не кратными фрейму """
+    def write():
+        with open(path, 'ab') as target:
+            for offset in range(start, len(data), step):
+                target.write(data[offset:offset + step])
+                target.flush()
+                time.sleep(delay)
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+
+def test_r3f_follow_growing_file(tmp_path):
+    with open(R3F_PATH, 'rb') as source:
+        data = source.read(HEADER_DATA_LENGTH + 40 * BLOCK_R3F_SIZE)
+    path = tmp_path / 'live.r3f'
+    path.write_bytes(data[:HEADER_DATA_LENGTH + 3 * BLOCK_R3F_SIZE + 7])
+    reader = get_reader(str(path))
+    writer = _grow(str(path), data, HEADER_DATA_LENGTH + 3 * BLOCK_R3F_SIZE + 7, 5001)
+
+    samples, frame_ids = [], []
+    for frames in reader.follow(read_metadata=True, frames_per_read=4, poll_interval=0.005, idle_timeout=0.5):
+        assert 1 <= len(frames) <= 4
+        for frame, footer in frames:
+            samples.append(frame.copy())
+            frame_ids.append(int(footer.frame_id))
+    writer.join()
+
+    expected = get_reader(R3F_PATH)
+    assert np.array_equal(np.concatenate(samples), expected.read_range(0, 40 * SAMPLES_PER_BLOCK))
+    assert frame_ids == list(expected.footers().frame_id[:40])
+
+
+def test_r3f_follow_from_end(tmp_path):
+    with open(R3F_PATH, 'rb') as source:
+        data = source.read(HEADER_DATA_LENGTH + 12 * BLOCK_R3F_SIZE)
+    path = tmp_path / 'live.r3f'
+    path.write_bytes(data[:HEADER_DATA_LENGTH + 10 * BLOCK_R3F_SIZE + 100])
+    reader = get_reader(str(path))
+    follow = reader.follow(poll_interval=0.005, idle_timeout=0.5, from_start=False)
+    writer = _grow(str(path), data, HEADER_DATA_LENGTH + 10 * BLOCK_R3F_SIZE + 100, 3000, delay=0)
+    writer.join()
+    blocks = [block.copy() for block in follow]
+    expected = get_reader(R3F_PATH).read_range(10 * SAMPLES_PER_BLOCK, 12 * SAMPLES_PER_BLOCK)
+    assert np.array_equal(np.concatenate(blocks), expected)
+
+
+def test_r3a_follow_growing_file(tmp_path):
+    shutil.copy(R3H_PATH, tmp_path / 'live.r3h')
+    with open(R3A_PATH, 'rb') as source:
+        data = source.read(50000 * BYTES_PER_SAMPLE + 3)
+    path = tmp_path / 'live.r3a'
+    path.write_bytes(b'')
+    reader = get_reader(str(path))
+    writer = _grow(str(path), data, 0, 7777)
+    blocks = [block.copy() for block in reader.follow(4096, poll_interval=0.005, idle_timeout=0.5)]
+    writer.join()
+    assert all(len(block) == 4096 for block in blocks)
+    n = len(blocks) * 4096
+    assert n == 50000 // 4096 * 4096
+    assert np.array_equal(np.concatenate(blocks), get_reader(R3A_PATH).read_range(0, n))
+
+
+def test_r3a_follow_from_end(tmp_path):
+    shutil.copy(R3H_PATH, tmp_path / 'live.r3h')
+    with open(R3A_PATH, 'rb') as source:
+        data = source.read(3000 * BYTES_PER_SAMPLE)
+    path = tmp_path / 'live.r3a'
+    path.write_bytes(data[:1500 * BYTES_PER_SAMPLE])
+    follow = get_reader(str(path)).follow(1000, poll_interval=0.005, idle_timeout=0.2, from_start=False)
+    with open(path, 'ab') as target:
+        target.write(data[1500 * BYTES_PER_SAMPLE:])
+    blocks = [block.copy() for block in follow]
+    assert np.array_equal(np.concatenate(blocks), get_reader(R3A_PATH).read_range(1000, 3000))
+
+
+def test_r3h_and_r3a_paths_open_same_capture():
+    by_data, by_header = get_reader(R3A_PATH), get_reader(R3H_PATH)
+    assert type(by_data) is type(by_header)
+    assert by_header.data_path == R3A_PATH and by_header.header_path == R3H_PATH
+    assert by_header.header_data == by_data.header_data
+    assert by_header.n_samples == by_data.n_samples
+    assert np.array_equal(by_header.read_range(0, 5000), by_data.read_range(0, 5000))
+
+
+def test_r3a_random_access_matches_read():
+    reader = get_reader(R3H_PATH)
+    samples = reader.read()
+    memmap = reader.memmap()
+    assert memmap.dtype == np.int16 and len(memmap) == len(samples) == reader.n_samples
+    assert np.array_equal(memmap, samples)
+    with pytest.raises(ValueError):
+        memmap[0] = 1
+    for start, stop in [(0, 1), (12345, 54321), (len(samples) - 10, len(samples) + 10), (-5, 3), (10, 5)]:
+        expected = samples[max(start, 0):max(stop, max(start, 0))]
+        assert np.array_equal(reader.read_range(start, stop), expected)
+    blocks = [block.copy() for block in reader.readblock(100000, True, start=777)]
+    assert np.array_equal(np.concatenate(blocks), samples[777:])
+
+
+def test_empty_r3a_memmap(tmp_path):
+    shutil.copy(R3H_PATH, tmp_path / 'empty.r3h')
+    (tmp_path / 'empty.r3a').write_bytes(b'')
+    reader = get_reader(str(tmp_path / 'empty.r3h'))
+    assert len(reader.memmap()) == 0
+    assert len(reader.read_range(0, 100)) == 0
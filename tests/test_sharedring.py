@@ -0,0 +1,88 @@
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+
+from RSA306.reader import get_reader
+from RSA306.sharedring import RingConsumer, RingProducer
+
+from conftest import R3F_PATH
+
+
+def _consume(name, delay=0.0, max_frames=8):
+    ids, checksums = [], []
+    with RingConsumer(name, index=0, max_frames=max_frames) as consumer:
+        for samples, footers in consumer:
+            ids.extend(footers.frame_id.tolist())
+            checksums.extend(samples.astype(np.int64).sum(axis=1).tolist())
+            time.sleep(delay)
+        return ids, checksums, consumer.dropped
+
+
+def _run(policy, delay, slots=16):
+    reader = get_reader(R3F_PATH)
+    producer = RingProducer(reader, slots=slots, max_consumers=2, policy=policy)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(out=_consume(producer.name, delay)))
+    thread.start()
+    try:
+        producer.run(frames_per_read=4, wait_consumers=1)
+        thread.join()
+    finally:
+        producer.unlink()
+    return reader, result['out']
+
+
+def test_block_delivers_every_frame_intact():
+    reader, (ids, checksums, dropped) = _run('block', delay=0.001)
+    frames = reader.memmap()
+    assert ids == frames['footer']['frame_id'].tolist()
+    assert checksums == frames['samples'].astype(np.int64).sum(axis=1).tolist()
+    assert dropped == 0
+
+
+def test_drop_accounts_each_frame_once():
+    reader, (ids, checksums, dropped) = _run('drop', delay=0.005)
+    frames = reader.memmap()
+    assert dropped > 0
+    assert len(ids) + dropped == len(frames)
+    assert ids == sorted(set(ids))
+    expected = dict(zip(frames['footer']['frame_id'].tolist(), frames['samples'].astype(np.int64).sum(axis=1)))
+    assert checksums == [expected[i] for i in ids]
+
+
+def test_drop_after_full_overrun():
+    reader = get_reader(R3F_PATH)
+    producer = RingProducer(reader, slots=16, policy='drop')
+    try:
+        consumer = RingConsumer(producer.name)
+        producer.run()
+        received = sum(len(samples) for samples, _ in consumer)
+        assert received == 16
+        assert consumer.dropped == len(reader.memmap()) - 16
+        consumer.close()
+    finally:
+        producer.unlink()
+
+
+def _process_consumer(name, queue):
+    ids, _, dropped = _consume(name)
+    queue.put((len(ids), dropped))
+
+
+def test_consumer_process_exit_keeps_segment():
+    reader = get_reader(R3F_PATH)
+    producer = RingProducer(reader, slots=16, policy='block')
+    try:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_process_consumer, args=(producer.name, queue))
+        process.start()
+        producer.run(wait_consumers=1)
+        assert queue.get(timeout=30) == (len(reader.memmap()), 0)
+        process.join()
+        # Сегмент остается доступным после выхода процесса-потребителя
+        with RingConsumer(producer.name, index=1, from_oldest=True) as late:
+            assert sum(len(samples) for samples, _ in late) == 16
+    finally:
+        producer.unlink()
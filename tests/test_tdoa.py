@@ -0,0 +1,85 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from RSA306.reader import get_reader
+from RSA306.tdoa import batch_tdoa, correlate_windows, measure_tdoa
+from RSA306.timing import TimeModel
+
+from conftest import R3A_PATH, R3H_PATH
+
+DELAY = 37
+SHIFT = 100
+EVENTS = [10000, 200000, 500000, 777777, 1200000]
+
+
+def _delayed(x, delay):
+    """ Задержка x на дробное число отсчетов фазовым сдвигом спектра (циклическая) """
+    X = np.fft.rfft(x, axis=-1)
+    f = np.fft.rfftfreq(x.shape[-1])
+    return np.fft.irfft(X * np.exp(-2j * np.pi * f * delay), n=x.shape[-1], axis=-1)
+
+
+@pytest.mark.parametrize('weighting', [None, 'phat'])
+def test_correlate_fractional_delay(weighting):
+    rng = np.random.default_rng(0)
+    reference = rng.standard_normal((6, 2048))
+    delays = [3.4, -11.75]
+    others = [_delayed(reference, d) for d in delays]
+    lag, peak = correlate_windows(reference, others, max_lag=32, upsample=16, weighting=weighting)
+    assert lag.shape == peak.shape == (6, 2)
+    # Циклический сдвиг при линейной корреляции дает небольшое смещение оценки
+    assert np.allclose(lag, delays, atol=0.05)
+    assert np.all(peak > 0.9) and np.all(peak <= 1.0 + 1e-6)
+
+
+def test_correlate_rejects_bad_arguments():
+    x = np.zeros((1, 64))
+    with pytest.raises(ValueError):
+        correlate_windows(x, [x], max_lag=64)
+    with pytest.raises(ValueError):
+        correlate_windows(x, [x], max_lag=8, band=(0, 1))
+    with pytest.raises(ValueError):
+        correlate_windows(x, [x], max_lag=8, weighting='scot')
+
+
+@pytest.fixture(scope='module')
+def captures(tmp_path_factory):
+    """ Опорная запись и ее копия, начатая на SHIFT отсчетов позже, с сигналом, задержанным на DELAY """
+    tmp_path = tmp_path_factory.mktemp('tdoa')
+    samples = get_reader(R3A_PATH).read()
+    paths = []
+    for name, data in (('a', samples), ('b', samples[SHIFT - DELAY:])):
+        shutil.copy(R3H_PATH, tmp_path / (name + '.r3h'))
+        (tmp_path / (name + '.r3a')).write_bytes(data.tobytes())
+        paths.append(str(tmp_path / (name + '.r3a')))
+    readers = [get_reader(path) for path in paths]
+    model_a = readers[0].time_model()
+    model_b = TimeModel(readers[1].data_format, anchor_samples=[0], anchor_ticks=[model_a.sample_to_tick(SHIFT)])
+    return paths, readers, [model_a, model_b]
+
+
+def test_measure_tdoa_on_captures(captures):
+    _, readers, models = captures
+    event_times = models[0].sample_to_datetime(EVENTS)
+    result = measure_tdoa(readers, event_times, window=4096, max_lag=64, batch=2, time_models=models)
+    Fs = float(readers[0].data_format.sample_rate)
+    assert list(result.start_samples[:, 0]) == EVENTS
+    assert list(result.start_samples[:, 1]) == [e - SHIFT for e in EVENTS]
+    assert np.allclose(result.lag, DELAY, atol=0.01)
+    assert np.allclose(result.delay, DELAY / Fs, atol=0.01 / Fs)
+    assert np.all(result.peak > 0.99)
+
+
+def test_batch_tdoa_matches_measure(captures):
+    paths, readers, models = captures
+    event_times = models[0].sample_to_datetime(EVENTS)
+    # Без поправки моделей времени записи начинаются одновременно: сигнал в b опережает на SHIFT - DELAY
+    expected = measure_tdoa(readers, event_times, window=8192, max_lag=128)
+    assert np.allclose(expected.lag, DELAY - SHIFT, atol=0.1)
+    for workers in (0, 2):
+        result = batch_tdoa(paths, event_times, 8192, 128, events_per_task=2, workers=workers)
+        assert np.array_equal(result.start_samples, expected.start_samples)
+        for field in ('delay', 'lag', 'peak'):
+            assert np.allclose(getattr(result, field), getattr(expected, field), rtol=1e-6, atol=0), field
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from RSA306.rc import FRAME_STATUS_TIME_SYNC, HEADER_DATA_LENGTH, SAMPLES_PER_BLOCK
+from RSA306.reader import get_reader
+from RSA306.timing import TimeModel
+from RSA306.types import R3F_FRAME_DTYPE
+
+from conftest import R3A_PATH, R3F_PATH
+
+REMOVED = [20, 21, 70]
+
+
+@pytest.fixture
+def gapped(tmp_path):
+    """ Копия записи без фреймов REMOVED и с событием синхронизации времени во фрейме 5 """
+    with open(R3F_PATH, 'rb') as source:
+        header = source.read(HEADER_DATA_LENGTH)
+        frames = np.frombuffer(source.read(), dtype=R3F_FRAME_DTYPE).copy()
+    frames['footer']['frame_status'][5] |= FRAME_STATUS_TIME_SYNC
+    frames['footer']['time_sync_idx'][5] = 1234
+    kept = np.delete(frames, REMOVED)
+    path = tmp_path / 'gapped.r3f'
+    path.write_bytes(header + kept.tobytes())
+    return str(path), kept
+
+
+def test_frame_starts_match_footers():
+    reader = get_reader(R3F_PATH)
+    footers = reader.footers()
+    model = reader.time_model()
+    starts = np.arange(len(footers)) * SAMPLES_PER_BLOCK
+    assert np.array_equal(model.sample_to_tick(starts), footers['timestamp'].astype(np.int64))
+    assert np.array_equal(model.tick_to_sample(footers['timestamp']), starts)
+
+
+def test_anchors_after_dropped_frames(gapped):
+    path, kept = gapped
+    reader = get_reader(path)
+    model = reader.time_model()
+    assert list(model.anchor_samples) == [0, 20 * SAMPLES_PER_BLOCK, (70 - 2) * SAMPLES_PER_BLOCK]
+    starts = np.arange(len(kept)) * SAMPLES_PER_BLOCK
+    assert np.array_equal(model.sample_to_tick(starts), kept['footer']['timestamp'].astype(np.int64))
+    # Отсчеты внутри фрейма после разрыва отсчитываются от его опорной точки
+    inside = starts + 1000
+    assert np.array_equal(model.sample_to_tick(inside), kept['footer']['timestamp'].astype(np.int64) + 1000)
+    assert np.array_equal(model.tick_to_sample(model.sample_to_tick(inside)), inside)
+
+
+def test_r3a_starts_at_clock_samples():
+    reader = get_reader(R3A_PATH)
+    model = reader.time_model()
+    assert model.sample_to_tick(0) == int(reader.data_format.clock_samples)
+    assert model.sample_to_datetime(0) == reader.data_format.ref_datetime
+
+
+def test_fractional_rates_exact_on_long_capture():
+    data_format = SimpleNamespace(time_sample_rate=112000000, sample_rate=56000000.0, clock_samples=10 ** 15,
+                                  ref_datetime=np.datetime64('2020-01-16T11:17:15', 'ns'))
+    model = TimeModel(data_format)
+    samples = np.array([0, 1, 3, 56000000, 2 ** 50 + 7], dtype=np.int64)
+    ticks = model.sample_to_tick(samples)
+    assert list(ticks) == [10 ** 15 + 2 * int(s) for s in samples]
+    assert np.array_equal(model.tick_to_sample(ticks), samples)
+    assert np.array_equal(model.tick_to_sample(ticks + 1), samples)
+    assert model.sample_to_datetime(56000000) == data_format.ref_datetime + np.timedelta64(1, 's')
+
+
+def test_datetime_roundtrip_is_exact():
+    data_format = SimpleNamespace(time_sample_rate=112000000, sample_rate=112000000.0, clock_samples=221154783,
+                                  ref_datetime=np.datetime64('2020-01-16T11:17:15', 'ns'))
+    model = TimeModel(data_format)
+    ticks = np.arange(221154783, 221154783 + 10 ** 6, 997, dtype=np.int64)
+    assert np.array_equal(model.datetime_to_tick(model.tick_to_datetime(ticks)), ticks)
+    samples = np.arange(0, 10 ** 7, 12345, dtype=np.int64)
+    assert np.array_equal(model.datetime_to_sample(model.sample_to_datetime(samples)), samples)
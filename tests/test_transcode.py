@@ -0,0 +1,23 @@
+import numpy as np
+
+from RSA306.reader import get_reader
+from RSA306.transcode import TranscodedReader, transcode_r3f
+
+from conftest import R3F_PATH
+
+
+def test_lossless_roundtrip(tmp_path):
+    data_path = transcode_r3f(R3F_PATH, str(tmp_path / 'capture'), frames_per_read=7)
+    original, transcoded = get_reader(R3F_PATH), get_reader(str(tmp_path / 'capture.r3c'))
+    assert isinstance(transcoded, TranscodedReader)
+    assert get_reader(data_path).data_path == transcoded.data_path
+    assert transcoded.header_data == original.header_data
+    assert transcoded.n_frames == original.n_frames
+    assert np.array_equal(transcoded.memmap(), original.memmap()['samples'].reshape(-1))
+    assert transcoded.footers().tobytes() == np.ascontiguousarray(original.footers()).tobytes()
+    assert np.array_equal(transcoded.footer_column('timestamp'), original.footers().timestamp)
+    assert np.array_equal(transcoded.triggers().sample_index, original.triggers().sample_index)
+    assert transcoded.check_integrity() == original.check_integrity()
+    samples = np.arange(0, original.n_samples, 99991)
+    assert np.array_equal(transcoded.time_model().sample_to_tick(samples),
+                          original.time_model().sample_to_tick(samples))